@@ -0,0 +1,171 @@
+"""
+Benchmark of the compiled `nested_dataclass` against its previous version on an app config of many instances.
+
+Usage:
+    python -m benchmarks.bench_config --instances 500 --repeat 20
+"""
+
+import argparse
+import json
+from dataclasses import MISSING, _MISSING_TYPE, dataclass, fields, is_dataclass, replace
+from time import perf_counter
+from typing import Dict, List, Union, get_args, get_origin
+
+from sonic_engine.model.app_config import (
+    AppConfig,
+    AppConfigExtension,
+    ExtensionGlobalConfig,
+)
+
+
+def legacy_nested_dataclass(*args, **kwargs):
+    "`nested_dataclass` before its fields table was compiled, the baseline"
+
+    def wrapper(cls):
+        cls = dataclass(cls, **kwargs)
+
+        original_init = cls.__init__
+
+        def __init__(self, *args, **kwargs):
+            missing = []
+            for f in fields(cls):
+                if type(f.default) == _MISSING_TYPE and f.name not in kwargs:
+                    missing.append(f"{f.name}")
+            if len(missing):
+                missing_fields = ",".join([f"'{f}'" for f in missing])
+                raise TypeError(
+                    f"The following fields {missing_fields} are required for {cls.__name__}"
+                )
+
+            for name, value in kwargs.items():
+                field_type = None
+                for f in fields(cls):
+                    if f.name == name:
+                        field_type = f.type
+                        break
+                if is_dataclass(field_type) and isinstance(value, dict):
+                    new_obj = field_type(**value)
+                    kwargs[name] = new_obj
+            original_init(self, *args, **kwargs)
+
+        cls.__init__ = __init__
+        return cls
+
+    return wrapper(args[0]) if args else wrapper
+
+
+def rebuild(cls, decorator, rebuilt: Dict[type, type]) -> type:
+    "Copy of a config class and of its nested config classes, decorated by `decorator`"
+    if cls in rebuilt:
+        return rebuilt[cls]
+
+    def remap(field_type):
+        if is_dataclass(field_type):
+            return rebuild(field_type, decorator, rebuilt)
+        origin, args = get_origin(field_type), get_args(field_type)
+        if origin is list and args:
+            return List[remap(args[0])]
+        if origin is dict and args:
+            return Dict[args[0], remap(args[1])]
+        if origin is Union:
+            return Union[tuple(remap(arg) for arg in args)]
+        return field_type
+
+    namespace = {"__annotations__": {}, "__module__": __name__}
+    for f in fields(cls):
+        namespace["__annotations__"][f.name] = remap(f.type)
+        if f.default is not MISSING:
+            namespace[f.name] = f.default
+    if hasattr(cls, "__post_init__"):
+        namespace["__post_init__"] = cls.__post_init__
+    rebuilt[cls] = decorator(type(cls.__name__, (), namespace))
+    return rebuilt[cls]
+
+
+def app_config(instances: int) -> Dict:
+    "Raw app config of `instances` extensions, as parsed from YAML"
+    return {
+        "metadata": {"extensions_folder": "extensions", "memory": {"max_rss_mb": 512}},
+        "categories": [{"name": "feature", "description": "Features"}],
+        "extensions": [
+            {
+                "id": f"extension-{i}",
+                "category": "feature",
+                "source": f"https://example.com/extension-{i}.git",
+                "override": {f"extension-{i}-2": {"description": "replica"}},
+            }
+            for i in range(instances)
+        ],
+    }
+
+
+def instance_config(i: int) -> Dict:
+    "Raw global config of an instance"
+    return {
+        "id": f"extension-{i}",
+        "name": f"extension-{i}",
+        "category": "feature",
+        "channels": {
+            "subscribe": ["packets"],
+            "publish": ["flows"],
+            "partitions": {"flows": 16},
+        },
+        "log": {"dir": "logs", "level": "INFO"},
+        "tracing": {"sample_rate": 0.01},
+        "flight_recorder": {"max_messages": 1000},
+    }
+
+
+def run(classes: Dict[str, type], instances: int, repeat: int) -> float:
+    "Best time to load the app config and build the instances configs and their override copies"
+    raw = app_config(instances)
+    raws = [instance_config(i) for i in range(instances)]
+    best = float("inf")
+    for _ in range(repeat):
+        started = perf_counter()
+        config = classes["AppConfig"](**raw)
+        for extension in config.extensions:
+            if isinstance(extension, dict):
+                # the previous version left the list items as dicts
+                extension = classes["AppConfigExtension"](**extension)
+        for instance in raws:
+            instance = classes["ExtensionGlobalConfig"](**instance)
+            replace(instance, id=f"{instance.id}-2", description="replica")
+        best = min(best, perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--instances", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    compiled = {
+        "AppConfig": AppConfig,
+        "AppConfigExtension": AppConfigExtension,
+        "ExtensionGlobalConfig": ExtensionGlobalConfig,
+    }
+    rebuilt = {}
+    legacy = {
+        name: rebuild(cls, legacy_nested_dataclass, rebuilt)
+        for name, cls in compiled.items()
+    }
+
+    legacy_time = run(legacy, args.instances, args.repeat)
+    compiled_time = run(compiled, args.instances, args.repeat)
+    print(
+        json.dumps(
+            {
+                "instances": args.instances,
+                "legacy": {"seconds": legacy_time},
+                "compiled": {"seconds": compiled_time},
+                "speedup": legacy_time / compiled_time,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Micro-benchmarks of the `Database` primitives and of the payload encodings, across payload sizes.
+
+Runs against a redis-server started on a unix socket of a temporary folder (or `--redis-url`), with the client pinned
+to a core. Every measure does warmup operations then repeated trials, and the results are printed as JSON.
+
+Usage:
+    python -m benchmarks.bench_database --sizes 64 1024 65536 1048576 --trials 5 --output database.json
+"""
+
+import argparse
+import json
+import marshal
+import os
+import pickle
+import platform
+import statistics
+import struct
+import sys
+import tempfile
+from threading import Event, Thread
+from time import perf_counter_ns, sleep
+from typing import Callable, Dict, List
+
+from benchmarks.bench_pipeline import start_redis
+from sonic_engine.core.batch import ColumnBatch
+from sonic_engine.core.database import Database, connect
+
+TIMESTAMP = struct.Struct("<q")
+"perf_counter_ns of the publication, prefix of the delivered payloads"
+
+BYTES_PER_SIZE = 64 << 20
+"Bytes moved per trial at most, the operations of the large payloads are fewer"
+
+
+def operations(ops: int, size: int) -> int:
+    return max(min(ops, BYTES_PER_SIZE // size), 10)
+
+
+def measure(
+    op: Callable[[int], None],
+    ops: int,
+    warmup: int,
+    trials: int,
+    setup: Callable[[], None] = None,
+) -> Dict:
+    """Time every operation of `trials` trials after `warmup` operations, `op` gets the operation number
+    `setup` runs untimed before the warmup and every trial, e.g. to recreate what the operations consume
+    """
+    if setup is not None:
+        setup()
+    for i in range(warmup):
+        op(i)
+    samples: List[int] = []
+    rates = []
+    for _ in range(trials):
+        if setup is not None:
+            setup()
+        trial_started = perf_counter_ns()
+        for i in range(ops):
+            started = perf_counter_ns()
+            op(i)
+            samples.append(perf_counter_ns() - started)
+        rates.append(ops / ((perf_counter_ns() - trial_started) / 1e9))
+    return summary(samples, rates)
+
+
+def summary(samples: List[int], rates: List[float] = None) -> Dict:
+    "Throughput (median of the trials) and percentiles in microseconds of the operations times in ns"
+    samples = sorted(samples)
+
+    def percentile(q: float) -> float:
+        return samples[min(len(samples) - 1, int(q / 100 * len(samples)))] / 1000
+
+    result = {
+        "samples": len(samples),
+        "mean_us": statistics.fmean(samples) / 1000,
+        "p50_us": percentile(50),
+        "p99_us": percentile(99),
+        "max_us": samples[-1] / 1000,
+    }
+    if rates:
+        result["ops_per_sec"] = statistics.median(rates)
+    return result
+
+
+def bench_publish(db: Database, size: int, args) -> Dict:
+    payload = os.urandom(size)
+    return measure(
+        lambda i: db.publish("bench", payload),
+        operations(args.ops, size),
+        args.warmup,
+        args.trials,
+    )
+
+
+def bench_delivery(db: Database, publisher, size: int, args) -> Dict:
+    """Latency from `publish` to `get_message` yielding the message, one message in flight at a time
+    The publisher runs in a thread with its own connection, as another extension would
+    """
+    padding = os.urandom(max(size - TIMESTAMP.size, 0))
+    messages = args.warmup + args.trials * operations(args.ops, size)
+    received = Event()
+
+    def publish():
+        for _ in range(messages):
+            received.clear()
+            payload = TIMESTAMP.pack(perf_counter_ns()) + padding
+            publisher.publish("bench-delivery", payload)
+            if not received.wait(5):
+                break
+
+    db.subscriptions.clear()
+    db.pubsubs = [db.subscribe("bench-delivery")]
+    # the subscription is confirmed before the first message is published
+    while publisher.pubsub_numsub("bench-delivery")[0][1] == 0:
+        sleep(0.01)
+    thread = Thread(target=publish, daemon=True)
+    thread.start()
+
+    samples = []
+    for message in db.get_message(timeout=0.01):
+        if message["type"] != "message":
+            continue
+        (published,) = TIMESTAMP.unpack_from(message["data"])
+        samples.append(perf_counter_ns() - published)
+        received.set()
+        if len(samples) == messages:
+            break
+    db.stop_listening()
+    # the listening thread leaves after its last poll
+    sleep(0.1)
+    for pubsub in db.pubsubs:
+        pubsub.close()
+    thread.join()
+    return summary(samples[args.warmup :])
+
+
+def bench_store(db: Database, size: int, args) -> Dict[str, Dict]:
+    payload = os.urandom(size)
+    ops = operations(args.ops, size)
+    keys = ops * args.trials
+
+    def store_keys():
+        "Every delete trial removes existing fields"
+        pipeline = db.redis.pipeline(transaction=False)
+        for key in range(max(ops, args.warmup)):
+            pipeline.hset("bench", key, payload)
+        pipeline.execute()
+
+    return {
+        "store": measure(
+            lambda i: db.store("bench", i % keys, payload),
+            ops,
+            args.warmup,
+            args.trials,
+        ),
+        "retrieve": measure(
+            lambda i: db.retrieve("bench", i % keys), ops, args.warmup, args.trials
+        ),
+        "delete": measure(
+            lambda i: db.delete("bench", i),
+            ops,
+            args.warmup,
+            args.trials,
+            store_keys,
+        ),
+    }
+
+
+def codecs() -> Dict[str, tuple]:
+    "(encode, decode) of every encoding, msgpack only if installed"
+    available = {
+        "pickle": (pickle.dumps, pickle.loads),
+        "marshal": (marshal.dumps, marshal.loads),
+        "json": (lambda data: json.dumps(data).encode(), json.loads),
+        "column_batch": (
+            lambda data: ColumnBatch({"values": data["values"]}).encode(),
+            lambda data: ColumnBatch.decode(data)["values"],
+        ),
+    }
+    try:
+        import msgpack
+
+        available["msgpack"] = (msgpack.packb, msgpack.unpackb)
+    except ImportError:
+        pass
+    return available
+
+
+def bench_encodings(size: int, args) -> Dict[str, Dict]:
+    "Encode and decode a record holding `size` bytes of floats"
+    record = {"id": 1, "values": [i * 0.5 for i in range(max(size // 8, 1))]}
+    ops = operations(args.ops, size)
+    results = {}
+    for name, (encode, decode) in codecs().items():
+        encoded = encode(record)
+        results[name] = {
+            "encoded_bytes": len(encoded),
+            "encode": measure(lambda i: encode(record), ops, args.warmup, args.trials),
+            "decode": measure(lambda i: decode(encoded), ops, args.warmup, args.trials),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[64, 1024, 16384, 262144, 1048576]
+    )
+    parser.add_argument("--ops", type=int, default=2000, help="Operations per trial")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--cpu", type=int, default=0, help="Core of the client")
+    parser.add_argument(
+        "--redis-cpu", type=int, help="Core of redis-server, the other cores by default"
+    )
+    parser.add_argument("--redis-url", help="Instead of a local redis-server")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    pinned = hasattr(os, "sched_setaffinity")
+    cores = os.sched_getaffinity(0) if pinned else set()
+    workdir = tempfile.mkdtemp(prefix="sonic-bench-db-")
+    redis_server, redis_url = None, args.redis_url
+    if redis_url is None:
+        redis_server, redis_url = start_redis(workdir)
+        redis_cores = cores - {args.cpu} or cores
+        if args.redis_cpu is not None:
+            redis_cores = {args.redis_cpu}
+        if pinned:
+            os.sched_setaffinity(redis_server.pid, redis_cores)
+    if pinned:
+        os.sched_setaffinity(0, {args.cpu})
+
+    try:
+        publisher = connect(redis_url)
+        for _ in range(50):
+            try:
+                publisher.ping()
+                break
+            except Exception:
+                sleep(0.1)
+        db = Database(redis_url, flush=True)
+        db.instance_id = "bench"
+
+        results = []
+        for size in args.sizes:
+            measures = {"publish": bench_publish(db, size, args)}
+            measures["get_message"] = bench_delivery(db, publisher, size, args)
+            measures.update(bench_store(db, size, args))
+            for primitive, result in measures.items():
+                results.append({"primitive": primitive, "size": size, **result})
+            for codec, result in bench_encodings(size, args).items():
+                primitive = f"encoding:{codec}"
+                results.append({"primitive": primitive, "size": size, **result})
+            print(f"{size} B done", file=sys.stderr)
+        info = publisher.info("server")
+    finally:
+        if redis_server is not None:
+            redis_server.terminate()
+            redis_server.wait()
+
+    report = {
+        "python": platform.python_version(),
+        "redis": info.get("redis_version"),
+        "cpu": args.cpu,
+        "warmup": args.warmup,
+        "trials": args.trials,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark of `FlowTable` against the per-packet dict aggregation feature extensions usually implement.
+
+Usage:
+    python -m benchmarks.bench_flow_table --packets 1000000 --flows 10000 --batch 4096
+"""
+
+import argparse
+import json
+import math
+from time import perf_counter
+
+import numpy as np
+
+from sonic_engine.features.flow_table import COLUMNS, FlowTable, hash_keys
+
+
+def synthetic_packets(packets: int, flows: int, duration: float, seed: int = 0):
+    "Packets of `flows` flows with zipf-like popularity, ordered by time"
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, flows + 1)
+    flow_ids = rng.choice(flows, size=packets, p=weights / weights.sum())
+    keys = hash_keys(flow_ids, flow_ids * 7 + 1, flow_ids % 65535, 443, 6)
+    timestamps = np.sort(rng.uniform(0, duration, size=packets))
+    sizes = rng.integers(40, 1500, size=packets).astype(np.float64)
+    return keys, timestamps, sizes
+
+
+class DictFlowTable:
+    "Tumbling windows aggregated packet by packet in dicts, the baseline"
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self.window_id = None
+        self.flows = {}
+
+    def update(self, keys, timestamps, sizes):
+        windows = []
+        for key, timestamp, size in zip(
+            keys.tolist(), timestamps.tolist(), sizes.tolist()
+        ):
+            window_id = math.floor(timestamp / self.window)
+            if self.window_id is None:
+                self.window_id = window_id
+            if window_id > self.window_id:
+                windows += self.flush()
+                self.window_id = window_id
+            flow = self.flows.get(key)
+            if flow is None:
+                flow = self.flows[key] = {
+                    "packets": 0,
+                    "bytes": 0.0,
+                    "bytes_min": math.inf,
+                    "bytes_max": -math.inf,
+                    "first_seen": timestamp,
+                    "last_seen": timestamp,
+                    "iat": [],
+                }
+            if flow["packets"]:
+                flow["iat"].append(timestamp - flow["last_seen"])
+            flow["packets"] += 1
+            flow["bytes"] += size
+            flow["bytes_min"] = min(flow["bytes_min"], size)
+            flow["bytes_max"] = max(flow["bytes_max"], size)
+            flow["last_seen"] = timestamp
+        return windows
+
+    def flush(self):
+        rows = {}
+        for key, flow in self.flows.items():
+            iat = flow["iat"]
+            mean = sum(iat) / len(iat) if iat else 0.0
+            std = (
+                math.sqrt(max(sum(x * x for x in iat) / len(iat) - mean**2, 0))
+                if iat
+                else 0.0
+            )
+            rows[key] = [
+                flow["packets"],
+                flow["bytes"],
+                flow["bytes_min"],
+                flow["bytes_max"],
+                flow["first_seen"],
+                flow["last_seen"],
+                flow["last_seen"] - flow["first_seen"],
+                mean,
+                std,
+                min(iat) if iat else 0.0,
+                max(iat) if iat else 0.0,
+            ]
+        self.flows = {}
+        return [rows]
+
+
+def run(table, keys, timestamps, sizes, batch: int):
+    started = perf_counter()
+    windows = []
+    for start in range(0, len(keys), batch):
+        end = start + batch
+        windows += table.update(
+            keys[start:end], timestamps[start:end], sizes[start:end]
+        )
+    windows += table.flush()
+    return perf_counter() - started, windows
+
+
+def check(vectorized, baseline) -> bool:
+    "Both implementations emit the same features"
+    baseline = [rows for rows in baseline if rows]
+    if len(vectorized) != len(baseline):
+        return False
+    for window, rows in zip(vectorized, baseline):
+        expected = np.array([rows[key] for key in window.keys.tolist()])
+        if len(rows) != len(window.keys) or not np.allclose(
+            window.values, expected, atol=1e-6
+        ):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--packets", type=int, default=1_000_000)
+    parser.add_argument("--flows", type=int, default=10_000)
+    parser.add_argument("--batch", type=int, default=4096)
+    parser.add_argument("--window", type=float, default=10.0)
+    parser.add_argument("--duration", type=float, default=60.0)
+    args = parser.parse_args()
+
+    keys, timestamps, sizes = synthetic_packets(args.packets, args.flows, args.duration)
+
+    baseline_time, baseline = run(
+        DictFlowTable(args.window), keys, timestamps, sizes, args.batch
+    )
+    table_time, vectorized = run(
+        FlowTable(args.window), keys, timestamps, sizes, args.batch
+    )
+
+    print(
+        json.dumps(
+            {
+                "packets": args.packets,
+                "flows": args.flows,
+                "batch": args.batch,
+                "columns": list(COLUMNS),
+                "dict": {"seconds": baseline_time, "pps": args.packets / baseline_time},
+                "flow_table": {"seconds": table_time, "pps": args.packets / table_time},
+                "speedup": baseline_time / table_time,
+                "same_features": check(vectorized, baseline),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+End-to-end benchmark of the message path: synthetic feature, inference and reporting extensions run by `Engine`.
+
+Every point of the sweep (message size x rate x inference replicas) installs the extensions from
+`benchmarks/pipeline_extensions` into a work folder, runs the engine, and measures the throughput, the end-to-end
+latency percentiles, and the CPU time and RSS of every instance. Needs `redis-server` (or `--redis-url`) and
+`virtualenv` to install the extensions.
+
+Usage:
+    python -m benchmarks.bench_pipeline --sizes 64 4096 --rates 1000 10000 --replicas 1 2 --output results.json
+    python -m benchmarks.bench_pipeline --baseline results.json --threshold 0.1
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from array import array
+from itertools import product
+from time import sleep, time
+from typing import Dict, List
+
+import yaml
+
+from sonic_engine.core.metrics import process_stats
+
+EXTENSIONS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "pipeline_extensions"
+)
+"Sources of the synthetic extensions"
+
+MB = 1 << 20
+
+
+def app_config(redis_url: str, point: Dict, messages: int, work_us: int, replace: bool):
+    "Raw app config of a sweep point"
+
+    def extension(name: str, options: Dict, copies: int = 1) -> Dict:
+        override = {name: {"options": options}}
+        for i in range(1, copies):
+            override[f"{name}-{i}"] = {"options": options}
+        return {
+            "id": name,
+            "category": name,
+            "source": os.path.join(EXTENSIONS, name),
+            "override": override,
+        }
+
+    return {
+        "metadata": {
+            "extensions_folder": "extensions",
+            "replace_existing": replace,
+            # the instances register in redis before the start, they must not flush it
+            "redis": {"url": redis_url, "flush": False},
+        },
+        "categories": [
+            {"name": name, "description": f"Benchmark {name}"}
+            for name in ("feature", "inference", "reporting")
+        ],
+        "extensions": [
+            extension(
+                "feature",
+                {"size": point["size"], "rate": point["rate"], "messages": messages},
+            ),
+            extension("inference", {"work_us": work_us}, point["replicas"]),
+            extension("reporting", {}),
+        ],
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    "Nearest-rank percentile of sorted values"
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def start_redis(workdir: str):
+    "Local redis-server without persistence, listening on a socket of the work folder"
+    if shutil.which("redis-server") is None:
+        raise RuntimeError("redis-server must be installed, or pass --redis-url")
+    socket = os.path.join(workdir, "redis.sock")
+    command = ["redis-server", "--port", "0", "--unixsocket", socket]
+    command += ["--save", "", "--appendonly", "no"]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, cwd=workdir)
+    return process, f"unix://{socket}"
+
+
+def stop(process: subprocess.Popen, timeout: float = 10.0) -> None:
+    "Stop the engine like Ctrl+C does, then kill its whole process group if it hangs"
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def run_point(redis, redis_url: str, workdir: str, point: Dict, args, replace: bool):
+    "Run the engine for a sweep point and collect its measures"
+    messages = args.messages
+    if point["rate"]:
+        messages = max(int(point["rate"] * args.duration), 1)
+    config = app_config(redis_url, point, messages, args.work_us, replace)
+    config_path = os.path.join(workdir, "app_config.yaml")
+    with open(config_path, "w") as f:
+        yaml.safe_dump(config, f)
+    instances = 2 + point["replicas"]
+
+    redis.flushdb()
+    code = "from sonic_engine.core.engine import Engine\n"
+    code += f"Engine({config_path!r}).start()"
+    with open(os.path.join(workdir, "engine.log"), "ab") as log:
+        engine = subprocess.Popen(
+            [sys.executable, "-c", code],
+            cwd=workdir,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    try:
+        deadline = time() + args.startup_timeout
+        while redis.hlen("bench:ready") < instances:
+            if engine.poll() is not None or time() > deadline:
+                raise RuntimeError(
+                    f"The instances did not start, see {workdir}/engine.log"
+                )
+            sleep(0.1)
+        ready = redis.hgetall("bench:ready")
+        pids = {key.decode(): int(pid) for key, pid in ready.items()}
+        cpu_before = {id: process_stats(pid)[1] for id, pid in pids.items()}
+
+        started_at = time()
+        redis.set("bench:start", repr(started_at))
+        received, changed_at = 0, time()
+        while received < messages and time() - changed_at < args.idle_timeout:
+            sleep(0.2)
+            current = int(redis.hget("bench:progress", "received") or 0)
+            if current != received:
+                received, changed_at = current, time()
+        last_at = float(redis.hget("bench:progress", "last_at") or started_at)
+        stats = {id: process_stats(pid) for id, pid in pids.items()}
+    finally:
+        stop(engine)
+
+    latencies = array("d")
+    for chunk in redis.lrange("bench:latencies", 0, -1):
+        latencies.frombytes(chunk)
+    latencies = sorted(latencies)
+    elapsed = last_at - started_at
+    return {
+        **point,
+        "messages": messages,
+        "received": received,
+        "lost": messages - received,
+        "throughput": received / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {
+            name: percentile(latencies, q) * 1000 if latencies else None
+            for name, q in (("p50", 50), ("p99", 99), ("p999", 99.9))
+        },
+        "cpu_seconds": {id: stats[id][1] - cpu_before[id] for id in pids},
+        "rss_mb": {id: stats[id][0] / MB for id in pids},
+    }
+
+
+def point_key(point: Dict) -> str:
+    return f"{point['size']}B@{point['rate']}/s x{point['replicas']}"
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    "Regressions of the results against a baseline beyond `threshold` (a fraction), on the points both measured"
+    previous = {point_key(point): point for point in baseline["points"]}
+    regressions = []
+    for point in results["points"]:
+        old = previous.get(point_key(point))
+        if old is None:
+            continue
+        key = point_key(point)
+        if point["throughput"] < old["throughput"] * (1 - threshold):
+            regressions.append(
+                f"{key}: throughput {old['throughput']:.0f}"
+                f" -> {point['throughput']:.0f} msg/s"
+            )
+        for name, value in point["latency_ms"].items():
+            before = old["latency_ms"].get(name)
+            if value is not None and before and value > before * (1 + threshold):
+                regressions.append(
+                    f"{key}: {name} latency {before:.2f} -> {value:.2f} ms"
+                )
+        if point["lost"] > old["lost"]:
+            regressions.append(
+                f"{key}: {old['lost']} -> {point['lost']} lost messages"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 1024, 16384])
+    parser.add_argument(
+        "--rates", type=int, nargs="+", default=[1000, 10000], help="0: unthrottled"
+    )
+    parser.add_argument("--replicas", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument(
+        "--messages", type=int, default=50000, help="Messages of unthrottled points"
+    )
+    parser.add_argument(
+        "--work-us", type=int, default=0, help="Work per message in the inference"
+    )
+    parser.add_argument("--redis-url", help="Instead of a local redis-server")
+    parser.add_argument("--workdir", help="Kept after the run, temporary by default")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument(
+        "--idle-timeout", type=float, default=5.0, help="Ends a point without progress"
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Fail on regressions against these results")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Tolerated regression fraction"
+    )
+    args = parser.parse_args()
+
+    from sonic_engine.core.database import connect
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="sonic-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    redis_server, redis_url = None, args.redis_url
+    if redis_url is None:
+        redis_server, redis_url = start_redis(workdir)
+    redis = connect(redis_url)
+    for _ in range(50):
+        try:
+            redis.ping()
+            break
+        except Exception:
+            sleep(0.1)
+
+    points = []
+    installed = set()
+    "replicas counts whose instances were installed, the later points skip the installation"
+    try:
+        sweep = product(sorted(args.replicas), args.sizes, args.rates)
+        for replicas, size, rate in sweep:
+            point = {"size": size, "rate": rate, "replicas": replicas}
+            replace = replicas not in installed
+            result = run_point(redis, redis_url, workdir, point, args, replace)
+            installed.add(replicas)
+            points.append(result)
+            print(json.dumps(result), file=sys.stderr)
+    finally:
+        if redis_server is not None:
+            redis_server.terminate()
+            redis_server.wait()
+
+    results = {"duration": args.duration, "work_us": args.work_us, "points": points}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
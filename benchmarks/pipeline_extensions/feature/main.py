@@ -0,0 +1,45 @@
+"""
+Synthetic feature extension of the pipeline benchmark.
+
+Publishes `messages` messages of `size` bytes at `rate` messages per second (0: as fast as possible) once the
+benchmark starts. Every message starts with its sequence number and its publication time.
+"""
+
+import os
+import struct
+from time import sleep, time
+
+from yapsy.IMultiprocessPlugin import IMultiprocessPlugin
+
+HEADER = struct.Struct("<Qd")
+"sequence number, publication time"
+
+
+class BenchFeature(IMultiprocessPlugin):
+    def run(self):
+        from sonic_engine.core.database import __db__
+
+        config = self.parent_pipe.recv()["config"]
+        __db__.register_extension(config)
+        __db__.redis.hset("bench:ready", config.id, os.getpid())
+
+        size = max(config.options.get("size", 64), HEADER.size)
+        rate = config.options.get("rate", 0)
+        messages = config.options.get("messages", 1000)
+        padding = b"\0" * (size - HEADER.size)
+        (ch,) = config.channels.publish
+
+        while (started_at := __db__.redis.get("bench:start")) is None:
+            sleep(0.01)
+        started_at = float(started_at)
+
+        for seq in range(messages):
+            if rate:
+                ahead = started_at + seq / rate - time()
+                if ahead > 0:
+                    sleep(ahead)
+            __db__.publish(ch, HEADER.pack(seq, time()) + padding, key=seq)
+
+        # keep the process alive until the engine stops it
+        while True:
+            sleep(1)
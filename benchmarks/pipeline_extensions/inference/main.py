@@ -0,0 +1,31 @@
+"""
+Synthetic inference extension of the pipeline benchmark.
+
+Forwards every received message, after spinning `work_us` microseconds to stand for a model.
+"""
+
+import os
+from time import perf_counter
+
+from yapsy.IMultiprocessPlugin import IMultiprocessPlugin
+
+
+class BenchInference(IMultiprocessPlugin):
+    def run(self):
+        from sonic_engine.core.database import __db__
+
+        config = self.parent_pipe.recv()["config"]
+        __db__.register_extension(config)
+        __db__.redis.hset("bench:ready", config.id, os.getpid())
+
+        work = config.options.get("work_us", 0) / 1e6
+        (ch,) = config.channels.publish
+
+        for message in __db__.get_message():
+            if message["type"] != "message":
+                continue
+            if work:
+                until = perf_counter() + work
+                while perf_counter() < until:
+                    pass
+            __db__.publish(ch, message["data"])
@@ -0,0 +1,57 @@
+"""
+Synthetic reporting extension of the pipeline benchmark.
+
+Measures the end-to-end latency of every received message. The latencies are appended to the `bench:latencies`
+redis list in chunks, and the count of received messages to `bench:progress`, every `FLUSH_INTERVAL`.
+"""
+
+import os
+import struct
+from array import array
+from threading import Lock, Thread
+from time import sleep, time
+
+from yapsy.IMultiprocessPlugin import IMultiprocessPlugin
+
+HEADER = struct.Struct("<Qd")
+"sequence number, publication time"
+
+FLUSH_INTERVAL = 0.2
+
+
+class BenchReporting(IMultiprocessPlugin):
+    def run(self):
+        from sonic_engine.core.database import __db__
+
+        config = self.parent_pipe.recv()["config"]
+        __db__.register_extension(config)
+        __db__.redis.hset("bench:ready", config.id, os.getpid())
+
+        self.redis = __db__.redis
+        self.lock = Lock()
+        self.latencies = array("d")
+        self.received = 0
+        self.last_at = 0.0
+        Thread(target=self.flush_forever, daemon=True).start()
+
+        for message in __db__.get_message():
+            if message["type"] != "message":
+                continue
+            now = time()
+            _, published_at = HEADER.unpack_from(message["data"])
+            with self.lock:
+                self.latencies.append(now - published_at)
+                self.received += 1
+                self.last_at = now
+
+    def flush_forever(self):
+        while True:
+            sleep(FLUSH_INTERVAL)
+            with self.lock:
+                latencies, self.latencies = self.latencies, array("d")
+                progress = {"received": self.received, "last_at": self.last_at}
+            pipeline = self.redis.pipeline(transaction=False)
+            if latencies:
+                pipeline.rpush("bench:latencies", latencies.tobytes())
+            pipeline.hset("bench:progress", mapping=progress)
+            pipeline.execute()
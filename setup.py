@@ -33,6 +33,6 @@ setuptools.setup(
         "numpy",
         "pytest",
         "yapsy",
-        "flask",
     ],
+    entry_points={"console_scripts": ["sonic-engine = sonic_engine.cli:main"]},
 )
@@ -0,0 +1,47 @@
+"""
+Sonic Engine command line.
+
+Usage:
+    sonic-engine startup-report --config app_config.yaml --top 10
+    sonic-engine startup-report --extensions extensions --json
+"""
+
+import argparse
+import json
+
+
+def startup_report(args) -> None:
+    from sonic_engine.util.startup import startup_report
+
+    extensions = args.extensions
+    if extensions is None and args.config:
+        from sonic_engine.model.app_config import AppConfig
+        from sonic_engine.util.functions import EngineUtil
+
+        config = EngineUtil().load_config(AppConfig, args.config)
+        extensions = config.metadata.extensions_folder
+    text, data = startup_report(extensions, args.top, args.slow_ms)
+    print(json.dumps(data, indent=2) if args.json else text)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="sonic-engine", description="Sonic Engine")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser(
+        "startup-report",
+        help="Import time of the engine and of the extensions entry modules",
+    )
+    report.add_argument("--config", help="App config, to find the extensions folder")
+    report.add_argument("--extensions", help="Extensions folder")
+    report.add_argument("--top", type=int, default=10, help="Imports listed per module")
+    report.add_argument(
+        "--slow-ms", type=float, default=20.0, help="Flag imports slower than this"
+    )
+    report.add_argument("--json", action="store_true")
+    report.set_defaults(run=startup_report)
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
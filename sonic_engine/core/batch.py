@@ -0,0 +1,189 @@
+import json
+import struct
+from typing import Any, Dict, Iterable, List, Union
+
+import numpy as np
+
+BATCH_MAGIC = b"SCB1"
+"Prefix of the encoded column batches"
+
+ARROW_MAGIC = b"SCBA"
+"Prefix of the column batches encoded as an Arrow IPC stream"
+
+ALIGNMENT = 8
+
+
+def is_batch(data: Any) -> bool:
+    "Check if a message payload is an encoded column batch"
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:4]) in (
+        BATCH_MAGIC,
+        ARROW_MAGIC,
+    )
+
+
+def _padding(size: int) -> int:
+    return -size % ALIGNMENT
+
+
+class ColumnBatch:
+    """
+    A batch of rows stored as named NumPy columns, the envelope exchanged between feature, inference and reporting extensions.
+
+    The encoding is a JSON schema (name, dtype, shape, offset of every column) followed by the raw column buffers, aligned on 8 bytes.
+    Decoding maps the buffers without copying them, and only the requested columns are read.
+    Strings must be fixed-width (`np.str_`/`np.bytes_`), Python objects can not be encoded.
+
+    Example Usage:
+    ```python
+    __db__.publish("flows", ColumnBatch({"key": window.keys, "features": window.values}))
+
+    for message in __db__.get_message():
+        batch = message["data"]  # ColumnBatch
+        suspicious = batch.filter(batch["score"] > 0.9).select(["key", "score"])
+    ```
+    """
+
+    def __init__(self, columns: Dict[str, Any]) -> None:
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.asarray(column) for name, column in columns.items()
+        }
+        lengths = {len(column) for column in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def __repr__(self) -> str:
+        return f"ColumnBatch(rows={len(self)}, schema={self.schema})"
+
+    @property
+    def schema(self) -> Dict[str, str]:
+        "Dtype of every column"
+        return {name: column.dtype.str for name, column in self.columns.items()}
+
+    def select(self, names: Iterable[str]) -> "ColumnBatch":
+        "Project the batch on some columns"
+        return ColumnBatch({name: self.columns[name] for name in names})
+
+    def filter(self, mask: np.ndarray) -> "ColumnBatch":
+        "Keep the rows selected by a boolean mask or an array of indices"
+        return ColumnBatch(
+            {name: column[mask] for name, column in self.columns.items()}
+        )
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "ColumnBatch":
+        "Build a batch from a list of dicts sharing the same keys"
+        if not records:
+            return cls({})
+        return cls({name: [record[name] for record in records] for name in records[0]})
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        "Convert the batch to a list of dicts of Python values"
+        names = list(self.columns)
+        rows = zip(*(column.tolist() for column in self.columns.values()))
+        return [dict(zip(names, row)) for row in rows]
+
+    def encode(self, arrow: bool = False) -> bytes:
+        "Encode the batch, as an Arrow IPC stream if `arrow` (requires pyarrow)"
+        if arrow:
+            return ARROW_MAGIC + self._encode_arrow()
+
+        schema = []
+        buffers = []
+        offset = 0
+        for name, column in self.columns.items():
+            if column.dtype.hasobject:
+                raise TypeError(
+                    f"Column {name} holds Python objects and can not be encoded"
+                )
+            column = np.ascontiguousarray(column)
+            schema.append(
+                {
+                    "name": name,
+                    "dtype": column.dtype.str,
+                    "shape": column.shape,
+                    "offset": offset,
+                }
+            )
+            buffers.append(column.data)
+            offset += column.nbytes + _padding(column.nbytes)
+
+        header = json.dumps({"columns": schema}).encode()
+        header += b" " * _padding(len(BATCH_MAGIC) + 4 + len(header))
+        parts = [BATCH_MAGIC, struct.pack("<I", len(header)), header]
+        for buffer in buffers:
+            parts += [buffer, b"\0" * _padding(buffer.nbytes)]
+        return b"".join(parts)
+
+    @classmethod
+    def decode(
+        cls, data: Union[bytes, memoryview], columns: Iterable[str] = None
+    ) -> "ColumnBatch":
+        """Decode a batch, reading only `columns` if set
+        The columns are read-only views on `data`, a truncated or corrupted batch raises a ValueError
+        """
+        if bytes(data[:4]) == ARROW_MAGIC:
+            return cls._decode_arrow(memoryview(data)[4:], columns)
+        if bytes(data[:4]) != BATCH_MAGIC:
+            raise ValueError("Not a column batch")
+
+        if len(data) < 8:
+            raise ValueError("Truncated column batch")
+        (header_length,) = struct.unpack_from("<I", data, 4)
+        start = 8 + header_length
+        if len(data) < start:
+            raise ValueError("Truncated column batch header")
+        try:
+            schema = json.loads(bytes(data[8:start]))["columns"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"Corrupted column batch header: {e}") from e
+        wanted = None if columns is None else set(columns)
+
+        decoded = {}
+        for column in schema:
+            if wanted is not None and column["name"] not in wanted:
+                continue
+            dtype = np.dtype(column["dtype"])
+            shape = tuple(column["shape"])
+            count = int(np.prod(shape)) if shape else 1
+            array = np.frombuffer(
+                data, dtype=dtype, count=count, offset=start + column["offset"]
+            )
+            decoded[column["name"]] = array.reshape(shape)
+        return cls(decoded)
+
+    def _encode_arrow(self) -> bytes:
+        import pyarrow as pa
+
+        table = pa.table(
+            {
+                name: list(column) if column.ndim > 1 else column
+                for name, column in self.columns.items()
+            }
+        )
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    @classmethod
+    def _decode_arrow(cls, data: memoryview, columns: Iterable[str] = None):
+        import pyarrow as pa
+
+        table = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+        if columns is not None:
+            table = table.select(list(columns))
+        decoded = {}
+        for name in table.column_names:
+            column = table.column(name)
+            if pa.types.is_primitive(column.type):
+                decoded[name] = column.to_numpy()
+            else:
+                # nested and string columns become multi-dimensional and fixed-width arrays
+                decoded[name] = np.array(column.to_pylist())
+        return cls(decoded)
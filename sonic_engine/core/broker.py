@@ -0,0 +1,386 @@
+from fnmatch import fnmatchcase
+from queue import Empty, SimpleQueue
+from threading import Lock, RLock
+from time import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+MEMORY_SCHEME = "memory"
+"Url scheme of the in-process brokers, `memory://<name>`"
+
+_CLOSED = object()
+"Put in the queue of a closed pubsub to end its `listen`"
+
+
+def _bytes(value: Any) -> bytes:
+    "Name or scalar encoded as redis does"
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode()
+    if isinstance(value, (int, float)):
+        return repr(value).encode()
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    raise TypeError(f"Invalid redis key or value type: {type(value).__name__}")
+
+
+def _value(value: Any) -> Any:
+    "Stored value: scalars are encoded as redis does, other objects are kept by reference"
+    if isinstance(value, (bytes, str, int, float, bytearray, memoryview)):
+        return _bytes(value)
+    return value
+
+
+class LocalPubSub:
+    "Subscriptions of a `LocalRedis` client, with the `redis.client.PubSub` interface"
+
+    def __init__(self, broker: "LocalRedis", ignore_subscribe_messages=False) -> None:
+        self.broker = broker
+        self.ignore_subscribe_messages = ignore_subscribe_messages
+        self.queue = SimpleQueue()
+        self.channels: Set[bytes] = set()
+        self.patterns: Set[bytes] = set()
+
+    @property
+    def subscribed(self) -> bool:
+        return bool(self.channels or self.patterns)
+
+    def _confirm(self, type: str, name: bytes) -> None:
+        count = len(self.channels) + len(self.patterns)
+        self.queue.put({"type": type, "pattern": None, "channel": name, "data": count})
+
+    def subscribe(self, *channels) -> None:
+        for ch in map(_bytes, channels):
+            self.channels.add(ch)
+            self.broker._subscribe(self, ch, pattern=False)
+            self._confirm("subscribe", ch)
+
+    def psubscribe(self, *patterns) -> None:
+        for pattern in map(_bytes, patterns):
+            self.patterns.add(pattern)
+            self.broker._subscribe(self, pattern, pattern=True)
+            self._confirm("psubscribe", pattern)
+
+    def unsubscribe(self, *channels) -> None:
+        for ch in list(map(_bytes, channels)) or list(self.channels):
+            self.channels.discard(ch)
+            self.broker._unsubscribe(self, ch, pattern=False)
+            self._confirm("unsubscribe", ch)
+
+    def punsubscribe(self, *patterns) -> None:
+        for pattern in list(map(_bytes, patterns)) or list(self.patterns):
+            self.patterns.discard(pattern)
+            self.broker._unsubscribe(self, pattern, pattern=True)
+            self._confirm("punsubscribe", pattern)
+
+    def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        "Next message, None if none arrived within `timeout` seconds"
+        ignore = ignore_subscribe_messages or self.ignore_subscribe_messages
+        while True:
+            try:
+                if timeout:
+                    message = self.queue.get(timeout=timeout)
+                else:
+                    message = self.queue.get_nowait()
+            except Empty:
+                return None
+            if message is _CLOSED:
+                return None
+            if ignore and message["type"] not in ("message", "pmessage"):
+                continue
+            return message
+
+    def listen(self) -> Iterator[Dict[str, Any]]:
+        "Messages until the pubsub is closed"
+        while True:
+            message = self.queue.get()
+            if message is _CLOSED:
+                return
+            if self.ignore_subscribe_messages and message["type"] not in (
+                "message",
+                "pmessage",
+            ):
+                continue
+            yield message
+
+    def close(self) -> None:
+        for ch in list(self.channels):
+            self.broker._unsubscribe(self, ch, pattern=False)
+        for pattern in list(self.patterns):
+            self.broker._unsubscribe(self, pattern, pattern=True)
+        self.channels.clear()
+        self.patterns.clear()
+        self.queue.put(_CLOSED)
+
+    reset = close
+
+
+class LocalPipeline:
+    "Commands buffered then run in one go by `execute`, like a non transactional redis pipeline"
+
+    def __init__(self, broker: "LocalRedis") -> None:
+        self.broker = broker
+        self.commands: List[Tuple[Callable, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        method = getattr(self.broker, name)
+
+        def buffer(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+
+        return buffer
+
+    def execute(self) -> List[Any]:
+        commands, self.commands = self.commands, []
+        with self.broker.lock:
+            return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+    def __enter__(self) -> "LocalPipeline":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.commands = []
+
+
+class LocalRedis:
+    """
+    In-process stand-in for a redis client, shared by the extensions instances run as threads of one process.
+
+    It implements the part of the redis API the engine uses: publish/subscribe with patterns, hashes, strings,
+    capped streams and pipelines. Published messages are delivered by reference, without serialization: subscribers
+    receive the very object that was published, they must not modify it. Keys, hash fields and scalar values are encoded
+    to bytes as redis does, other stored objects are kept by reference. Expirations are ignored.
+
+    Example Usage:
+    ```python
+    redis = connect("memory://")  # the same LocalRedis for every `connect` of the process
+    pubsub = redis.pubsub()
+    pubsub.subscribe("flows")
+    redis.publish("flows", {"key": 1})
+    pubsub.get_message(timeout=1)  # subscribe confirmation, then the published dict itself
+    ```
+    """
+
+    def __init__(self, name: str = "") -> None:
+        self.name = name
+        self.lock = RLock()
+        self.data: Dict[bytes, Any] = {}
+        self.channels: Dict[bytes, Set[LocalPubSub]] = {}
+        self.patterns: Dict[bytes, Set[LocalPubSub]] = {}
+        self._stream_ids: Dict[bytes, Tuple[int, int]] = {}
+
+    # pub/sub
+
+    def pubsub(self, ignore_subscribe_messages=False) -> LocalPubSub:
+        return LocalPubSub(self, ignore_subscribe_messages)
+
+    def _subscribe(self, pubsub: LocalPubSub, name: bytes, pattern: bool) -> None:
+        subscriptions = self.patterns if pattern else self.channels
+        with self.lock:
+            subscriptions.setdefault(name, set()).add(pubsub)
+
+    def _unsubscribe(self, pubsub: LocalPubSub, name: bytes, pattern: bool) -> None:
+        subscriptions = self.patterns if pattern else self.channels
+        with self.lock:
+            subscribers = subscriptions.get(name)
+            if subscribers is not None:
+                subscribers.discard(pubsub)
+                if not subscribers:
+                    del subscriptions[name]
+
+    def publish(self, ch, data) -> int:
+        "Deliver the object to the subscribers of the channel, returns their number"
+        ch = _bytes(ch)
+        name = ch.decode(errors="replace")
+        with self.lock:
+            subscribers = list(self.channels.get(ch, ()))
+            matches = [
+                (pattern, pubsub)
+                for pattern, pubsubs in self.patterns.items()
+                if fnmatchcase(name, pattern.decode(errors="replace"))
+                for pubsub in pubsubs
+            ]
+        message = {"type": "message", "pattern": None, "channel": ch, "data": data}
+        for pubsub in subscribers:
+            # every subscriber gets its own dict, `Database` adds its receiving times
+            pubsub.queue.put(dict(message))
+        for pattern, pubsub in matches:
+            pubsub.queue.put(
+                {"type": "pmessage", "pattern": pattern, "channel": ch, "data": data}
+            )
+        return len(subscribers) + len(matches)
+
+    def pubsub_numsub(self, *channels) -> List[Tuple[bytes, int]]:
+        with self.lock:
+            return [
+                (_bytes(ch), len(self.channels.get(_bytes(ch), ()))) for ch in channels
+            ]
+
+    # keys
+
+    def ping(self) -> bool:
+        return True
+
+    def flushdb(self, *args, **kwargs) -> bool:
+        with self.lock:
+            self.data.clear()
+            self._stream_ids.clear()
+        return True
+
+    def delete(self, *names) -> int:
+        with self.lock:
+            return sum(self.data.pop(_bytes(name), None) is not None for name in names)
+
+    def exists(self, *names) -> int:
+        with self.lock:
+            return sum(_bytes(name) in self.data for name in names)
+
+    def keys(self, pattern="*") -> List[bytes]:
+        pattern = _bytes(pattern).decode()
+        with self.lock:
+            return [key for key in self.data if fnmatchcase(key.decode(), pattern)]
+
+    def scan_iter(self, match="*", **kwargs) -> Iterator[bytes]:
+        return iter(self.keys(match))
+
+    def expire(self, name, time) -> bool:
+        return _bytes(name) in self.data
+
+    def set(self, name, value, nx=False, xx=False, **kwargs) -> Optional[bool]:
+        name = _bytes(name)
+        with self.lock:
+            if (nx and name in self.data) or (xx and name not in self.data):
+                return None
+            self.data[name] = _value(value)
+            return True
+
+    def get(self, name) -> Any:
+        with self.lock:
+            return self.data.get(_bytes(name))
+
+    # hashes
+
+    def _hash(self, name, create=False) -> Dict[bytes, Any]:
+        name = _bytes(name)
+        if create:
+            return self.data.setdefault(name, {})
+        return self.data.get(name, {})
+
+    def hset(self, name, key=None, value=None, mapping=None) -> int:
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        with self.lock:
+            hash = self._hash(name, create=True)
+            added = 0
+            for field, field_value in items.items():
+                field = _bytes(field)
+                added += field not in hash
+                hash[field] = _value(field_value)
+            return added
+
+    def hget(self, name, key) -> Any:
+        with self.lock:
+            return self._hash(name).get(_bytes(key))
+
+    def hgetall(self, name) -> Dict[bytes, Any]:
+        with self.lock:
+            return dict(self._hash(name))
+
+    def hdel(self, name, *keys) -> int:
+        with self.lock:
+            hash = self._hash(name)
+            deleted = sum(hash.pop(_bytes(key), None) is not None for key in keys)
+            if not hash:
+                self.data.pop(_bytes(name), None)
+            return deleted
+
+    def hlen(self, name) -> int:
+        with self.lock:
+            return len(self._hash(name))
+
+    def hkeys(self, name) -> List[bytes]:
+        with self.lock:
+            return list(self._hash(name))
+
+    # lists
+
+    def _list(self, name) -> List[Any]:
+        return self.data.setdefault(_bytes(name), [])
+
+    def rpush(self, name, *values) -> int:
+        with self.lock:
+            items = self._list(name)
+            items.extend(map(_value, values))
+            return len(items)
+
+    def lpush(self, name, *values) -> int:
+        with self.lock:
+            items = self._list(name)
+            items[:0] = reversed([_value(value) for value in values])
+            return len(items)
+
+    def lrange(self, name, start: int, end: int) -> List[Any]:
+        with self.lock:
+            items = self.data.get(_bytes(name), [])
+            return items[start : len(items) if end == -1 else end + 1]
+
+    def ltrim(self, name, start: int, end: int) -> bool:
+        with self.lock:
+            items = self.data.get(_bytes(name))
+            if items is not None:
+                items[:] = items[start : len(items) if end == -1 else end + 1]
+            return True
+
+    def llen(self, name) -> int:
+        with self.lock:
+            return len(self.data.get(_bytes(name), []))
+
+    # streams
+
+    def xadd(self, name, fields, id="*", maxlen=None, approximate=True, **kwargs):
+        "Append an entry to a stream, capped to the last `maxlen` entries"
+        name = _bytes(name)
+        with self.lock:
+            ms = int(time() * 1000)
+            last_ms, last_seq = self._stream_ids.get(name, (0, -1))
+            seq = last_seq + 1 if ms <= last_ms else 0
+            ms = max(ms, last_ms)
+            self._stream_ids[name] = (ms, seq)
+            entry_id = f"{ms}-{seq}".encode()
+            entries = self._list(name)
+            fields = {_bytes(field): _value(value) for field, value in fields.items()}
+            entries.append((entry_id, fields))
+            if maxlen is not None and len(entries) > maxlen:
+                del entries[: len(entries) - maxlen]
+            return entry_id
+
+    def xrange(self, name, min="-", max="+", count=None) -> List[Tuple[bytes, Dict]]:
+        with self.lock:
+            entries = list(self.data.get(_bytes(name), []))
+        return entries[:count] if count else entries
+
+    def xlen(self, name) -> int:
+        return self.llen(name)
+
+    # pipelines
+
+    def pipeline(self, transaction=True, **kwargs) -> LocalPipeline:
+        return LocalPipeline(self)
+
+    def close(self) -> None:
+        pass
+
+
+_brokers: Dict[str, LocalRedis] = {}
+_brokers_lock = Lock()
+
+
+def local_broker(name: str = "") -> LocalRedis:
+    "The in-process broker of a name, created on first use"
+    with _brokers_lock:
+        broker = _brokers.get(name)
+        if broker is None:
+            broker = _brokers[name] = LocalRedis(name)
+        return broker
@@ -0,0 +1,142 @@
+import os
+import socket
+from hashlib import blake2b
+from math import ceil
+from time import time
+from typing import List, Tuple
+
+from sonic_engine.model.app_config import ClusterConfig
+from sonic_engine.util.functions import EngineUtil
+
+engine_util = EngineUtil()
+
+# renew a lease only if it is still owned by the node
+RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# release a lease only if it is still owned by the node
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def default_node_id() -> str:
+    "Identify the node by its host name and process id"
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ClusterNode:
+    """
+    A node of a multi-node engine, it claims a fair share of the extensions instances using leases stored in redis.
+
+    Every node heartbeats `<prefix>:node:<node_id>` and owns the instances whose lease `<prefix>:lease:<instance_id>` holds its id.
+    Leases expire after `lease_ttl` seconds unless renewed, so the instances of a dead node are claimed by the survivors on their next `tick`.
+
+    Example Usage:
+    ```python
+    node = ClusterNode(redis_client, ["feature", "inference"], ClusterConfig())
+
+    acquired, lost = node.tick()  # start `acquired`, stop `lost`
+    ```
+    """
+
+    def __init__(self, redis, instances_ids: List[str], config: ClusterConfig) -> None:
+        self.redis = redis
+        self.config = config
+        self.node_id = config.node_id or default_node_id()
+        self.instances_ids = list(instances_ids)
+        self.owned: List[str] = []
+        "instances ids leased by this node, in claim order"
+
+        self._ttl_ms = int(config.lease_ttl * 1e3)
+        self._renew = redis.register_script(RENEW_SCRIPT)
+        self._release = redis.register_script(RELEASE_SCRIPT)
+
+        # every node walks the instances in its own order to limit claim collisions
+        self._claim_order = sorted(
+            self.instances_ids,
+            key=lambda instance_id: blake2b(
+                f"{self.node_id}:{instance_id}".encode()
+            ).digest(),
+        )
+
+    def _node_key(self, node_id: str) -> str:
+        return f"{self.config.prefix}:node:{node_id}"
+
+    def _lease_key(self, instance_id: str) -> str:
+        return f"{self.config.prefix}:lease:{instance_id}"
+
+    def heartbeat(self) -> None:
+        "Mark the node as alive for `lease_ttl` seconds"
+        self.redis.set(self._node_key(self.node_id), time(), px=self._ttl_ms)
+
+    def live_nodes(self) -> List[str]:
+        "List the ids of the nodes with a valid heartbeat"
+        prefix = self._node_key("")
+        return sorted(
+            (key.decode() if isinstance(key, bytes) else key)[len(prefix) :]
+            for key in self.redis.scan_iter(match=f"{prefix}*")
+        )
+
+    def fair_share(self) -> int:
+        "Maximum number of instances this node should own"
+        return ceil(len(self.instances_ids) / max(len(self.live_nodes()), 1))
+
+    def tick(self) -> Tuple[List[str], List[str]]:
+        """
+        Heartbeat, renew the owned leases and claim or release instances to converge to a fair share.
+
+        Returns:
+        - (acquired, lost): the instances ids to start and to stop on this node
+        """
+        self.heartbeat()
+
+        lost = [
+            instance_id
+            for instance_id in self.owned
+            if not self._renew(
+                keys=[self._lease_key(instance_id)], args=[self.node_id, self._ttl_ms]
+            )
+        ]
+        self.owned = [i for i in self.owned if i not in lost]
+
+        share = self.fair_share()
+
+        # a node joined: hand the extra instances over
+        while len(self.owned) > share:
+            instance_id = self.owned.pop()
+            self._release(keys=[self._lease_key(instance_id)], args=[self.node_id])
+            lost.append(instance_id)
+
+        acquired = []
+        for instance_id in self._claim_order:
+            if len(self.owned) >= share:
+                break
+            if instance_id in self.owned:
+                continue
+            if self.redis.set(
+                self._lease_key(instance_id), self.node_id, nx=True, px=self._ttl_ms
+            ):
+                self.owned.append(instance_id)
+                acquired.append(instance_id)
+
+        if acquired or lost:
+            engine_util.logger.info(
+                f"node {self.node_id} owns {len(self.owned)}/{len(self.instances_ids)} instances (+{len(acquired)} -{len(lost)})"
+            )
+
+        return acquired, lost
+
+    def leave(self) -> None:
+        "Release every lease and the heartbeat so the other nodes take over immediately"
+        for instance_id in self.owned:
+            self._release(keys=[self._lease_key(instance_id)], args=[self.node_id])
+        self.owned = []
+        self.redis.delete(self._node_key(self.node_id))
@@ -0,0 +1,88 @@
+import json
+from threading import Thread
+from typing import Any, Callable, Dict
+
+from sonic_engine.util.functions import EngineUtil
+
+engine_util = EngineUtil()
+
+CONTROL_PREFIX = "sonic:control"
+
+COMMANDS: Dict[str, Callable[..., Any]] = {}
+"Handler of every control command, called with the command arguments in the listener thread"
+
+
+def control_channel(instance_id: str) -> str:
+    "Channel of the control commands sent to an instance"
+    return f"{CONTROL_PREFIX}:{instance_id}"
+
+
+def command(name: str):
+    """Register a control command handler
+
+    Example Usage:
+    ```python
+    @command("ping")
+    def ping(**args):
+        engine_util.logger.info("pong")
+    ```
+    """
+
+    def register(handler: Callable[..., Any]):
+        COMMANDS[name] = handler
+        return handler
+
+    return register
+
+
+def send_command(redis, instance_id: str, name: str, **args) -> int:
+    "Send a control command to an instance, returns the number of instances that received it"
+    return redis.publish(
+        control_channel(instance_id), json.dumps({"command": name, "args": args})
+    )
+
+
+def dispatch(data: bytes, context: Dict[str, Any]) -> None:
+    "Run the handler of a received control command, `context` holds the instance settings (id, log dir)"
+    try:
+        message = json.loads(data)
+        handler = COMMANDS[message["command"]]
+    except (ValueError, KeyError, TypeError):
+        engine_util.logger.warning(f"Ignoring invalid control command {data!r}")
+        return
+    try:
+        handler(**context, **message.get("args", {}))
+    except Exception as e:
+        engine_util.logger.error(f"Control command {message['command']} failed: {e}")
+
+
+class ControlListener(Thread):
+    """
+    Background thread of an extension instance running the commands received on its control channel.
+    It is started by `Database.start_background`, commands are sent by the engine with `send_command`.
+    """
+
+    def __init__(
+        self, redis, instance_id: str, log_dir: str = None, **context
+    ) -> None:
+        "`context` holds more settings passed to the handlers (e.g. the instance profiler)"
+        super().__init__(name="control-listener", daemon=True)
+        self.instance_id = instance_id
+        self.context = {"instance_id": instance_id, "log_dir": log_dir, **context}
+        self.stopped = False
+        self.pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(control_channel(instance_id))
+
+    def run(self) -> None:
+        try:
+            for message in self.pubsub.listen():
+                if message and message["type"] == "message":
+                    dispatch(message["data"], self.context)
+        except Exception:
+            # the connection is closed by `stop`
+            if not self.stopped:
+                raise
+
+    def stop(self) -> None:
+        self.stopped = True
+        self.pubsub.close()
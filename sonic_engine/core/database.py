@@ -1,19 +1,73 @@
+import os
 import pickle
-from queue import Queue
-from threading import Thread
+from queue import Empty, Queue
+from threading import Lock, Thread, local
+from time import perf_counter, time
 from typing import Any, Dict, Iterator, List, Union
+from urllib.parse import urlparse
 from redis.client import PubSub
 import redis
 
-from sonic_engine.model.extension import FeatureConfig, InferenceConfig, ReportingConfig
+from sonic_engine.core.batch import ColumnBatch, is_batch
+from sonic_engine.core.broker import MEMORY_SCHEME, LocalRedis, local_broker
+from sonic_engine.core.control import ControlListener
+from sonic_engine.core.flight import FlightRecorder
+from sonic_engine.core.metrics import (
+    REGISTRY,
+    ChannelMetrics,
+    MetricsExporter,
+    MetricsRegistry,
+)
+from sonic_engine.core import memory  # registers the memory control commands
+from sonic_engine.core.partition import HashRing, partition_channel, partition_of
+from sonic_engine.core.profiling import PROFILER, Profiler
+from sonic_engine.core.routing import (
+    LEAST_LOADED,
+    LOAD_REPORT_INTERVAL,
+    LeastLoadedRouter,
+    encode_load,
+    load_key,
+    replica_channel,
+)
+from sonic_engine.core.tracing import (
+    CURRENT_TRACE,
+    TracedPayload,
+    Tracer,
+    is_traced,
+    unwrap,
+    wrap,
+)
+from sonic_engine.model.extension import (
+    FeatureConfig,
+    InferenceConfig,
+    LogConfig,
+    ReportingConfig,
+    TracingConfig,
+)
 
+REDIS_URL_ENV = "SONIC_REDIS_URL"
+"Environment variable holding the redis url, exported by the engine to its extensions"
 
-class Database:
-    "Database manager"
+REDIS_FLUSH_ENV = "SONIC_REDIS_FLUSH"
+"Environment variable telling whether the database is flushed on connection"
+
+DEFAULT_REDIS_URL = "unix:///run/redis.sock"
+
+
+def connect(url: str = None) -> Union[redis.StrictRedis, LocalRedis]:
+    """Create a redis client from an url
+    `unix:///path/to/redis.sock` connects through a local socket, `redis://host:port/db` through TCP,
+    `memory://` returns the in-process broker shared by the threads of the process (see `LocalRedis`)
+    """
+    url = url or os.environ.get(REDIS_URL_ENV, DEFAULT_REDIS_URL)
+    parsed = urlparse(url)
 
-    def __init__(self):
-        self.redis = redis.StrictRedis(
-            unix_socket_path="/run/redis.sock",
+    if parsed.scheme == MEMORY_SCHEME:
+        return local_broker(parsed.netloc)
+
+    if parsed.scheme == "unix":
+        return redis.StrictRedis(
+            unix_socket_path=parsed.path,
             db=0,
             charset="utf-8",
             socket_keepalive=True,
@@ -22,35 +76,182 @@ class Database:
             health_check_interval=30,
         )
 
+    return redis.StrictRedis.from_url(
+        url,
+        socket_keepalive=True,
+        retry_on_timeout=True,
+        decode_responses=False,
+        health_check_interval=30,
+    )
+
+
+class Database:
+    "Database manager"
+
+    def __init__(
+        self, url: str = None, flush: bool = None, registry: MetricsRegistry = None
+    ):
+        self.redis = connect(url)
+        self.local = isinstance(self.redis, LocalRedis)
+        "in-process broker, the messages and stored objects are passed by reference"
+
+        if flush is None:
+            flush = os.environ.get(REDIS_FLUSH_ENV, "1") != "0"
+
         self.is_listening = False
-        self.redis.flushdb()
+        self._listener: Thread = None
+        self.pubsubs: List[PubSub] = []
+        self.instance_id: str = None
+        self.channels = None
+        self.partitions: Dict[str, int] = {}
+        self.routing: Dict[str, str] = {}
+        self.routers: Dict[str, LeastLoadedRouter] = {}
+        self._load_reported_at = 0.0
+        self.subscriptions: Dict[bytes, str] = {}
+        "channel of every subscribed redis channel (partitions and replicas sub-channels)"
+        self.registry = registry or REGISTRY
+        "metrics registry of the instance, an instance thread has its own (see `InstanceThread`)"
+        # an instance thread has its own profiler, polled by its `get_message` loop
+        self.profiler = PROFILER if registry is None else Profiler()
+        self.metrics: Dict[str, ChannelMetrics] = {}
+        self.queue_depth = self.registry.gauge(
+            "sonic_queue_depth", "Messages received and waiting to be handled"
+        )
+        self.exporter: MetricsExporter = None
+        self.control: ControlListener = None
+        self._log_dir: str = None
+        self.tracer: Tracer = None
+        self.flight_recorder: FlightRecorder = None
+        self._trace: Dict = None
+        "trace context of the message being handled, continued by the messages it publishes"
+        if flush:
+            self.redis.flushdb()
 
     def register_extension(
-        self, config: Union[FeatureConfig, InferenceConfig, ReportingConfig]
+        self,
+        config: Union[FeatureConfig, InferenceConfig, ReportingConfig],
+        start: bool = True,
     ) -> None:
-        "Register configuration channels to the current instance"
+        """Register configuration channels to the current instance
+        The background threads (metrics export, control commands) are started unless `start` is False, e.g. to fork
+        worker processes first, `start_background` starts them then
+        """
 
+        self.instance_id = config.id
         self.channels = config.channels
+        self.partitions = (self.channels and self.channels.partitions) or {}
+        self.routing = (self.channels and self.channels.routing) or {}
+        self.ring = HashRing(config.replicas or [config.id])
         self.pubsubs = self.subscribe_all()
+        log_dir = (config.log or LogConfig()).dir
+        self.tracer = Tracer(
+            config.name or config.id,
+            config.id,
+            config.tracing or TracingConfig(),
+            log_dir,
+            self.registry,
+        )
+        if config.flight_recorder is not None:
+            self.flight_recorder = FlightRecorder(config.flight_recorder, config.id)
+        self._log_dir = log_dir
+        if start:
+            self.start_background()
+
+    def start_background(self) -> None:
+        "Start the background threads of the registered instance, once"
+        if self.exporter is None:
+            self.exporter = MetricsExporter(
+                self.redis, self.instance_id, self.registry
+            )
+            self.exporter.start()
+        if self.control is None:
+            self.control = ControlListener(
+                self.redis, self.instance_id, self._log_dir, profiler=self.profiler
+            )
+            self.control.start()
 
     def subscribe_all(self) -> List[PubSub]:
         "Subscribe to all channels of the registered configuration if available"
-        return [self.subscribe(ch) for ch in self.channels.subscribe if self.channels]
+        if not self.channels or not self.channels.subscribe:
+            return []
+        pubsubs = [self.subscribe(ch) for ch in self.channels.subscribe]
+        return [pubsub for pubsub in pubsubs if pubsub is not None]
 
     def subscribe(self, ch) -> PubSub:
-        "Subscribe to channel"
+        """Subscribe to channel
+        A partitioned channel is subscribed through the sub-channels of the partitions owned by the instance,
+        returns None when the instance owns none of them.
+        A least loaded channel is subscribed through the sub-channel of the instance, fed by the publishers routers
+        """
+
+        if self.routing.get(ch) == LEAST_LOADED:
+            chs = [replica_channel(ch, self.instance_id)]
+            self.redis.hset(load_key(ch), self.instance_id, encode_load(0))
+        elif ch in self.partitions:
+            owned = self.ring.owned(self.instance_id, ch, self.partitions[ch])
+            if not owned:
+                return None
+            chs = [partition_channel(ch, partition) for partition in owned]
+        else:
+            chs = [ch]
 
+        for sub in chs:
+            self.subscriptions[sub.encode()] = ch
         pubsub = self.redis.pubsub()
-        pubsub.subscribe(ch)
+        pubsub.subscribe(*chs)
         return pubsub
 
-    def publish(self, ch, data) -> None:
-        "Publish data into channel"
-        self.redis.publish(ch, data)
+    def publish(self, ch, data, key=None, trace=CURRENT_TRACE) -> None:
+        """Publish data into channel
+        Messages of a partitioned channel need a `key` (e.g. the flow 5-tuple), messages with the same key keep their order.
+        Messages of a least loaded channel go to the replica with the shortest queue, they are dropped if no replica is alive.
+        A `ColumnBatch` is encoded, subscribers receive it decoded (the in-process broker passes it as is)
+        Sampled messages carry a trace context (see `Tracer`), subscribers receive it as `message["trace"]`
+        A message continues the trace of the message being handled, or `trace` if set (e.g. publishing from another thread)
+        The last messages of every channel are kept in redis if the flight recorder is configured (see `FlightRecorder`)
+        """
+        if isinstance(data, ColumnBatch) and not self.local:
+            data = data.encode()
+        if self.tracer is not None:
+            current = self._trace if trace is CURRENT_TRACE else trace
+            context = self.tracer.start(current)
+            if context is not None:
+                # the in-process broker keeps the payload an object
+                if self.local:
+                    data = TracedPayload(context, data)
+                else:
+                    data = wrap(context, data)
+        metrics = self.channel_metrics(ch)
+        metrics.published.inc()
+        recorded = ch
+        if self.routing.get(ch) == LEAST_LOADED:
+            if ch not in self.routers:
+                self.routers[ch] = LeastLoadedRouter(self.redis, ch)
+            replica = self.routers[ch].pick()
+            if replica is not None:
+                ch = replica_channel(ch, replica)
+            else:
+                metrics.dropped.inc()
+        elif ch in self.partitions:
+            if key is None:
+                raise ValueError(
+                    f"Publishing to the partitioned channel {ch} requires a key"
+                )
+            ch = partition_channel(ch, partition_of(key, self.partitions[ch]))
+        if self.flight_recorder is None:
+            self.redis.publish(ch, data)
+            return
+        # one round trip for the message and its recording
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.publish(ch, data)
+        self.flight_recorder.record(pipeline, recorded, data)
+        pipeline.execute()
 
-    def get_message(self, timeout=0.3) -> Iterator[Dict[str, Any]]:
+    def get_message(self, timeout=0.3, timed: bool = True) -> Iterator[Dict[str, Any]]:
         """Get messages frpm subscribed channels
         If `timeout` is specified, pass it to redis `get_message()` function
+        A message is handled until the next one is requested, unless `timed` is False: the subscriber then reports
+        the handling with `handled` (e.g. once a batch of messages is handled)
         """
         queue = Queue()
 
@@ -59,27 +260,124 @@ class Database:
                 for pubsub in self.pubsubs:
                     data = pubsub.get_message(timeout=timeout)
                     if data:
+                        data["received_at"] = time()
                         queue.put_nowait(data)
+                self.queue_depth.set(queue.qsize())
+                self.report_load(queue.qsize())
 
         self.is_listening = True
-        Thread(target=listen).start()
+        self._listener = Thread(target=listen, daemon=True)
+        self._listener.start()
 
-        while True:
-            if not queue.empty() and (data := queue.get_nowait()):
+        # ends once `stop_listening` is called
+        while self.is_listening:
+            if self.profiler.armed:
+                self.profiler.poll()
+            try:
+                data = queue.get(timeout=timeout)
+            except Empty:
+                continue
+            if data:
+                data["dequeued_at"] = dequeued = time()
                 data["queue_length"] = queue.qsize()
+                trace = None
+                if is_traced(data["data"]):
+                    trace, data["data"] = unwrap(data["data"])
+                data["trace"] = trace
+                if is_batch(data["data"]):
+                    data["data"] = ColumnBatch.decode(data["data"])
+                ch = self._channel_name(data)
+                metrics = self.channel_metrics(ch)
+                if data["type"] == "message":
+                    metrics.received.inc()
+                    metrics.queue_wait.observe(dequeued - data["received_at"])
+                if not timed:
+                    yield data
+                    continue
+                self._trace = trace
+                started = perf_counter()
                 yield data
+                # the generator resumes once the subscriber handled the message
+                self._trace = None
+                self._record_handling(ch, data, perf_counter() - started)
+
+    def handled(self, messages: List[Dict[str, Any]], seconds: float) -> None:
+        """Record the handling of messages received with `get_message(timed=False)`, handled together in `seconds`
+        Every message accounts for an equal share of the time
+        """
+        for message in messages:
+            ch = self._channel_name(message)
+            self._record_handling(ch, message, seconds / len(messages))
+
+    def _channel_name(self, message: Dict[str, Any]) -> str:
+        ch = self.subscriptions.get(message["channel"])
+        if ch is None:
+            ch = message["channel"].decode(errors="replace")
+        return ch
+
+    def _record_handling(self, ch: str, message: Dict[str, Any], seconds: float):
+        self.channel_metrics(ch).handler_seconds.observe(seconds)
+        trace = message["trace"]
+        if trace is not None and self.tracer is not None:
+            received, dequeued = message["received_at"], message["dequeued_at"]
+            self.tracer.record(trace, ch, received, dequeued, time())
+
+    def channel_metrics(self, ch) -> ChannelMetrics:
+        "Built-in metrics of a channel"
+        if isinstance(ch, bytes):
+            ch = ch.decode(errors="replace")
+        metrics = self.metrics.get(ch)
+        if metrics is None:
+            metrics = self.metrics[ch] = ChannelMetrics(ch, self.registry)
+        return metrics
+
+    def report_load(self, queue_length: int) -> None:
+        """Report the queue length of the instance for every subscribed channel, at most every `LOAD_REPORT_INTERVAL`
+        Read by the publishers of least loaded channels to route their messages, and by the HTTP ingestion for backpressure
+        """
+        now = time()
+        if now - self._load_reported_at < LOAD_REPORT_INTERVAL:
+            return
+        self._load_reported_at = now
+
+        chs = set(self.subscriptions.values())
+        if not chs:
+            return
+        pipeline = self.redis.pipeline(transaction=False)
+        for ch in chs:
+            pipeline.hset(load_key(ch), self.instance_id, encode_load(queue_length))
+        pipeline.execute()
 
     def stop_listening(self):
-        "Stop listening to redis channels"
+        "Stop listening to redis channels, the `get_message` loop ends"
         self.is_listening = False
 
+    def close(self) -> None:
+        "Stop listening, unsubscribe, and stop the background threads of the instance (metrics export, control commands)"
+        self.stop_listening()
+        if self._listener is not None:
+            # the listening thread leaves after its current poll
+            self._listener.join(timeout=1)
+        for pubsub in self.pubsubs:
+            pubsub.close()
+        self.pubsubs = []
+        if self.exporter is not None:
+            self.exporter.stop()
+        if self.control is not None:
+            self.control.stop()
+
     def store(self, name, key, data):
         "Store in the database using `hset`"
+        if self.local:
+            # kept by reference, the tuple is not encoded like the scalars
+            return self.redis.hset(name, key, (data,))
         return self.redis.hset(name, key, pickle.dumps(data))
 
     def retrieve(self, name, key):
         "Retrieve from the database using `hget`"
         data = self.redis.hget(name, key)
+        if self.local:
+            return data[0]
         return pickle.loads(data)
 
     def delete(self, name, key):
@@ -87,4 +385,29 @@ class Database:
         return self.redis.hdel(name, key)
 
 
-__db__ = Database()
+_db: Database = None
+_db_lock = Lock()
+_thread = local()
+
+
+def bind_thread_database(db: Database) -> None:
+    """Make `db` the `__db__` imported from the current thread
+    Every extension instance run as a thread of the engine (see `ThreadHandler`) has its own database
+    """
+    _thread.db = db
+
+
+def __getattr__(name: str):
+    """The `__db__` database of the process is created on first use
+    Importing the module neither connects to redis nor flushes it
+    """
+    global _db
+    if name != "__db__":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    db = getattr(_thread, "db", None)
+    if db is not None:
+        return db
+    with _db_lock:
+        if _db is None:
+            _db = Database()
+    return _db
@@ -1,13 +1,23 @@
 import os
+from dataclasses import replace
 from shutil import which
-from time import sleep
+from threading import RLock
+from time import sleep, time
+from typing import TYPE_CHECKING, Dict, List, Union
 from sonic_engine.core.extension import ExtensionHandler
-from sonic_engine.core.yapsy_methods import YapsyHandler
-from sqlite3 import NotSupportedError
-import redis
-from sonic_engine.model.app_config import AppConfig, AppConfigExtension
+from sonic_engine.core.metrics import REGISTRY
+from sonic_engine.model.app_config import (
+    AppConfig,
+    ExtensionGlobalConfig,
+)
+from sonic_engine.util.config_cache import CONFIG_CACHE
 from sonic_engine.util.functions import EngineUtil
 
+if TYPE_CHECKING:
+    # yapsy, redis and the database load when the engine starts, importing the engine stays cheap
+    from sonic_engine.core.threads import ThreadHandler
+    from sonic_engine.core.yapsy_methods import YapsyHandler
+
 engine_util = EngineUtil()
 
 
@@ -38,6 +48,45 @@ class Engine:
         self.config: AppConfig = engine_util.load_config(
             cls=AppConfig, config_file_path=config_file
         )
+        self.configs: Dict[str, ExtensionGlobalConfig] = {}
+        "global configuration of every installed instance"
+        self.running: Dict[str, Union["YapsyHandler", "ThreadHandler"]] = {}
+        "handler of every instance run by the engine"
+        self.started_at: float = None
+        self.lock = RLock()
+        "guards `configs` and `running`, the control plane changes them from its thread"
+
+    def _export_redis_settings(self):
+        """
+        Exports the redis connection settings to the environment so the database module and the extensions processes connect to the same redis.
+
+        Returns:
+        - None
+        """
+        from sonic_engine.core.database import REDIS_FLUSH_ENV, REDIS_URL_ENV
+
+        redis_config = self.config.metadata.redis
+        os.environ[REDIS_URL_ENV] = redis_config.url
+        # nodes share the database, a starting node must not wipe the others leases
+        flush = redis_config.flush and self.config.metadata.cluster is None
+        os.environ[REDIS_FLUSH_ENV] = "1" if flush else "0"
+
+    def _check_isolation(self):
+        """
+        Checks that the isolation of the instances can work with the redis url: the in-process broker is only shared by threads.
+
+        Returns:
+        - None
+        """
+        from sonic_engine.core.broker import MEMORY_SCHEME
+
+        metadata = self.config.metadata
+        if not metadata.redis.url.startswith(f"{MEMORY_SCHEME}://"):
+            return
+        if metadata.isolation != "thread":
+            raise ValueError("The memory:// broker needs the thread isolation")
+        if metadata.cluster is not None:
+            raise ValueError("The nodes of a cluster can not share a memory:// broker")
 
     def _check_redis(self):
         """
@@ -46,13 +95,23 @@ class Engine:
         Returns:
         - None
         """
+        import redis
+
         try:
-            import sonic_engine.core.database
+            from sonic_engine.core.database import __db__
 
+            __db__.redis.ping()
             engine_util.logger.info("Redis is running!")
 
         except redis.exceptions.ConnectionError:
+            if not self.config.metadata.redis.url.startswith("unix://"):
+                engine_util.logger.error(
+                    f"Redis is NOT reachable at {self.config.metadata.redis.url}!"
+                )
+                raise ConnectionError("Redis database is not running!")
             if which("redis-server") is None:
+                from sqlite3 import NotSupportedError
+
                 raise NotSupportedError("redis-server must be installed!")
             msg = 'Looks like Redis database is not running, run "redis-server --daemonize yes"? (y/n) '
             response = input(msg)
@@ -74,6 +133,8 @@ class Engine:
         - None
         """
         # check if redis is running
+        self._export_redis_settings()
+        self._check_isolation()
         self._check_redis()
 
         # check if replace_existing is set to None, True, False
@@ -97,25 +158,39 @@ class Engine:
         for config_extension in self.config.extensions:
             extension = ExtensionHandler(
                 self.config.metadata,
-                AppConfigExtension(**config_extension),
+                config_extension,
             )
             extension_instances_configs: list = extension.install()
             instances_configs_list.extend(extension_instances_configs)
 
-        # create the yapsy handler and run all
-        yapsy_handler = YapsyHandler(
-            self.config.metadata.extensions_folder, instances_configs_list
-        )
-        yapsy_handler.runAll()
+        self.configs = {
+            config.id: config for config in instances_configs_list if config
+        }
+        CONFIG_CACHE.save()
+        self.started_at = time()
+
+        if self.config.metadata.cluster is not None:
+            self._run_cluster()
+            return
+
+        # run every instance with its own yapsy handler so it can be restarted alone
+        for instance_id in list(self.configs):
+            self.start_instance(instance_id)
+        watchdog = self._memory_watchdog()
+        dumped = set()
+        "handlers of the crashed instances whose flight recorder was dumped"
 
         try:
-            while yapsy_handler.countAlive():
+            while self.count_alive():
                 try:
                     sleep(1)
+                    if watchdog is not None:
+                        self._watch_memory(watchdog)
+                    self._dump_crashed(dumped)
                 except KeyboardInterrupt:
                     # You can perform any cleanup or additional actions here if needed
                     engine_util.logger.info("Exiting the program.")
-                    yapsy_handler.killAll()
+                    self.stop_all()
                     break  # Break out of the while loop
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
@@ -123,3 +198,293 @@ class Engine:
         finally:
             # Perform cleanup actions here, if any
             print("Exiting the program.")
+
+    def _start_instance(self, config) -> Union["YapsyHandler", "ThreadHandler"]:
+        """
+        Runs an extension instance in its own yapsy handler, or in a thread handler with the `thread` isolation.
+
+        Args:
+        - config: The instance global configuration.
+
+        Returns:
+        - YapsyHandler | ThreadHandler: The handler running the instance.
+        """
+        if self.config.metadata.isolation == "thread":
+            from sonic_engine.core.threads import ThreadHandler as Handler
+        else:
+            from sonic_engine.core.yapsy_methods import YapsyHandler as Handler
+
+        handler = Handler(self.config.metadata.extensions_folder, [config])
+        handler.runAll()
+        return handler
+
+    def _check_standalone(self) -> None:
+        "The instances of a cluster node follow its leases, they can not be started or stopped by hand"
+        if self.config.metadata.cluster is not None:
+            raise RuntimeError("Instances are managed by the cluster leases")
+
+    def start_instance(self, instance_id: str) -> bool:
+        """
+        Starts an installed instance.
+
+        Args:
+        - instance_id (str): The id of the instance.
+
+        Returns:
+        - bool: False if the instance was already running.
+        """
+        self._check_standalone()
+        with self.lock:
+            config = self.configs[instance_id]
+            handler = self.running.get(instance_id)
+            if handler is not None and handler.countAlive():
+                return False
+            self.running[instance_id] = self._start_instance(config)
+            return True
+
+    def stop_instance(self, instance_id: str) -> bool:
+        """
+        Stops a running instance.
+
+        Args:
+        - instance_id (str): The id of the instance.
+
+        Returns:
+        - bool: False if the instance was not running.
+        """
+        self._check_standalone()
+        with self.lock:
+            handler = self.running.pop(instance_id, None)
+            if handler is None:
+                return False
+            handler.killAll()
+            return True
+
+    def restart_instance(self, instance_id: str) -> None:
+        """
+        Restarts an instance.
+
+        Args:
+        - instance_id (str): The id of the instance.
+
+        Returns:
+        - None
+        """
+        with self.lock:
+            self.stop_instance(instance_id)
+            self.start_instance(instance_id)
+            self._count_restart(instance_id)
+
+    def _count_restart(self, instance_id: str) -> None:
+        "Counts a restart of an instance in the engine metrics"
+        REGISTRY.counter(
+            "sonic_instance_restarts_total",
+            "Instances restarted: lost by their node, recycled for their memory or on request",
+            instance=instance_id,
+        ).inc()
+
+    def scale(self, extension_id: str, replicas: int) -> List[str]:
+        """
+        Sets the number of instances of an extension, the added instances are copies of the extension default instance.
+        The instances subscribed to partitioned channels are restarted for the partitions to be reassigned.
+
+        Args:
+        - extension_id (str): The id of the extension (its default instance id).
+        - replicas (int): The number of instances to run.
+
+        Returns:
+        - List[str]: The ids of the instances of the extension.
+        """
+        self._check_standalone()
+        if replicas < 1:
+            raise ValueError("An extension needs at least one instance")
+        with self.lock:
+            base = self.configs[extension_id]
+            ids = list(base.replicas or [extension_id])
+            for instance_id in ids[replicas:]:
+                self.stop_instance(instance_id)
+                del self.configs[instance_id]
+            ids = ids[:replicas]
+            previous = set(ids)
+
+            number = 1
+            while len(ids) < replicas:
+                instance_id = f"{extension_id}-{number}"
+                number += 1
+                if instance_id in self.configs:
+                    continue
+                self.configs[instance_id] = replace(base, id=instance_id)
+                ids.append(instance_id)
+
+            partitioned = bool(base.channels and base.channels.partitions)
+            for instance_id in ids:
+                self.configs[instance_id].replicas = ids
+                if instance_id not in previous:
+                    self.start_instance(instance_id)
+                elif partitioned and instance_id in self.running:
+                    self.restart_instance(instance_id)
+            return ids
+
+    def count_alive(self) -> int:
+        "Number of running instances"
+        with self.lock:
+            return sum(handler.countAlive() for handler in self.running.values())
+
+    def stop_all(self) -> None:
+        "Stops all the instances"
+        with self.lock:
+            for handler in self.running.values():
+                handler.killAll()
+
+    def status(self) -> dict:
+        "Summary of the engine state"
+        return {
+            "mode": "standalone" if self.config.metadata.cluster is None else "cluster",
+            "uptime": time() - self.started_at if self.started_at else 0.0,
+            "instances": len(self.configs),
+            "running": self.count_alive(),
+        }
+
+    def instances(self) -> List[dict]:
+        "State of every installed instance"
+        with self.lock:
+            pids = {}
+            for handler in self.running.values():
+                pids.update(handler.pids())
+            return [
+                {
+                    "id": instance_id,
+                    "category": config.category,
+                    "replicas": config.replicas,
+                    "running": instance_id in pids,
+                    "pid": pids.get(instance_id),
+                }
+                for instance_id, config in self.configs.items()
+            ]
+
+    def _memory_watchdog(self):
+        """
+        Creates the memory watchdog of the instances if `metadata.memory` is configured.
+
+        Returns:
+        - MemoryWatchdog: The watchdog, or None.
+        """
+        if self.config.metadata.memory is None:
+            return None
+        if self.config.metadata.isolation == "thread":
+            engine_util.logger.warning(
+                "The instances threads share the engine memory, the memory watchdog is disabled"
+            )
+            return None
+        from sonic_engine.core.database import __db__
+        from sonic_engine.core.memory import MemoryWatchdog
+
+        return MemoryWatchdog(__db__.redis, self.config.metadata.memory)
+
+    def _watch_memory(self, watchdog) -> None:
+        """
+        Samples the memory of the running instances and restarts the ones the watchdog recycles.
+
+        Args:
+        - watchdog (MemoryWatchdog): The memory watchdog.
+
+        Returns:
+        - None
+        """
+        with self.lock:
+            pids = {}
+            for handler in self.running.values():
+                pids.update(handler.pids())
+            for instance_id in watchdog.check(pids):
+                self.running[instance_id].killAll()
+                self.running[instance_id] = self._start_instance(
+                    self.configs[instance_id]
+                )
+                self._count_restart(instance_id)
+
+    def _dump_crashed(self, dumped: set) -> None:
+        """
+        Dumps the flight recorder of the channels of the crashed instances to their log folder, once per crash.
+
+        Args:
+        - dumped (set): The handlers of the crashed instances already dumped, updated with the dumped ones.
+
+        Returns:
+        - None
+        """
+        from sonic_engine.core.database import __db__
+        from sonic_engine.core.flight import dump, dump_path
+
+        with self.lock:
+            crashed = [
+                (instance_id, handler)
+                for instance_id, handler in self.running.items()
+                if handler not in dumped and instance_id in handler.crashed()
+            ]
+        for instance_id, handler in crashed:
+            dumped.add(handler)
+            config = self.configs[instance_id]
+            channels = set()
+            if config.channels is not None:
+                channels.update(config.channels.subscribe or [])
+                channels.update(config.channels.publish or [])
+            log_dir = (config.log and config.log.dir) or "./logs"
+            path = dump_path(log_dir, instance_id)
+            count = dump(__db__.redis, channels, path)
+            engine_util.logger.error(
+                f"{instance_id} crashed, {count} recorded messages of its channels dumped to {path}"
+            )
+
+    def _run_cluster(self) -> None:
+        """
+        Runs the engine as a node of a cluster: every node installs all the extensions but only runs the instances it holds a lease on.
+        The leases are renewed every `heartbeat_interval`, the instances of a dead node are taken over by the surviving nodes.
+
+        Returns:
+        - None
+        """
+        from sonic_engine.core.cluster import ClusterNode
+        from sonic_engine.core.database import __db__
+
+        cluster_config = self.config.metadata.cluster
+        node = ClusterNode(__db__.redis, list(self.configs.keys()), cluster_config)
+        started = set()
+        "instances started at least once by this node"
+        watchdog = self._memory_watchdog()
+        dumped = set()
+
+        engine_util.logger.info(
+            f"Node {node.node_id} joined the cluster with {len(self.configs)} instances"
+        )
+
+        try:
+            while True:
+                started_at = time()
+                acquired, lost = node.tick()
+
+                with self.lock:
+                    for instance_id in lost:
+                        handler = self.running.pop(instance_id, None)
+                        if handler is not None:
+                            handler.killAll()
+
+                    for instance_id in acquired:
+                        if instance_id in started:
+                            self._count_restart(instance_id)
+                        started.add(instance_id)
+                        self.running[instance_id] = self._start_instance(
+                            self.configs[instance_id]
+                        )
+
+                if watchdog is not None:
+                    self._watch_memory(watchdog)
+                self._dump_crashed(dumped)
+
+                sleep(max(cluster_config.heartbeat_interval - (time() - started_at), 0))
+        except KeyboardInterrupt:
+            engine_util.logger.info("Exiting the program.")
+        finally:
+            self.stop_all()
+            # hand the instances over without waiting for the leases to expire
+            node.leave()
+            print("Exiting the program.")
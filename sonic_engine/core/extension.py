@@ -73,8 +73,10 @@ class ExtensionHandler:
                             default_config, self.config.override[instance_id]
                         )
                     )
-        # updating the instance path
+        # updating the instance path and the replicas sharing the partitioned channels
+        replicas = [instance.id for instance in instances_list]
         for instance in instances_list:
+            instance.replicas = replicas
             if not instance.copy_folder:
                 instance.path = instance.source
             else:
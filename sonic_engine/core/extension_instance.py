@@ -1,16 +1,22 @@
 from sonic_engine.model.app_config import ExtensionGlobalConfig
 from sonic_engine.model.extension import FeatureConfig, InferenceConfig, ReportingConfig
 from sonic_engine.util.functions import EngineUtil
+import compileall
 import os
 import platform
+import py_compile
+import re
 import sys
 import subprocess
 import shutil
-from typing import Union
+from typing import List, Union
 
 engine_util = EngineUtil()
 UnionType = Union[FeatureConfig, InferenceConfig, ReportingConfig]
 
+VENV_PATHS_FILE = "venv-paths.pth"
+"Site-packages folders of the instance venv, one per line relative to the instance folder, in the `.pth` format"
+
 
 class ProcessResultSimulation:
     def __init__(self, returncode):
@@ -38,8 +44,9 @@ class ExtensionInstanceHandler:
     3. The method then loads local configurations for the extension by calling the loadConfig method from the engineUtil object.
     4. It creates a virtual environment for the extension using the python -m virtualenv command if the virtual environment does not already exist.
     5. The method installs the required packages for the extension by running pip install -r requirements.txt using the Python binary within the virtual environment.
-    6. It writes the contents of an __init__.py file that includes import statements and adds custom site packages paths to the Python system path.
-    7. Finally, the method writes the Yapsy plugin configuration to a file named main.yapsy-plugin.
+    6. It compiles the instance code and its venv packages to bytecode in parallel (unless `compile_bytecode` is False).
+    7. It writes the venv site-packages paths to a `.pth` file and an __init__.py file that adds them to the Python system path.
+    8. Finally, the method writes the Yapsy plugin configuration to a file named main.yapsy-plugin.
     """
 
     def __init__(self, config: ExtensionGlobalConfig, replace_existing=None) -> None:
@@ -82,7 +89,12 @@ class ExtensionInstanceHandler:
         # install requirements
         self._install_requirements(python_bin)
 
+        # compile the bytecode once, instead of at the first start of every replica
+        if self.config.compile_bytecode:
+            self._compile_bytecode()
+
         # write __init__ and yapsy_plugin files
+        self._write_venv_paths_file()
         self._write_init_file()
         self._write_yapsy_plugin_file()
 
@@ -190,6 +202,7 @@ class ExtensionInstanceHandler:
             )
             self.config = new_config
             self.config.path = instance_path
+            self.config.set_defaults()
         except Exception as e:
             engine_util.logger.error(f"Error loading local configs: {e}")
 
@@ -269,46 +282,110 @@ class ExtensionInstanceHandler:
             )
             engine_util.stop_engine(1)
 
-    def _write_init_file(self):
+    def _compile_bytecode(self):
         """
-        Write the contents of an __init__.py file in the specified directory.
+        Compile the instance code and its venv packages to bytecode, using all the CPUs.
 
-        This method generates a script that includes import statements and adds custom site packages paths to the Python system path.
-        The script is then written to the __init__.py file.
+        The pycs are compiled by the engine interpreter, which imports them. The instance code keeps timestamp pycs as it
+        may be edited in place, the venv packages are compiled to unchecked-hash pycs if `frozen_venv` is set.
+        A failure is logged, the instance still starts and compiles its modules on import.
+        """
+        venv_path = os.path.join(self.config.path, ".venv")
+        venv_mode = (
+            py_compile.PycInvalidationMode.UNCHECKED_HASH
+            if self.config.frozen_venv
+            else py_compile.PycInvalidationMode.TIMESTAMP
+        )
+        try:
+            compiled = compileall.compile_dir(
+                self.config.path,
+                quiet=1,
+                workers=0,
+                rx=re.compile(r"[/\\]\.venv[/\\]"),
+            )
+            if os.path.isdir(venv_path):
+                compiled &= compileall.compile_dir(
+                    venv_path, quiet=1, workers=0, invalidation_mode=venv_mode
+                )
+        except Exception as e:
+            engine_util.logger.error(
+                f"Error compiling bytecode: {e} for {self.config.id}"
+            )
+            return
+        if compiled:
+            engine_util.logger.info(f"Bytecode compiled for {self.config.id}")
+        else:
+            engine_util.logger.warning(
+                f"Some modules failed to compile for {self.config.id}"
+            )
 
-        Outputs:
-        - None. The method writes the script to the __init__.py file.
+    def _site_packages_paths(self) -> List[str]:
+        """
+        Site-packages folders of the instance venv, relative to the instance folder.
+
+        Returns:
+            list: The folders for the current platform, None if the platform is not supported.
         """
         python_version = sys.version_info[0:2]  # (3, 9)
+        python = f"python{python_version[0]}.{python_version[1]}"
 
-        site_packages_for_linux = f"custom_site_packages_path = engine_util.relative(__file__, '.venv/lib/python{python_version[0]}.{python_version[1]}/site-packages')"
-        site_packages_for_windows = f"custom_site_packages_path = engine_util.relative(__file__, '.venv/Lib/site-packages')"
-        site_packages_64_for_linux = f"custom_site_packages_64_path = engine_util.relative(__file__, '.venv/lib64/python{python_version[0]}.{python_version[1]}/site-packages')"
         if self.system_platform == "Windows":
-            site_packages = site_packages_for_windows
-            site_packages_64 = f"custom_site_packages_64_path = engine_util.relative(__file__, '.venv/Lib/site-packages')"
+            return [".venv/Lib/site-packages"]
         elif self.system_platform == "Linux":
-            site_packages = site_packages_for_linux
-            site_packages_64 = site_packages_64_for_linux
-        else:
-            engine_util.logger.error(
-                f"Unsupported platform: {self.system_platform} for __init__.py"
-            )
-            engine_util.stop_engine(1)
+            return [
+                f".venv/lib/{python}/site-packages",
+                f".venv/lib64/{python}/site-packages",
+            ]
+        engine_util.logger.error(
+            f"Unsupported platform: {self.system_platform} for __init__.py"
+        )
+        engine_util.stop_engine(1)
+        return None
+
+    def _write_venv_paths_file(self):
+        """
+        Write the site-packages folders of the instance venv to the `venv-paths.pth` file, read by the __init__.py file.
+
+        Outputs:
+        - None. The method writes the paths to the `venv-paths.pth` file.
+        """
+        paths = self._site_packages_paths()
+        if paths is None:
+            return
+
+        with open(os.path.join(self.config.path, VENV_PATHS_FILE), "w") as f:
+            f.write("\n".join(paths) + "\n")
+
+    def _write_init_file(self):
+        """
+        Write the contents of an __init__.py file in the specified directory.
+
+        This method generates a script that puts the venv site-packages listed in `venv-paths.pth` first in the Python
+        system path and processes their own `.pth` files, as `site` does for the interpreter site-packages.
+        The script is then written to the __init__.py file.
 
+        Outputs:
+        - None. The method writes the script to the __init__.py file.
+        """
         with open(os.path.join(self.config.path, "__init__.py"), "w") as f:
             script = f"""
+import os
+import site
 import sys
-from sonic_engine.util.functions import EngineUtil
-
-engine_util = EngineUtil()
 
-{site_packages}
+instance_path = os.path.dirname(os.path.abspath(__file__))
 
-{site_packages_64}
+with open(os.path.join(instance_path, "{VENV_PATHS_FILE}")) as paths_file:
+    venv_paths = [
+        os.path.join(instance_path, line.strip())
+        for line in paths_file
+        if line.strip() and not line.startswith("#")
+    ]
 
-sys.path.insert(0, custom_site_packages_path)
-sys.path.insert(0, custom_site_packages_64_path)
+for venv_path in reversed(venv_paths):
+    if venv_path not in sys.path:
+        sys.path.insert(0, venv_path)
+    site.addsitedir(venv_path)
 
 # fmt: off
 from .main import *
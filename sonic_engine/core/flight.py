@@ -0,0 +1,67 @@
+import os
+from time import strftime, time
+from typing import Iterable
+
+from sonic_engine.core.recorder import SEGMENT_EXTENSION, SegmentWriter
+from sonic_engine.model.extension import FlightRecorderConfig
+
+FLIGHT_PREFIX = "sonic:flight"
+
+
+def flight_key(ch: str) -> str:
+    "Redis stream holding the last messages published into a channel"
+    return f"{FLIGHT_PREFIX}:{ch}"
+
+
+class FlightRecorder:
+    """
+    Keeps the last `max_messages` messages published into every channel in a capped redis stream.
+
+    Recording is one `XADD ... MAXLEN ~ max_messages` per message, sent in the same pipeline as the publish,
+    the memory used per channel is bounded by the cap. The streams are dumped to segment files (see `recorder.Segment`)
+    when an instance crashes or on demand, and can be replayed with `recorder.Replayer`.
+    """
+
+    def __init__(self, config: FlightRecorderConfig, instance_id: str) -> None:
+        self.max_messages = config.max_messages
+        self.instance_id = instance_id
+
+    def record(self, pipeline, ch: str, data) -> None:
+        "Add the recording of a message to the pipeline publishing it"
+        pipeline.xadd(
+            flight_key(ch),
+            {"data": data, "instance": self.instance_id},
+            maxlen=self.max_messages,
+            approximate=True,
+        )
+
+
+def dump(redis, channels: Iterable[str], path: str, max_age: float = None) -> int:
+    """Write the recorded messages of channels to a segment file, in publication order
+    Only the messages of the last `max_age` seconds are written if set, returns the number of messages written
+    """
+    oldest = time() - max_age if max_age else 0.0
+    records = []
+    for ch in channels:
+        channel = ch.encode()
+        for entry_id, fields in redis.xrange(flight_key(ch)):
+            timestamp = int(entry_id.split(b"-")[0]) / 1000
+            if timestamp >= oldest:
+                records.append((timestamp, channel, fields[b"data"]))
+    if not records:
+        return 0
+
+    records.sort(key=lambda record: record[0])
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    writer = SegmentWriter(path)
+    for record in records:
+        writer.append(*record)
+    writer.close()
+    return len(records)
+
+
+def dump_path(dir: str, name: str) -> str:
+    "Path of a new flight recorder dump"
+    return os.path.join(
+        dir, f"{name}-flight-{strftime('%Y%m%d-%H%M%S')}{SEGMENT_EXTENSION}"
+    )
@@ -0,0 +1,170 @@
+import json
+import struct
+from time import time
+from typing import Any, Dict, List, Optional
+
+from sonic_engine.core.metrics import REGISTRY, ChannelMetrics
+from sonic_engine.core.partition import partition_channel, partition_of
+from sonic_engine.core.routing import (
+    LEAST_LOADED,
+    LOAD_REPORT_INTERVAL,
+    LeastLoadedRouter,
+    decode_load,
+    load_key,
+    replica_channel,
+)
+from sonic_engine.model.app_config import IngestConfig
+
+NDJSON = "application/x-ndjson"
+"Content type of the newline delimited bodies, one message per line"
+
+FRAMES = "application/octet-stream"
+"Content type of the binary bodies, every message is prefixed by its length"
+
+FRAME_HEADER = struct.Struct("<I")
+"Length of a binary frame"
+
+STALL_TIMEOUT = 2.0
+"Seconds after which the queue length reported by a subscriber is ignored"
+
+
+def split_ndjson(body: bytes) -> List[bytes]:
+    "Messages of a newline delimited body, blank lines are skipped"
+    return [line.rstrip(b"\r") for line in body.split(b"\n") if line.strip()]
+
+
+def split_frames(body: bytes) -> List[bytes]:
+    "Messages of a length-prefixed body"
+    messages = []
+    view = memoryview(body)
+    position = 0
+    while position < len(body):
+        if position + FRAME_HEADER.size > len(body):
+            raise ValueError(f"Truncated frame header at byte {position}")
+        (length,) = FRAME_HEADER.unpack_from(body, position)
+        position += FRAME_HEADER.size
+        if position + length > len(body):
+            raise ValueError(f"Truncated frame at byte {position}")
+        messages.append(bytes(view[position : position + length]))
+        position += length
+    return messages
+
+
+class Ingestor:
+    """
+    Publishes the events pushed by external sources over HTTP (`POST /ingest/<channel>`) into channels.
+
+    Only the channels of `config.publish` are accepted. The messages of a body are published through pipelines of
+    `batch_size` messages, one round trip each. Partitioned channels need the key of every message, read from a field
+    of the NDJSON events, and least loaded channels are routed per message as `Database.publish` does.
+
+    Subscribers report their queue length every `LOAD_REPORT_INTERVAL` (see `Database.report_load`), a channel is
+    `overloaded` while one of its subscribers is above `high_watermark`, the sources are then told to retry later.
+
+    Example Usage:
+    ```python
+    ingestor = Ingestor(__db__.redis, IngestConfig(publish=["sensors"]))
+
+    if ingestor.allowed("sensors") and not ingestor.overloaded("sensors"):
+        ingestor.publish("sensors", split_ndjson(body))
+    ```
+    """
+
+    def __init__(
+        self,
+        redis,
+        config: IngestConfig,
+        partitions: Dict[str, int] = None,
+        routing: Dict[str, str] = None,
+    ) -> None:
+        self.redis = redis
+        self.config = config
+        self.channels = set(config.publish or [])
+        self.max_body = int(config.max_body_mb * (1 << 20))
+        self.partitions = partitions or {}
+        self.routing = routing or {}
+        self.routers: Dict[str, LeastLoadedRouter] = {}
+        self.metrics: Dict[str, ChannelMetrics] = {}
+        self._loads: Dict[str, tuple] = {}
+        "highest queue length of the subscribers of every channel and when it was read"
+
+    def allowed(self, ch: str) -> bool:
+        return ch in self.channels
+
+    def overloaded(self, ch: str) -> Optional[str]:
+        "Subscriber of a channel above the high watermark, None if there is none"
+        now = time()
+        cached = self._loads.get(ch)
+        if cached is None or now - cached[2] >= LOAD_REPORT_INTERVAL:
+            longest, subscriber = 0, None
+            for replica, value in self.redis.hgetall(load_key(ch)).items():
+                queue_length, reported_at = decode_load(value)
+                if now - reported_at <= STALL_TIMEOUT and queue_length > longest:
+                    longest, subscriber = queue_length, replica
+            if isinstance(subscriber, bytes):
+                subscriber = subscriber.decode()
+            cached = self._loads[ch] = (longest, subscriber, now)
+        longest, subscriber, _ = cached
+        if longest < self.config.high_watermark:
+            return None
+        REGISTRY.counter(
+            "sonic_ingest_throttled_total",
+            "Ingestion requests refused because a subscriber was over the high watermark",
+            channel=ch,
+        ).inc()
+        return subscriber
+
+    def keys(self, ch: str, messages: List[bytes], field: str) -> List[Any]:
+        "Partition keys of NDJSON messages, read from their `field`"
+        if ch not in self.partitions:
+            return None
+        if not field:
+            raise ValueError(
+                f"Publishing to the partitioned channel {ch} requires a key"
+            )
+        try:
+            return [json.loads(message)[field] for message in messages]
+        except (ValueError, TypeError, KeyError) as e:
+            raise ValueError(f"Can not read the key {field} of a message: {e}")
+
+    def publish(self, ch: str, messages: List[bytes], keys: List[Any] = None) -> int:
+        "Publish messages into a channel, returns the number of messages published"
+        router = None
+        if self.routing.get(ch) == LEAST_LOADED:
+            router = self.routers.get(ch)
+            if router is None:
+                router = self.routers[ch] = LeastLoadedRouter(self.redis, ch)
+        partitions = self.partitions.get(ch)
+        if partitions and keys is None:
+            raise ValueError(
+                f"Publishing to the partitioned channel {ch} requires a key"
+            )
+
+        published = 0
+        pipeline = self.redis.pipeline(transaction=False)
+        for i, message in enumerate(messages):
+            if router is not None:
+                replica = router.pick()
+                if replica is None:
+                    continue
+                target = replica_channel(ch, replica)
+            elif partitions:
+                target = partition_channel(ch, partition_of(keys[i], partitions))
+            else:
+                target = ch
+            pipeline.publish(target, message)
+            published += 1
+            if published % self.config.batch_size == 0:
+                pipeline.execute()
+        pipeline.execute()
+
+        metrics = self.channel_metrics(ch)
+        metrics.published.inc(published)
+        metrics.dropped.inc(len(messages) - published)
+        return published
+
+    def channel_metrics(self, ch: str) -> ChannelMetrics:
+        metrics = self.metrics.get(ch)
+        if metrics is None:
+            metrics = self.metrics[ch] = ChannelMetrics(ch)
+        return metrics
@@ -1,34 +1,204 @@
+import atexit
+import json
 import logging
+import os
+import signal
+import threading
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+from multiprocessing.util import Finalize
+from queue import SimpleQueue
+from typing import Dict
 
-from sonic_engine.model.log import LogOptions
+from sonic_engine.model.extension import LogConfig
 
 logging.basicConfig(format='%(name)s [%(levelname)s] %(message)s')
-# TODO: logging.basicConfig(format='%(name)s %(asctime)s [%(levelname)s] %(message)s')
+
+CONSOLE_FORMAT = '%(name)s [%(levelname)s] %(message)s'
+FILE_FORMAT = '%(asctime)s %(name)s [%(levelname)s] %(message)s'
+
+_listeners: Dict[str, QueueListener] = {}
+"Listener of every configured logger name, they write the records off the logging threads"
+
+_exit_hooks: int = None
+"Id of the process whose exit hooks write the queued records, the forked processes install their own"
+
+
+class LazyMessage:
+    "A log message formatted only when a handler emits it"
+
+    __slots__ = ("msg", "args")
+
+    def __init__(self, msg, args: tuple):
+        self.msg = msg
+        self.args = args
+
+    def __str__(self) -> str:
+        msg = str(self.msg)
+        if self.args and "%" in msg:
+            try:
+                return msg % self.args
+            except (TypeError, ValueError):
+                pass
+        return ' '.join((str(arg) for arg in (msg, ) + self.args))
+
+
+class JsonFormatter(logging.Formatter):
+    "One JSON object per record"
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "name": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    _formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the message and the traceback are rendered by the logging thread, while the arguments and the exception
+        # are in their logged state, the listener only formats the line and writes it
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _file_handler(config: LogConfig, ctx: str) -> logging.Handler:
+    os.makedirs(config.dir, exist_ok=True)
+    path = os.path.join(config.dir, ctx.replace(os.sep, "_") + ".log")
+    if config.rotate_when:
+        return TimedRotatingFileHandler(
+            path, when=config.rotate_when, backupCount=config.backup_count
+        )
+    return RotatingFileHandler(
+        path, maxBytes=config.max_bytes, backupCount=config.backup_count
+    )
+
+
+def _configure(logger: logging.Logger, config: LogConfig, ctx: str) -> None:
+    "Route the logger records through a queue to the console and file handlers"
+    if ctx in _listeners:
+        return
+
+    handlers = [logging.StreamHandler()]
+    if config.dir:
+        handlers.append(_file_handler(config, ctx))
+    for handler in handlers:
+        if config.format == "json":
+            handler.setFormatter(JsonFormatter())
+        elif isinstance(handler, logging.FileHandler):
+            handler.setFormatter(logging.Formatter(FILE_FORMAT))
+        else:
+            handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+
+    queue = SimpleQueue()
+    listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners[ctx] = listener
+
+    logger.handlers = [_QueueHandler(queue)]
+    logger.propagate = False
+    _install_exit_hooks()
+
+
+def _install_exit_hooks() -> None:
+    """Write the queued records when the process exits: the instance processes exit without running `atexit`,
+    and SIGTERM (`killAll` of the engine) ends a process without running any of them unless it is handled
+    """
+    global _exit_hooks
+    if _exit_hooks == os.getpid():
+        return
+    _exit_hooks = os.getpid()
+    Finalize(None, shutdown, exitpriority=0)
+    # a process handling SIGTERM (e.g. an `Extension`) exits normally, the finalizer runs then
+    if (
+        threading.current_thread() is threading.main_thread()
+        and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL
+    ):
+        signal.signal(signal.SIGTERM, _terminate)
+
+
+def _terminate(signum, frame) -> None:
+    "Write the queued records, then terminate the process as SIGTERM does by default"
+    shutdown()
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+@atexit.register
+def shutdown() -> None:
+    "Write the queued records and close the log files"
+    while _listeners:
+        _, listener = _listeners.popitem()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
 
 
 class Logger:
-    def __init__(self, config: LogOptions, ctx: str):
+    """
+    Extension logger, records are written to the console and to `<config.dir>/<ctx>.log` by a background thread.
+
+    Messages are only formatted if the level is enabled, `%`-style arguments are formatted when the record is
+    queued, other arguments are joined with spaces. The queued records are written when the process exits or is
+    terminated.
+
+    Example Usage:
+    ```python
+    logger = Logger(config.log, config.id)
+
+    logger.debug("window %s: %d flows", window.start, len(window.keys))
+    logger.info("connected to", url)
+    ```
+    """
+
+    def __init__(self, config: LogConfig, ctx: str):
         self.ctx = ctx
         self.config = config
         self.level = getattr(logging, config.level)
         self.l = logging.getLogger(name=ctx)
         self.l.setLevel(self.level)
+        _configure(self.l, config, ctx)
 
     def log(self, level: int, msg: str, *args):
-        msg = ' '.join((str(arg) for arg in (msg, ) + args))
-        self.l.log(level, msg)
+        if not self.l.isEnabledFor(level):
+            return
+        self.l.log(level, LazyMessage(msg, args) if args else msg)
 
     def debug(self, msg: str, *args):
-        self.log(logging.DEBUG, str(msg), *args)
+        self.log(logging.DEBUG, msg, *args)
 
     def info(self, msg: str, *args):
-        self.log(logging.INFO, str(msg), *args)
+        self.log(logging.INFO, msg, *args)
 
     def warning(self, msg: str, *args):
-        self.log(logging.WARNING, str(msg), *args)
+        self.log(logging.WARNING, msg, *args)
 
     def error(self, msg: str, *args):
-        self.log(logging.ERROR, str(msg), *args)
+        self.log(logging.ERROR, msg, *args)
 
     def critical(self, msg: str, *args):
-        self.log(logging.CRITICAL, str(msg), *args)
+        self.log(logging.CRITICAL, msg, *args)
+
+    def exception(self, msg: str, *args):
+        "Log an error with the traceback of the exception being handled"
+        if self.l.isEnabledFor(logging.ERROR):
+            self.l.error(LazyMessage(msg, args), exc_info=True)
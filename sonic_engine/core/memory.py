@@ -0,0 +1,178 @@
+import os
+import tracemalloc
+from time import monotonic, strftime
+from typing import Dict, List
+
+from sonic_engine.core.control import command, send_command
+from sonic_engine.core.metrics import REGISTRY, process_stats
+from sonic_engine.model.app_config import MemoryConfig
+from sonic_engine.util.functions import EngineUtil
+
+engine_util = EngineUtil()
+
+MB = 1 << 20
+
+
+class MemoryTracker:
+    """
+    Allocation sites growth of an extension instance, driven by the `memory_snapshot` control command.
+
+    The first snapshot starts `tracemalloc` (allocations made before it are not tracked), every following snapshot is
+    diffed with the previous one and the top growing allocation sites are written to the instance log folder.
+    """
+
+    def __init__(self, frames: int = 10, top: int = 20) -> None:
+        self.frames = frames
+        self.top = top
+        self.previous: tracemalloc.Snapshot = None
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+
+    def snapshot(self, instance_id: str, log_dir: str) -> str:
+        "Take a snapshot, returns the path of the diff report (None for the first snapshot)"
+        if not tracemalloc.is_tracing() or self.previous is None:
+            tracemalloc.start(self.frames)
+            self.previous = self._take()
+            engine_util.logger.info(f"Tracing the allocations of {instance_id}")
+            return None
+
+        current = self._take()
+        stats = current.compare_to(self.previous, "lineno")
+        self.previous = current
+        growing = [stat for stat in stats if stat.size_diff > 0][: self.top]
+
+        os.makedirs(log_dir, exist_ok=True)
+        path = os.path.join(
+            log_dir, f"{instance_id}-memory-{strftime('%Y%m%d-%H%M%S')}.txt"
+        )
+        with open(path, "w") as f:
+            for stat in growing:
+                f.write(f"{stat}\n")
+        if growing:
+            engine_util.logger.warning(
+                f"Top growing allocation site of {instance_id}: {growing[0]} (report: {path})"
+            )
+        return path
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.previous = None
+
+
+TRACKER = MemoryTracker()
+"Allocation tracker of the current process"
+
+
+@command("memory_snapshot")
+def memory_snapshot(instance_id: str, log_dir: str, **args) -> None:
+    TRACKER.snapshot(instance_id, log_dir or ".")
+
+
+@command("memory_stop")
+def memory_stop(**args) -> None:
+    TRACKER.stop()
+
+
+class MemoryWatchdog:
+    """
+    Engine side RSS watchdog of the extensions instances processes.
+
+    After `warmup` seconds the RSS of an instance is its baseline. Every `snapshot_growth_mb` of growth, the instance is
+    asked to take a tracemalloc snapshot: the first one starts tracing, the next ones report the top growing allocation
+    sites. An alert is logged when the RSS reaches `alert_ratio` of `max_rss_mb`, and `check` returns the instances
+    reaching `max_rss_mb` to be recycled if `recycle` is set.
+
+    Example Usage:
+    ```python
+    watchdog = MemoryWatchdog(__db__.redis, config.metadata.memory)
+
+    for instance_id in watchdog.check({"inference-1": pid}):
+        restart(instance_id)
+    ```
+    """
+
+    def __init__(self, redis, config: MemoryConfig) -> None:
+        self.redis = redis
+        self.config = config
+        self._checked_at = float("-inf")
+        self._pids: Dict[str, int] = {}
+        self._started_at: Dict[str, float] = {}
+        self._baselines: Dict[str, float] = {}
+        self._next_snapshot: Dict[str, float] = {}
+        self._alerted = set()
+
+    def forget(self, instance_id: str) -> None:
+        "Reset the state of an instance, its process was replaced"
+        states = (self._pids, self._started_at, self._baselines, self._next_snapshot)
+        for state in states:
+            state.pop(instance_id, None)
+        self._alerted.discard(instance_id)
+
+    def check(self, pids: Dict[str, int]) -> List[str]:
+        "Sample the RSS of the instances processes every `check_interval`, returns the instances to recycle"
+        now = monotonic()
+        if now - self._checked_at < self.config.check_interval:
+            return []
+        self._checked_at = now
+
+        recycle = []
+        for instance_id, pid in pids.items():
+            if self._pids.get(instance_id) != pid:
+                self.forget(instance_id)
+                self._pids[instance_id] = pid
+            rss, _ = process_stats(pid)
+            if not rss:
+                continue
+            REGISTRY.gauge(
+                "sonic_instance_resident_memory_bytes",
+                "Resident memory size of the instance process, sampled by the engine",
+                instance=instance_id,
+            ).set(rss)
+
+            if self._check_limits(instance_id, rss):
+                recycle.append(instance_id)
+                continue
+
+            started_at = self._started_at.setdefault(instance_id, now)
+            if now - started_at < self.config.warmup:
+                continue
+            baseline = self._baselines.setdefault(instance_id, rss)
+            step = self.config.snapshot_growth_mb * MB
+            growth = rss - baseline
+            if step and growth >= self._next_snapshot.get(instance_id, step):
+                self._next_snapshot[instance_id] = growth + step
+                engine_util.logger.warning(
+                    f"{instance_id} grew by {growth / MB:.0f} MB since its baseline, taking a memory snapshot"
+                )
+                send_command(self.redis, instance_id, "memory_snapshot")
+        return recycle
+
+    def _check_limits(self, instance_id: str, rss: float) -> bool:
+        "Alert on high memory, returns whether the instance must be recycled"
+        if not self.config.max_rss_mb:
+            return False
+        limit = self.config.max_rss_mb * MB
+        if rss >= limit * self.config.alert_ratio and instance_id not in self._alerted:
+            self._alerted.add(instance_id)
+            engine_util.logger.warning(
+                f"{instance_id} uses {rss / MB:.0f} MB, its limit is {self.config.max_rss_mb} MB"
+            )
+        if rss >= limit and self.config.recycle:
+            engine_util.logger.error(
+                f"{instance_id} reached its memory limit ({rss / MB:.0f} MB), recycling it"
+            )
+            REGISTRY.counter(
+                "sonic_instance_recycles_total",
+                "Instances restarted because they reached their memory limit",
+                instance=instance_id,
+            ).inc()
+            self.forget(instance_id)
+            return True
+        return False
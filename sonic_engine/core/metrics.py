@@ -0,0 +1,319 @@
+import json
+import os
+from bisect import bisect_left
+from threading import Event, Thread
+from time import time
+from typing import Dict, Iterable, List, Tuple
+
+METRICS_KEY = "sonic:metrics"
+"Redis hash holding the last metrics snapshot of every extension instance"
+
+EXPORT_INTERVAL = 1.0
+"Seconds between two exports of the metrics of an instance"
+
+MAX_SNAPSHOT_AGE = 30.0
+"Snapshots older than this are ignored, their instance is considered dead"
+
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+"Histogram buckets in seconds, from 100µs to 10s"
+
+
+class Counter:
+    "A value that only goes up"
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def sample(self):
+        return self.value
+
+
+class Gauge:
+    "A value that goes up and down"
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def sample(self):
+        return self.value
+
+
+class Histogram:
+    "Counts of the observed values per fixed bucket, with their sum"
+
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        "count of every bucket (not cumulative), the last one is +Inf"
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def sample(self):
+        return {"buckets": self.buckets, "counts": self.counts, "sum": self.sum}
+
+
+_TYPES = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+
+class MetricsRegistry:
+    """
+    Metrics of a process, identified by their name and labels.
+
+    Updating a metric is a plain attribute update, get the metric once and keep it on hot paths.
+    Updates from several threads are not locked, a concurrent increment may rarely be lost.
+
+    Example Usage:
+    ```python
+    received = REGISTRY.counter("sonic_messages_received_total", "Messages received", channel="flows")
+    latency = REGISTRY.histogram("sonic_handler_seconds", "Handler latency", channel="flows")
+
+    received.inc()
+    latency.observe(elapsed)
+    ```
+    """
+
+    def __init__(self) -> None:
+        self._families: Dict[str, Dict] = {}
+        "type and help of every metric name"
+        self._metrics: Dict[Tuple, object] = {}
+
+    def _get(self, kind: str, name: str, help: str, labels: Dict[str, str], *args):
+        family = self._families.setdefault(name, {"type": kind, "help": help})
+        if family["type"] != kind:
+            raise ValueError(f"Metric {name} is a {family['type']}, not a {kind}")
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = self._metrics[key] = _TYPES[kind](*args)
+        return metric
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        return self._get("counter", name, help, labels)
+
+    def gauge(self, name: str, help: str = "", **labels) -> Gauge:
+        return self._get("gauge", name, help, labels)
+
+    def histogram(
+        self, name: str, help: str = "", buckets=DEFAULT_BUCKETS, **labels
+    ) -> Histogram:
+        return self._get("histogram", name, help, labels, buckets)
+
+    def snapshot(self, **labels) -> Dict:
+        """JSON serializable values of all the metrics, `labels` are added to every sample
+        e.g. `{"name": {"type": "counter", "help": "...", "samples": [[{"channel": "flows"}, 3.0]]}}`
+        """
+        snapshot = {
+            name: {**family, "samples": []} for name, family in self._families.items()
+        }
+        for (name, metric_labels), metric in list(self._metrics.items()):
+            snapshot[name]["samples"].append(
+                [{**labels, **dict(metric_labels)}, metric.sample()]
+            )
+        return snapshot
+
+
+REGISTRY = MetricsRegistry()
+"Metrics registry of the current process"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots: Iterable[Dict]) -> str:
+    "Render registries snapshots in the Prometheus text exposition format, the samples of a same metric are merged"
+    families: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        for name, family in snapshot.items():
+            merged = families.setdefault(
+                name, {"type": family["type"], "help": family["help"], "samples": []}
+            )
+            merged["samples"] += family["samples"]
+
+    lines = []
+    for name, family in sorted(families.items()):
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for labels, value in family["samples"]:
+            if family["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            bounds = list(value["buckets"]) + [float("inf")]
+            for bound, count in zip(bounds, value["counts"]):
+                cumulative += count
+                bucket_labels = {**labels, "le": _format_value(float(bound))}
+                lines.append(
+                    f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+                )
+            total = _format_value(value["sum"])
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def process_stats(pid="self") -> Tuple[float, float]:
+    "Resident memory in bytes and CPU time in seconds of a process, from `/proc`"
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        with open(f"/proc/{pid}/stat") as f:
+            # the process name may contain spaces, the fields start after it
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        return rss, cpu
+    except (OSError, ValueError, IndexError):
+        if pid != "self":
+            return 0.0, 0.0
+        import resource
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # peak rss only, in KiB on linux
+        return usage.ru_maxrss * 1024, usage.ru_utime + usage.ru_stime
+
+
+def update_process_metrics(registry: MetricsRegistry = REGISTRY) -> None:
+    "Set the memory and CPU metrics of the current process"
+    rss, cpu = process_stats()
+    registry.gauge(
+        "sonic_process_resident_memory_bytes", "Resident memory size"
+    ).set(rss)
+    # CPU time is read from the kernel, the counter follows it
+    registry.counter(
+        "sonic_process_cpu_seconds_total", "User and system CPU time"
+    ).value = cpu
+
+
+class MetricsExporter(Thread):
+    """
+    Background thread writing the registry snapshot of an extension instance to redis every `interval` seconds,
+    the engine reads them with `collect` and serves them on `/metrics`.
+
+    Example Usage:
+    ```python
+    MetricsExporter(__db__.redis, config.id).start()
+    ```
+    """
+
+    def __init__(
+        self,
+        redis,
+        instance_id: str,
+        registry: MetricsRegistry = REGISTRY,
+        interval: float = EXPORT_INTERVAL,
+    ) -> None:
+        super().__init__(name="metrics-exporter", daemon=True)
+        self.redis = redis
+        self.instance_id = instance_id
+        self.registry = registry
+        self.interval = interval
+        self.stopped = Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            try:
+                self.export()
+            except Exception:
+                # metrics must never stop the extension, the next export retries
+                pass
+
+    def export(self) -> None:
+        update_process_metrics(self.registry)
+        snapshot = {
+            "time": time(),
+            "metrics": self.registry.snapshot(instance=self.instance_id),
+        }
+        self.redis.hset(METRICS_KEY, self.instance_id, json.dumps(snapshot))
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+
+def collect(redis, max_age: float = MAX_SNAPSHOT_AGE) -> List[Dict]:
+    "Metrics snapshots of the live extensions instances"
+    now = time()
+    snapshots = []
+    for data in redis.hgetall(METRICS_KEY).values():
+        snapshot = json.loads(data)
+        if now - snapshot["time"] <= max_age:
+            snapshots.append(snapshot["metrics"])
+    return snapshots
+
+
+class ChannelMetrics:
+    "Built-in metrics of a channel, kept by `Database`"
+
+    __slots__ = ("received", "published", "dropped", "queue_wait", "handler_seconds")
+
+    def __init__(self, ch: str, registry: MetricsRegistry = REGISTRY) -> None:
+        self.received = registry.counter(
+            "sonic_messages_received_total", "Messages received", channel=ch
+        )
+        self.published = registry.counter(
+            "sonic_messages_published_total", "Messages published", channel=ch
+        )
+        self.dropped = registry.counter(
+            "sonic_messages_dropped_total",
+            "Messages published while no replica was alive",
+            channel=ch,
+        )
+        self.queue_wait = registry.histogram(
+            "sonic_queue_wait_seconds",
+            "Time a received message waits before being handled",
+            channel=ch,
+        )
+        self.handler_seconds = registry.histogram(
+            "sonic_handler_seconds",
+            "Time spent handling a received message",
+            channel=ch,
+        )
@@ -0,0 +1,69 @@
+from bisect import bisect
+from hashlib import blake2b
+from typing import Any, Dict, List
+
+
+def stable_hash(value: Any) -> int:
+    "Hash a value the same way in every process (the builtin `hash` is salted per process)"
+    if isinstance(value, str):
+        value = value.encode()
+    elif not isinstance(value, (bytes, bytearray, memoryview)):
+        value = repr(value).encode()
+    return int.from_bytes(blake2b(value, digest_size=8).digest(), "big")
+
+
+def partition_of(key: Any, partitions: int) -> int:
+    """Partition of a key among `partitions`
+    The mapping only depends on the key, so every message of a key goes through the same partition and keeps its order
+    """
+    return stable_hash(key) % partitions
+
+
+def partition_channel(ch: str, partition: int) -> str:
+    "Name of the sub-channel carrying a partition of a channel"
+    return f"{ch}:{partition}"
+
+
+class HashRing:
+    """
+    Consistent hashing ring assigning partitions to replicas.
+
+    Every replica is placed `vnodes` times on the ring, an item belongs to the first replica point following its hash.
+    Adding or removing a replica only moves the items of the ring arcs it takes or frees, about `1/len(replicas)` of them.
+
+    Example Usage:
+    ```python
+    ring = HashRing(["aggregator", "aggregator_2"])
+
+    ring.owned("aggregator", "flows", 16)  # partitions of `flows` consumed by `aggregator`
+    ```
+    """
+
+    def __init__(self, replicas: List[str], vnodes: int = 64) -> None:
+        points = sorted(
+            (stable_hash(f"{replica}#{i}"), replica)
+            for replica in set(replicas)
+            for i in range(vnodes)
+        )
+        self._hashes = [point[0] for point in points]
+        self._replicas = [point[1] for point in points]
+
+    def owner(self, item: Any) -> str:
+        "Replica owning an item"
+        index = bisect(self._hashes, stable_hash(item)) % len(self._hashes)
+        return self._replicas[index]
+
+    def assignments(self, ch: str, partitions: int) -> Dict[int, str]:
+        "Owner of every partition of a channel"
+        return {
+            partition: self.owner(partition_channel(ch, partition))
+            for partition in range(partitions)
+        }
+
+    def owned(self, replica: str, ch: str, partitions: int) -> List[int]:
+        "Partitions of a channel owned by a replica"
+        return [
+            partition
+            for partition, owner in self.assignments(ch, partitions).items()
+            if owner == replica
+        ]
@@ -0,0 +1,125 @@
+import cProfile
+import os
+import sys
+import threading
+from collections import Counter
+from time import monotonic, sleep, strftime
+from typing import Literal
+
+from sonic_engine.core.control import command
+from sonic_engine.util.functions import EngineUtil
+
+engine_util = EngineUtil()
+
+
+def profile_path(log_dir: str, instance_id: str, extension: str) -> str:
+    "Path of a new profile file in the instance log folder"
+    os.makedirs(log_dir, exist_ok=True)
+    return os.path.join(
+        log_dir, f"{instance_id}-profile-{strftime('%Y%m%d-%H%M%S')}.{extension}"
+    )
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """Sample the stacks of all the other threads every `interval` seconds for `seconds`
+    Returns the number of samples of every stack, as `thread;outer (file:line);...;inner (file:line)` strings
+    """
+    me = threading.get_ident()
+    stacks = Counter()
+    deadline = monotonic() + seconds
+    while monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            frames.append(names.get(ident, str(ident)))
+            stacks[";".join(reversed(frames))] += 1
+        sleep(interval)
+    return stacks
+
+
+def write_collapsed(stacks: Counter, path: str) -> None:
+    "Write stacks in the collapsed format read by flamegraph.pl and speedscope"
+    with open(path + ".tmp", "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    # the file appears complete
+    os.replace(path + ".tmp", path)
+
+
+class Profiler:
+    """
+    On-demand profiler of an extension instance, driven by the `profile` control command.
+
+    The `sample` mode samples the stacks of every thread from a background thread, its overhead is a few
+    microseconds per sample. The `cprofile` mode profiles the thread consuming `Database.get_message`: cProfile only
+    traces the thread that enables it, so the consumer loop calls `poll` when `armed` is set. When off, the cost
+    is the `armed` attribute check.
+    """
+
+    def __init__(self) -> None:
+        self.armed = False
+        "set while a cprofile session is requested or running"
+        self._profile: cProfile.Profile = None
+        self._seconds = 0.0
+        self._deadline = 0.0
+        self._path: str = None
+
+    def start(
+        self,
+        instance_id: str,
+        log_dir: str,
+        mode: Literal["sample", "cprofile"] = "sample",
+        seconds: float = 30.0,
+        interval: float = 0.005,
+    ) -> str:
+        "Profile the instance for `seconds`, returns the path of the profile file written at the end"
+        if mode == "sample":
+            path = profile_path(log_dir, instance_id, "collapsed")
+
+            def run():
+                write_collapsed(sample_stacks(seconds, interval), path)
+                engine_util.logger.info(f"Profile of {instance_id} written to {path}")
+
+            threading.Thread(target=run, name="sampling-profiler", daemon=True).start()
+            return path
+
+        if mode != "cprofile":
+            raise ValueError(f"Unknown profiling mode {mode}")
+        if self.armed:
+            raise RuntimeError(f"{instance_id} is already being profiled")
+        self._path = profile_path(log_dir, instance_id, "pstats")
+        self._seconds = seconds
+        self.armed = True
+        return self._path
+
+    def poll(self) -> None:
+        "Start or stop the requested cprofile session in the calling thread"
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._deadline = monotonic() + self._seconds
+            self._profile.enable()
+        elif monotonic() >= self._deadline:
+            self._profile.disable()
+            self._profile.dump_stats(self._path)
+            engine_util.logger.info(f"Profile written to {self._path}")
+            self._profile = None
+            self.armed = False
+
+
+PROFILER = Profiler()
+"Profiler of the current process"
+
+
+@command("profile")
+def profile(
+    instance_id: str, log_dir: str, profiler: Profiler = None, **args
+) -> None:
+    (profiler or PROFILER).start(instance_id, log_dir or ".", **args)
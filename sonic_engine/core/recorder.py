@@ -0,0 +1,383 @@
+"""
+Channels record and replay.
+
+Usage:
+    python -m sonic_engine.core.recorder record --dir recordings "flows*" alerts
+    python -m sonic_engine.core.recorder replay --speed 2 --channel "flows*" recordings
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+from fnmatch import fnmatchcase
+from threading import Event, Thread
+from time import perf_counter, sleep, time
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from sonic_engine.util.functions import EngineUtil
+
+engine_util = EngineUtil()
+
+SEGMENT_MAGIC = b"SCS1"
+"Header of the segment files"
+
+RECORD_HEADER = struct.Struct("<dHI")
+"Header of every record: reception time, channel length, data length"
+
+INDEX_ENTRY = struct.Struct("<dQ")
+"Entry of the index file of a segment: reception time and offset of every record"
+
+SEGMENT_EXTENSION = ".seg"
+INDEX_EXTENSION = ".idx"
+
+Record = Tuple[float, bytes, memoryview]
+"(reception time, channel, raw message data)"
+
+
+class SegmentWriter:
+    "Append-only segment file and its index"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._data = open(path, "ab")
+        self._index = open(path[: -len(SEGMENT_EXTENSION)] + INDEX_EXTENSION, "ab")
+        if self._data.tell() == 0:
+            self._data.write(SEGMENT_MAGIC)
+        self.size = self._data.tell()
+
+    def append(self, timestamp: float, channel: bytes, data: bytes) -> None:
+        self._index.write(INDEX_ENTRY.pack(timestamp, self.size))
+        self._data.write(RECORD_HEADER.pack(timestamp, len(channel), len(data)))
+        self._data.write(channel)
+        self._data.write(data)
+        self.size += RECORD_HEADER.size + len(channel) + len(data)
+
+    def flush(self) -> None:
+        # the data is flushed first, an index entry never points past the data
+        self._data.flush()
+        self._index.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._data.close()
+        self._index.close()
+
+
+class Segment:
+    """
+    Memory-mapped segment file, read without copying the messages data.
+
+    Recorded segments double as benchmark fixtures: `messages` yields the messages as `Database.get_message` does.
+
+    Example Usage:
+    ```python
+    with Segment("recordings/1700000000000.seg") as segment:
+        for message in segment.messages(channels=["flows*"]):
+            handle(message)
+    ```
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._buf = self._map(path)
+        if self._buf[:4] != SEGMENT_MAGIC:
+            raise ValueError(f"{path} is not a segment file")
+        self._index = self._map(path[: -len(SEGMENT_EXTENSION)] + INDEX_EXTENSION)
+
+    @staticmethod
+    def _map(path: str):
+        try:
+            with open(path, "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # missing or empty file
+            return b""
+
+    def __enter__(self) -> "Segment":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for buf in (self._buf, self._index):
+            if isinstance(buf, mmap.mmap):
+                try:
+                    buf.close()
+                except BufferError:
+                    # records are still referenced, the mapping is released with them
+                    pass
+
+    def __len__(self) -> int:
+        "Number of indexed records"
+        return len(self._index) // INDEX_ENTRY.size
+
+    def seek(self, timestamp: float) -> int:
+        "Offset of the first record received at or after `timestamp`"
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            entry = INDEX_ENTRY.unpack_from(self._index, middle * INDEX_ENTRY.size)
+            if entry[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(self):
+            # past the indexed records, the end of the data may not be indexed yet
+            return self._indexed_end()
+        return INDEX_ENTRY.unpack_from(self._index, low * INDEX_ENTRY.size)[1]
+
+    def _indexed_end(self) -> int:
+        if not len(self):
+            return len(SEGMENT_MAGIC)
+        last = (len(self) - 1) * INDEX_ENTRY.size
+        _, offset = INDEX_ENTRY.unpack_from(self._index, last)
+        if offset + RECORD_HEADER.size > len(self._buf):
+            return offset
+        _, channel_length, data_length = RECORD_HEADER.unpack_from(self._buf, offset)
+        return offset + RECORD_HEADER.size + channel_length + data_length
+
+    def records(
+        self, channels: Iterable[str] = None, start: float = None, end: float = None
+    ) -> Iterator[Record]:
+        """Records in reception order, filtered by channel name patterns (`fnmatch`) and reception time range
+        A truncated last record (the recorder was writing it) is skipped
+        """
+        patterns = None if channels is None else list(channels)
+        selected: Dict[bytes, bool] = {}
+        view = memoryview(self._buf)
+        size = len(self._buf)
+        position = self.seek(start) if start is not None else len(SEGMENT_MAGIC)
+        while position + RECORD_HEADER.size <= size:
+            timestamp, channel_length, data_length = RECORD_HEADER.unpack_from(
+                self._buf, position
+            )
+            channel_start = position + RECORD_HEADER.size
+            data_start = channel_start + channel_length
+            position = data_start + data_length
+            if position > size:
+                return
+            if end is not None and timestamp > end:
+                return
+            channel = bytes(view[channel_start:data_start])
+            if patterns is not None:
+                if channel not in selected:
+                    name = channel.decode(errors="replace")
+                    selected[channel] = any(fnmatchcase(name, p) for p in patterns)
+                if not selected[channel]:
+                    continue
+            yield timestamp, channel, view[data_start:position]
+
+    def messages(self, **filters) -> Iterator[Dict]:
+        "Records as pubsub messages"
+        for timestamp, channel, data in self.records(**filters):
+            yield {
+                "type": "message",
+                "pattern": None,
+                "channel": channel,
+                "data": bytes(data),
+                "received_at": timestamp,
+            }
+
+
+def segment_paths(paths: Iterable[str]) -> List[str]:
+    "Segment files of files and folders, in recording order"
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found += sorted(
+                os.path.join(path, name)
+                for name in os.listdir(path)
+                if name.endswith(SEGMENT_EXTENSION)
+            )
+        else:
+            found.append(path)
+    return found
+
+
+class Recorder:
+    """
+    Records the messages of some channels to segment files of `<dir>`, rotated every `segment_bytes`.
+
+    Channels may be patterns (e.g. `flows*` to record the partitions of a partitioned channel), the raw messages data is
+    recorded, so traced and batch messages are replayed unchanged.
+
+    Example Usage:
+    ```python
+    recorder = Recorder(__db__.redis, ["flows*", "alerts"], "recordings")
+    recorder.start()
+    ...
+    recorder.stop()
+    ```
+    """
+
+    def __init__(
+        self,
+        redis,
+        channels: List[str],
+        dir: str,
+        segment_bytes: int = 256 << 20,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.redis = redis
+        self.channels = channels
+        self.dir = dir
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self._writer: SegmentWriter = None
+        self._stop = Event()
+        self._thread: Thread = None
+
+    def _segment(self, timestamp: float) -> SegmentWriter:
+        "Writer of the current segment, rotated when it is full"
+        if self._writer is not None and self._writer.size >= self.segment_bytes:
+            self._writer.close()
+            self._writer = None
+        if self._writer is None:
+            os.makedirs(self.dir, exist_ok=True)
+            name = f"{int(timestamp * 1000):015d}{SEGMENT_EXTENSION}"
+            self._writer = SegmentWriter(os.path.join(self.dir, name))
+        return self._writer
+
+    def record(self, timestamp: float, channel: bytes, data) -> None:
+        if isinstance(data, str):
+            data = data.encode()
+        elif not isinstance(data, bytes):
+            data = str(data).encode()
+        self._segment(timestamp).append(timestamp, channel, data)
+        self.recorded += 1
+
+    def run(self) -> None:
+        "Record until `stop` is called"
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        patterns = [ch for ch in self.channels if any(c in ch for c in "*?[")]
+        names = [ch for ch in self.channels if ch not in patterns]
+        if patterns:
+            pubsub.psubscribe(*patterns)
+        if names:
+            pubsub.subscribe(*names)
+
+        flushed_at = time()
+        try:
+            while not self._stop.is_set():
+                message = pubsub.get_message(timeout=0.1)
+                now = time()
+                if message and message["type"] in ("message", "pmessage"):
+                    self.record(now, message["channel"], message["data"])
+                if self._writer and now - flushed_at >= self.flush_interval:
+                    self._writer.flush()
+                    flushed_at = now
+        finally:
+            pubsub.close()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def start(self) -> None:
+        self._thread = Thread(target=self.run, name="recorder", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class Replayer:
+    """
+    Publishes recorded messages back to their channels.
+
+    `speed` scales the original pace (2 replays twice as fast), 0 publishes as fast as possible through pipelines of
+    `pipeline_size` messages.
+
+    Example Usage:
+    ```python
+    stats = Replayer(__db__.redis, ["recordings"], speed=0, channels=["flows*"]).run()
+    ```
+    """
+
+    def __init__(
+        self,
+        redis,
+        paths: Iterable[str],
+        speed: float = 1.0,
+        channels: Iterable[str] = None,
+        start: float = None,
+        end: float = None,
+        pipeline_size: int = 1000,
+    ) -> None:
+        self.redis = redis
+        self.paths = segment_paths(paths)
+        self.speed = speed
+        self.filters = {"channels": channels, "start": start, "end": end}
+        self.pipeline_size = pipeline_size
+
+    def run(self) -> Dict[str, float]:
+        "Replay the segments, returns the number of replayed messages and bytes and the elapsed time"
+        messages = 0
+        size = 0
+        first = None
+        started = perf_counter()
+        pipeline = self.redis.pipeline(transaction=False)
+        pending = 0
+        for path in self.paths:
+            with Segment(path) as segment:
+                for timestamp, channel, data in segment.records(**self.filters):
+                    if first is None:
+                        first = timestamp
+                    if self.speed:
+                        elapsed = perf_counter() - started
+                        delay = (timestamp - first) / self.speed - elapsed
+                        if delay > 0:
+                            sleep(delay)
+                        self.redis.publish(channel, bytes(data))
+                    else:
+                        pipeline.publish(channel, bytes(data))
+                        pending += 1
+                        if pending >= self.pipeline_size:
+                            pipeline.execute()
+                            pending = 0
+                    messages += 1
+                    size += len(data)
+        if pending:
+            pipeline.execute()
+        elapsed = perf_counter() - started
+        return {"messages": messages, "bytes": size, "elapsed": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay channels")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="Record channels until interrupted")
+    record.add_argument("channels", nargs="+", help="Channel names or patterns")
+    record.add_argument("--dir", default="recordings")
+    record.add_argument("--segment-mb", type=int, default=256)
+    replay = commands.add_parser("replay", help="Replay recorded segments")
+    replay.add_argument("paths", nargs="+", help="Segment files or folders")
+    replay.add_argument("--speed", type=float, default=1.0, help="0 for max speed")
+    replay.add_argument("--channel", action="append", dest="channels")
+    replay.add_argument("--start", type=float, help="Reception time (epoch seconds)")
+    replay.add_argument("--end", type=float)
+    args = parser.parse_args()
+
+    from sonic_engine.core.database import connect
+
+    redis = connect()
+    if args.command == "record":
+        recorder = Recorder(redis, args.channels, args.dir, args.segment_mb << 20)
+        try:
+            recorder.run()
+        except KeyboardInterrupt:
+            engine_util.logger.info(f"Recorded {recorder.recorded} messages")
+    else:
+        replayer = Replayer(
+            redis, args.paths, args.speed, args.channels, args.start, args.end
+        )
+        print(json.dumps(replayer.run(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+from time import time
+from typing import Dict, Optional, Tuple
+
+LEAST_LOADED = "least_loaded"
+"Route every message of a channel to the replica with the shortest queue"
+
+LOAD_REPORT_INTERVAL = 0.1
+"Seconds between two load reports of a replica"
+
+
+def load_key(ch: str) -> str:
+    "Redis hash holding the queue length reported by every replica subscribed to a channel"
+    return f"sonic:load:{ch}"
+
+
+def replica_channel(ch: str, replica: str) -> str:
+    "Name of the sub-channel feeding a single replica"
+    return f"{ch}@{replica}"
+
+
+def encode_load(queue_length: int) -> bytes:
+    return f"{queue_length} {time()}".encode()
+
+
+def decode_load(value: bytes) -> Tuple[int, float]:
+    queue_length, reported_at = value.split()
+    return int(queue_length), float(reported_at)
+
+
+class LeastLoadedRouter:
+    """
+    Pick the replica with the lowest load for every message published on a channel.
+
+    Replicas report the length of their local queue in `load_key(ch)` every `LOAD_REPORT_INTERVAL`.
+    The router adds the messages it sent to a replica since its last report, so a burst is spread instead of sent to the replica that looked idle.
+    A frozen replica keeps its last report, its estimate only grows and it is skipped once `max_in_flight` messages are estimated in its queue,
+    so until it is dropped after `stall_timeout` seconds without report it strands at most `max_in_flight` messages.
+
+    Example Usage:
+    ```python
+    router = LeastLoadedRouter(redis_client, "flows")
+
+    redis_client.publish(replica_channel("flows", router.pick()), data)
+    ```
+    """
+
+    def __init__(
+        self,
+        redis,
+        ch: str,
+        refresh_interval: float = 0.05,
+        stall_timeout: float = 2.0,
+        max_in_flight: int = 1000,
+    ) -> None:
+        self.redis = redis
+        self.ch = ch
+        self.refresh_interval = refresh_interval
+        self.stall_timeout = stall_timeout
+        self.max_in_flight = max_in_flight
+
+        self.loads: Dict[str, int] = {}
+        "estimated queue length of every live replica"
+
+        self._reported_at: Dict[str, float] = {}
+        self._sent: Dict[str, int] = {}
+        "messages sent to every replica since its last report"
+
+        self._refreshed_at = 0.0
+
+    def refresh(self) -> None:
+        "Reload the loads reported by the replicas, dropping the stalled ones"
+        now = time()
+        loads, reported_ats, sents = {}, {}, {}
+        for replica, value in self.redis.hgetall(load_key(self.ch)).items():
+            queue_length, reported_at = decode_load(value)
+            if now - reported_at > self.stall_timeout:
+                continue
+            replica = replica.decode() if isinstance(replica, bytes) else replica
+            # a new report already counts the messages sent before it
+            sent = (
+                self._sent.get(replica, 0)
+                if self._reported_at.get(replica) == reported_at
+                else 0
+            )
+            loads[replica] = queue_length + sent
+            reported_ats[replica] = reported_at
+            sents[replica] = sent
+        self.loads, self._reported_at, self._sent = loads, reported_ats, sents
+        self._refreshed_at = now
+
+    def pick(self) -> Optional[str]:
+        "Replica that should receive the next message, None if no replica is alive"
+        if time() - self._refreshed_at >= self.refresh_interval:
+            self.refresh()
+        if not self.loads:
+            return None
+
+        candidates = [
+            replica for replica, load in self.loads.items() if load < self.max_in_flight
+        ]
+        if candidates:
+            replica = min(candidates, key=self.loads.__getitem__)
+        else:
+            # every replica is saturated, favor the ones that reported since our last messages
+            replica = min(self.loads, key=self._sent.__getitem__)
+        self.loads[replica] += 1
+        self._sent[replica] += 1
+        return replica
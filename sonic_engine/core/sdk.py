@@ -0,0 +1,321 @@
+import os
+import signal
+import threading
+from multiprocessing import get_context
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+from yapsy.IMultiprocessPlugin import IMultiprocessPlugin
+
+from sonic_engine.core.tracing import CURRENT_TRACE
+from sonic_engine.model.extension import FeatureConfig, InferenceConfig, ReportingConfig
+from sonic_engine.util.functions import EngineUtil
+
+engine_util = EngineUtil()
+
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+"Buckets of the handled batches sizes histogram"
+
+MESSAGE_TYPES = ("message", "pmessage")
+"Types of the messages given to the handlers, the subscription confirmations are skipped"
+
+_worker: "Extension" = None
+"Extension of a pool worker process, inherited from the instance by fork"
+
+
+def _init_worker(extension: "Extension") -> None:
+    global _worker
+    _worker = extension
+    # the pool is stopped by the instance, not by the signals sent to the instance
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _work_chunk(chunk: List[Any]):
+    "Run `work` on every payload of a chunk in a pool worker, returns the results and the number of failures"
+    results, failures = [], 0
+    for data in chunk:
+        try:
+            results.append(_worker.work(data))
+        except Exception as e:
+            failures += 1
+            results.append(None)
+            engine_util.logger.exception(f"{_worker.config.id} worker failed: {e}")
+    return results, failures
+
+
+class Extension(IMultiprocessPlugin):
+    """
+    Base class of the extensions: runs the config handshake, registers the channels, receives the messages and hands
+    them to `on_message` (or `on_messages` by batches), then closes the database on shutdown.
+
+    A message failing its handler is logged and counted in `sonic_handler_errors_total`, the next ones are handled.
+    The value returned by a handler (a list of values for `on_messages`) is published into the `publish` channels,
+    with the key given by `key_of` (required by the partitioned channels).
+    SIGTERM (`killAll` of the engine) ends the loop after the message being handled, `teardown` runs before exiting.
+
+    Batching is adaptive: a batch holds the messages already waiting in the queue, up to `batch_size`, so a lone
+    message is never delayed to fill a batch.
+
+    CPU-bound extensions implement `work` instead and set `workers` (or the `workers` config field): the payloads
+    are then sent by chunks of up to `chunk_size` to a pool of processes forked after `setup`, so the state it loads
+    is shared with the workers. They are forked before the background threads of the database start, `setup` should
+    not start threads either: a forked process only keeps the forking thread, the locks held by the others stay held. The results are published in the order of the messages, or as soon as they are
+    ready if `ordered` is False. Without workers, `work` runs in the instance for every message.
+
+    Example Usage:
+    ```python
+    class Scorer(Extension):
+        batch_size = 64
+
+        def setup(self):
+            self.model = load_model(self.config.options["model"])
+
+        def on_messages(self, messages):
+            return [self.model.predict(message["data"]) for message in messages]
+
+
+    class Parser(Extension):
+        workers = -1  # a worker per core
+
+        def work(self, data):
+            return parse(data)
+    ```
+    """
+
+    batch_size: int = 1
+    "Messages handed at most to `on_messages`, 1 hands every message to `on_message`"
+
+    timeout: float = 0.3
+    "Seconds between two checks of the shutdown while no message is received"
+
+    workers: int = 0
+    "Worker processes running `work`, 0 runs it in the instance, -1 starts one per available core"
+
+    chunk_size: int = 32
+    "Payloads sent at most to a worker at once"
+
+    ordered: bool = True
+    "Publish the results of the workers in the order of the messages"
+
+    def __init__(self, parent_pipe) -> None:
+        super().__init__(parent_pipe)
+        self.config: Union[FeatureConfig, InferenceConfig, ReportingConfig] = None
+        self.db = None
+        self.pool = None
+
+    def setup(self) -> None:
+        "Called once the channels are registered, before the workers are forked and the first message"
+
+    def teardown(self) -> None:
+        "Called after the last message, before the database is closed"
+
+    def on_message(self, message: Dict[str, Any]) -> Any:
+        "Handle a received message, `message['data']` holds its payload"
+        return self.work(message["data"])
+
+    def work(self, data) -> Any:
+        "Compute the result of a payload, in a pool worker if the extension has workers"
+        raise NotImplementedError(
+            f"{type(self).__name__} must implement on_message or work"
+        )
+
+    def on_messages(self, messages: List[Dict[str, Any]]) -> Iterable[Any]:
+        "Handle a batch of received messages, hands every message to `on_message` by default"
+        return [self._handle(message) for message in messages]
+
+    def key_of(self, result) -> Any:
+        "Key of a handler result, published with it (e.g. the flow 5-tuple), must be set for partitioned channels"
+        return None
+
+    def publish(self, data, ch: str = None, key=None, trace=CURRENT_TRACE) -> None:
+        "Publish into `ch`, or into every `publish` channel of the instance"
+        if ch is not None:
+            self.db.publish(ch, data, key, trace)
+            return
+        for ch in (self.config.channels and self.config.channels.publish) or []:
+            self.db.publish(ch, data, key, trace)
+
+    def stop(self) -> None:
+        "End the receive loop, the message being handled is finished first"
+        if self.db is not None:
+            self.db.stop_listening()
+
+    def run(self):
+        self.config = self.parent_pipe.recv()["config"]
+        # a misconfigured extension fails before connecting
+        self._check_keys()
+        from sonic_engine.core.database import __db__
+
+        self.db = __db__
+        self._errors = self.db.registry.counter(
+            "sonic_handler_errors_total", "Messages whose handler raised an error"
+        )
+        self._batch_sizes = self.db.registry.histogram(
+            "sonic_batch_size", "Messages handled per batch", BATCH_BUCKETS
+        )
+        # the background threads of the database start once the workers are forked
+        self.db.register_extension(self.config, start=False)
+        # a process instance is stopped with SIGTERM, a thread one by its database
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        try:
+            self.setup()
+            workers = self._worker_count()
+            if workers:
+                # the workers inherit the state loaded by `setup`
+                context = get_context("fork")
+                self.pool = context.Pool(workers, _init_worker, (self,))
+            self.db.start_background()
+            if workers:
+                self._pool_loop(workers)
+            else:
+                self.loop()
+        finally:
+            try:
+                if self.pool is not None:
+                    # the results of the submitted chunks are published first
+                    self.pool.close()
+                    self.pool.join()
+                self.teardown()
+            finally:
+                self.db.close()
+
+    def _check_keys(self) -> None:
+        "The results published into partitioned channels need a key, without `key_of` every publication would fail"
+        channels = self.config.channels
+        partitioned = [
+            ch
+            for ch in (channels and channels.publish) or []
+            if ch in ((channels and channels.partitions) or {})
+        ]
+        if partitioned and type(self).key_of is Extension.key_of:
+            raise ValueError(
+                f"{type(self).__name__} publishes into the partitioned channels"
+                f" {partitioned}, it must implement key_of"
+            )
+
+    def _worker_count(self) -> int:
+        workers = self.workers if self.config.workers is None else self.config.workers
+        if workers < 0:
+            if hasattr(os, "sched_getaffinity"):
+                return len(os.sched_getaffinity(0))
+            return os.cpu_count()
+        return workers
+
+    def loop(self) -> None:
+        """Receive the messages until the shutdown and hand them to the handlers
+        Extensions without subscription (e.g. a feature reading its input) override it
+        """
+        if self.batch_size <= 1:
+            for message in self.db.get_message(timeout=self.timeout):
+                if message["type"] in MESSAGE_TYPES:
+                    self._publish_result(self._handle(message))
+            return
+        # the batches are timed and traced by `_handle_batch`, not on the next message
+        batch: List[Dict[str, Any]] = []
+        for message in self.db.get_message(timeout=self.timeout, timed=False):
+            if message["type"] not in MESSAGE_TYPES:
+                continue
+            batch.append(message)
+            if len(batch) >= self.batch_size or not message["queue_length"]:
+                self._handle_batch(batch)
+                batch = []
+        if batch:
+            self._handle_batch(batch)
+
+    def _pool_loop(self, workers: int) -> None:
+        """Send the received payloads by chunks to the pool, at most two chunks per worker are in flight
+        The results are published by the pool results thread as the chunks complete, with the trace of their message
+        """
+        in_flight = threading.BoundedSemaphore(2 * workers)
+        ready: Dict[int, Tuple[List[Any], List[Dict]]] = {}
+        "results of the chunks completed before a previous one, kept until their turn"
+        published = [0]
+        "sequence number of the next chunk whose results are published"
+
+        def deliver(sequence: int, results: List[Any], traces: List[Dict]) -> None:
+            # called from the single pool results thread, in completion order
+            in_flight.release()
+            if not self.ordered:
+                for result, trace in zip(results, traces):
+                    self._publish_result(result, trace)
+                return
+            ready[sequence] = results, traces
+            while published[0] in ready:
+                for result, trace in zip(*ready.pop(published[0])):
+                    self._publish_result(result, trace)
+                published[0] += 1
+
+        def submit(sequence: int, chunk: List[Any], traces: List[Dict]) -> None:
+            self._batch_sizes.observe(len(chunk))
+
+            def done(outcome) -> None:
+                results, failures = outcome
+                self._errors.inc(failures)
+                deliver(sequence, results, traces)
+
+            def failed(e: BaseException) -> None:
+                self._errors.inc(len(chunk))
+                engine_util.logger.error(
+                    f"{self.config.id} failed to handle {len(chunk)} messages: {e!r}"
+                )
+                deliver(sequence, [], [])
+
+            in_flight.acquire()
+            self.pool.apply_async(_work_chunk, (chunk,), {}, done, failed)
+
+        sequence = 0
+        chunk: List[Any] = []
+        traces: List[Dict] = []
+        for message in self.db.get_message(timeout=self.timeout):
+            if message["type"] not in MESSAGE_TYPES:
+                continue
+            chunk.append(message["data"])
+            traces.append(message["trace"])
+            if len(chunk) >= self.chunk_size or not message["queue_length"]:
+                submit(sequence, chunk, traces)
+                sequence, chunk, traces = sequence + 1, [], []
+        if chunk:
+            submit(sequence, chunk, traces)
+
+    def _handle(self, message: Dict[str, Any]) -> Any:
+        try:
+            return self.on_message(message)
+        except Exception as e:
+            self._errors.inc()
+            engine_util.logger.exception(
+                f"{self.config.id} failed to handle a message of"
+                f" {message['channel']!r}: {e}"
+            )
+            return None
+
+    def _handle_batch(self, batch: List[Dict[str, Any]]) -> None:
+        self._batch_sizes.observe(len(batch))
+        started = perf_counter()
+        try:
+            results = list(self.on_messages(batch) or [])
+        except Exception as e:
+            self._errors.inc(len(batch))
+            engine_util.logger.exception(
+                f"{self.config.id} failed to handle a batch of {len(batch)} messages: {e}"
+            )
+            return
+        finally:
+            self.db.handled(batch, perf_counter() - started)
+        # a result per message continues its trace, the others are published untraced
+        if len(results) == len(batch):
+            traces = [message["trace"] for message in batch]
+        else:
+            traces = [None] * len(results)
+        for result, trace in zip(results, traces):
+            self._publish_result(result, trace)
+
+    def _publish_result(self, result: Any, trace=CURRENT_TRACE) -> None:
+        if result is None:
+            return
+        try:
+            self.publish(result, key=self.key_of(result), trace=trace)
+        except Exception as e:
+            self._errors.inc()
+            engine_util.logger.exception(f"{self.config.id} failed to publish: {e}")
@@ -1,19 +1,487 @@
-from flask import Flask
+import asyncio
+import base64
+import json
+import re
 import threading
+from random import random
+from time import monotonic
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from sonic_engine.core.control import send_command
 from sonic_engine.core.engine import Engine
+from sonic_engine.core.ingest import (
+    FRAMES,
+    NDJSON,
+    Ingestor,
+    split_frames,
+    split_ndjson,
+)
+from sonic_engine.core.metrics import REGISTRY, collect, render, update_process_metrics
+from sonic_engine.core.tracing import is_traced, unwrap
+from sonic_engine.util.functions import EngineUtil
+
+engine_util = EngineUtil()
+
+HELP = """Sonic Engine control plane
+
+GET  /status                               engine state
+GET  /instances                            installed instances
+GET  /metrics                              metrics (Prometheus text format)
+POST /instances/<id>/start                 start an instance
+POST /instances/<id>/stop                  stop an instance
+POST /instances/<id>/restart               restart an instance
+POST /extensions/<id>/scale?replicas=N     set the number of instances of an extension
+POST /instances/<id>/profile?mode=&seconds=
+                                           profile a running instance
+POST /channels/<channel>/dump?max_age=     dump the flight recorder of a channel
+POST /ingest/<channel>?key=                publish the events of an NDJSON or length-prefixed body
+GET  /channels/<channel>/stream?sample=&max_rate=
+                                           live tail of a channel (Server-Sent Events)
+"""
+
+MAX_BODY = 1 << 20
+"Size limit of the request bodies when the ingestion is not configured"
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    415: "Unsupported Media Type",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+}
+
+
+class Request:
+    "HTTP request, `body` is None when it was over the size limit"
+
+    def __init__(
+        self, method: str, target: str, headers: Dict[str, str], body: bytes = b""
+    ) -> None:
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = dict(parse_qsl(url.query))
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+class Response:
+    "HTTP response"
+
+    def __init__(
+        self,
+        body: bytes,
+        status: int = 200,
+        content_type: str = "application/json",
+        headers: Dict[str, str] = None,
+    ) -> None:
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    @classmethod
+    def json(cls, data, status: int = 200, headers=None) -> "Response":
+        return cls(json.dumps(data, default=str).encode(), status, headers=headers)
+
+    @classmethod
+    def text(cls, text: str, content_type: str = "text/plain") -> "Response":
+        return cls(text.encode(), 200, f"{content_type}; charset=utf-8")
+
+    def encode(self, keep_alive: bool) -> bytes:
+        headers = {
+            "Content-Type": self.content_type,
+            "Content-Length": len(self.body),
+            **self.headers,
+            "Connection": "keep-alive" if keep_alive else "close",
+        }
+        head = f"HTTP/1.1 {self.status} {REASONS.get(self.status, '')}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        return f"{head}\r\n".encode("latin-1") + self.body
+
+
+def stream_event(message: Dict) -> bytes:
+    """Server-Sent Event of a channel message
+    Trace contexts are split from the payloads, batches are summarized and binary payloads are base64 encoded
+    """
+    from sonic_engine.core.batch import ColumnBatch, is_batch
+
+    data = message["data"]
+    channel = message["channel"]
+    if isinstance(channel, bytes):
+        channel = channel.decode(errors="replace")
+    event = {"channel": channel}
+    if is_traced(data):
+        event["trace"], data = unwrap(data)
+    if is_batch(data):
+        batch = ColumnBatch.decode(data)
+        event["batch"] = {"rows": len(batch), "schema": batch.schema}
+    elif isinstance(data, bytes):
+        try:
+            event["data"] = data.decode()
+        except UnicodeDecodeError:
+            event["base64"] = base64.b64encode(data).decode()
+    else:
+        event["data"] = data
+    return f"data: {json.dumps(event, default=str)}\n\n".encode()
+
+
+Handler = Callable[..., Awaitable[Optional[Response]]]
+
+
+class ControlPlane:
+    """
+    HTTP control plane of the engine: an asyncio server running its own event loop in a daemon thread.
+
+    The event loop only parses requests and writes responses, every blocking call (redis, starting and stopping
+    processes) runs in the default executor, so the control plane stays responsive while the engine is loaded.
+    The engine process mostly waits on its instances processes, sharing its GIL with the server is not an issue.
+
+    Channel streams are Server-Sent Events fed by a redis subscription thread per client. Messages are sampled on the
+    server side: each one is kept with probability `sample`, and at most `max_rate` events are sent per second.
+
+    Example Usage:
+    ```python
+    control_plane = ControlPlane(engine, port=8011)
+    control_plane.start()
+    ...
+    control_plane.stop()
+    ```
+    """
+
+    def __init__(
+        self,
+        manager: Engine,
+        host: str = "127.0.0.1",
+        port: int = 8011,
+        flight_dir: str = "./logs/flight",
+    ):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.flight_dir = flight_dir
+        self.loop: asyncio.AbstractEventLoop = None
+        self._ready = threading.Event()
+        self._thread: threading.Thread = None
+        self.ingestor: Ingestor = None
+        self.routes: List[Tuple[str, re.Pattern, Handler]] = [
+            ("GET", r"/", self.home),
+            ("GET", r"/status", self.status),
+            ("GET", r"/instances", self.instances),
+            ("GET", r"/metrics", self.metrics),
+            (
+                "POST",
+                r"/instances/(?P<id>[^/]+)/(?P<action>start|stop|restart)",
+                self.act,
+            ),
+            ("POST", r"/instances/(?P<id>[^/]+)/profile", self.profile),
+            ("POST", r"/extensions/(?P<id>[^/]+)/scale", self.scale),
+            ("POST", r"/channels/(?P<channel>[^/]+)/dump", self.dump),
+            ("GET", r"/channels/(?P<channel>[^/]+)/stream", self.stream),
+            ("POST", r"/ingest/(?P<channel>[^/]+)", self.ingest),
+        ]
+        self.routes = [(m, re.compile(p), h) for m, p, h in self.routes]
+
+    def start(self) -> threading.Thread:
+        "Start the server thread, returns once the server listens"
+        if self.ingestor is None:
+            self.ingestor = self._create_ingestor()
+        self._thread = threading.Thread(
+            name="Control plane", target=self._run, daemon=True
+        )
+        self._thread.start()
+        self._ready.wait()
+        return self._thread
+
+    def _create_ingestor(self) -> Ingestor:
+        "Ingestor of the configured channels, None if the ingestion is not configured"
+        config = self.manager.config.metadata.ingest
+        if config is None:
+            return None
+        from sonic_engine.core.database import __db__
+
+        partitions, routing = {}, {}
+        with self.manager.lock:
+            for instance in self.manager.configs.values():
+                if instance.channels is not None:
+                    partitions.update(instance.channels.partitions or {})
+                    routing.update(instance.channels.routing or {})
+        return Ingestor(__db__.redis, config, partitions, routing)
+
+    def stop(self) -> None:
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(
+            asyncio.start_server(self.handle, self.host, self.port)
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        engine_util.logger.info(f"Control plane listening on {self.host}:{self.port}")
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            server.close()
+            self.loop.run_until_complete(server.wait_closed())
+            self.loop.close()
+
+    async def blocking(self, function, *args):
+        "Run a blocking call in the executor"
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        "Serve the requests of a connection, kept alive unless the client closes it"
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                response = await self.dispatch(request, writer)
+                if response is None:
+                    # the handler streamed its response
+                    break
+                writer.write(response.encode(request.keep_alive))
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Request:
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        limit = self.ingestor.max_body if self.ingestor is not None else MAX_BODY
+        encoding = headers.get("transfer-encoding")
+        if encoding is not None:
+            if encoding.lower().rsplit(",", 1)[-1].strip() != "chunked":
+                raise ValueError(f"Unsupported transfer encoding {encoding}")
+            body = await self._read_chunks(reader, limit)
+        else:
+            length = int(headers.get("content-length", 0))
+            if length > limit:
+                body = None
+            else:
+                body = await reader.readexactly(length) if length else b""
+        if body is None:
+            # the rest of the body is not read, the connection can not be reused
+            headers["connection"] = "close"
+        return Request(method, target, headers, body)
+
+    async def _read_chunks(self, reader: asyncio.StreamReader, limit: int) -> bytes:
+        "Body of a chunked request, None once it is over `limit`"
+        chunks = []
+        size = 0
+        while True:
+            line = await reader.readline()
+            chunk_size = int(line.split(b";", 1)[0], 16)
+            if chunk_size == 0:
+                break
+            size += chunk_size
+            if size > limit:
+                return None
+            chunks.append(await reader.readexactly(chunk_size))
+            await reader.readline()
+        # trailer fields
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        return b"".join(chunks)
+
+    async def dispatch(self, request: Request, writer=None) -> Optional[Response]:
+        "Response of the route matching a request"
+        allowed = []
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match is None:
+                continue
+            if method != request.method:
+                allowed.append(method)
+                continue
+            args = {name: unquote(value) for name, value in match.groupdict().items()}
+            if handler == self.stream:
+                args["writer"] = writer
+            try:
+                return await handler(request, **args)
+            except KeyError as e:
+                return Response.json({"error": f"Unknown instance {e}"}, 404)
+            except ValueError as e:
+                return Response.json({"error": str(e)}, 400)
+            except RuntimeError as e:
+                return Response.json({"error": str(e)}, 409)
+            except Exception as e:
+                engine_util.logger.error(f"{request.method} {request.path} failed: {e}")
+                return Response.json({"error": str(e)}, 500)
+        if allowed:
+            return Response.json({"error": f"Use {', '.join(allowed)}"}, 405)
+        return Response.json({"error": f"No route for {request.path}"}, 404)
+
+    async def home(self, request: Request) -> Response:
+        return Response.text(HELP)
+
+    async def status(self, request: Request) -> Response:
+        return Response.json(await self.blocking(self.manager.status))
+
+    async def instances(self, request: Request) -> Response:
+        return Response.json(await self.blocking(self.manager.instances))
+
+    async def act(self, request: Request, id: str, action: str) -> Response:
+        method = getattr(self.manager, f"{action}_instance")
+        changed = await self.blocking(method, id)
+        return Response.json({"instance": id, "action": action, "changed": changed})
+
+    async def scale(self, request: Request, id: str) -> Response:
+        replicas = int(request.query.get("replicas", 0))
+        ids = await self.blocking(self.manager.scale, id, replicas)
+        return Response.json({"extension": id, "instances": ids})
+
+    async def metrics(self, request: Request) -> Response:
+        def text() -> str:
+            from sonic_engine.core.database import __db__
+
+            update_process_metrics()
+            snapshots = [REGISTRY.snapshot(instance="engine")]
+            return render(snapshots + collect(__db__.redis))
+
+        text = await self.blocking(text)
+        return Response.text(text, "text/plain; version=0.0.4")
+
+    async def profile(self, request: Request, id: str) -> Response:
+        from sonic_engine.core.database import __db__
+
+        args = {
+            "mode": request.query.get("mode", "sample"),
+            "seconds": float(request.query.get("seconds", 30)),
+        }
+        received = await self.blocking(
+            lambda: send_command(__db__.redis, id, "profile", **args)
+        )
+        if not received:
+            return Response.json({"error": f"{id} is not running"}, 404)
+        return Response.json({"instance": id, **args})
+
+    async def dump(self, request: Request, channel: str) -> Response:
+        # the dumps are only written into the flight recorder folder
+        if "/" in channel or "\\" in channel or ".." in channel:
+            raise ValueError(f"Invalid channel name {channel!r}")
+        from sonic_engine.core.database import __db__
+        from sonic_engine.core.flight import dump, dump_path
+
+        max_age = request.query.get("max_age")
+        max_age = float(max_age) if max_age else None
+        path = dump_path(self.flight_dir, channel)
+        count = await self.blocking(dump, __db__.redis, [channel], path, max_age)
+        path = path if count else None
+        return Response.json({"channel": channel, "messages": count, "path": path})
+
+    async def stream(self, request: Request, channel: str, writer) -> None:
+        from sonic_engine.core.database import __db__
+
+        sample = float(request.query.get("sample", 1.0))
+        max_rate = float(request.query.get("max_rate", 100))
+        interval = 1 / max_rate if max_rate > 0 else 0.0
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=1000)
+        stopped = threading.Event()
+
+        def put(message):
+            if not queue.full():
+                queue.put_nowait(message)
+
+        def subscribe():
+            # the partitions and the replicas channels are streamed with the channel
+            pubsub = __db__.redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(channel, f"{channel}:*", f"{channel}@*")
+            try:
+                while not stopped.is_set():
+                    message = pubsub.get_message(timeout=0.5)
+                    if message and (sample >= 1 or random() < sample):
+                        loop.call_soon_threadsafe(put, message)
+            finally:
+                pubsub.close()
+
+        threading.Thread(
+            target=subscribe, name=f"Stream {channel}", daemon=True
+        ).start()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+        )
+        sent_at = float("-inf")
+        try:
+            await writer.drain()
+            while True:
+                message = await queue.get()
+                now = monotonic()
+                if now - sent_at < interval:
+                    continue
+                sent_at = now
+                writer.write(stream_event(message))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            stopped.set()
+
+    async def ingest(self, request: Request, channel: str) -> Response:
+        if self.ingestor is None:
+            return Response.json({"error": "The ingestion is not configured"}, 404)
+        if request.body is None:
+            return Response.json({"error": "The body is too large"}, 413)
+        if not self.ingestor.allowed(channel):
+            return Response.json({"error": f"{channel} does not accept events"}, 403)
+        content_type = request.headers.get("content-type", NDJSON)
+        content_type = content_type.split(";")[0].strip()
+        if content_type not in (NDJSON, FRAMES):
+            return Response.json({"error": f"Use {NDJSON} or {FRAMES}"}, 415)
 
+        subscriber = await self.blocking(self.ingestor.overloaded, channel)
+        if subscriber is not None:
+            retry_after = self.ingestor.config.retry_after
+            return Response.json(
+                {"error": f"{subscriber} is over its high watermark"},
+                429,
+                headers={"Retry-After": str(retry_after)},
+            )
 
-def run_server(manager: Engine):
-    def thread_server():
-        nonlocal manager
-        app = Flask(__name__)
+        def publish() -> int:
+            if content_type == NDJSON:
+                messages = split_ndjson(request.body)
+                keys = self.ingestor.keys(channel, messages, request.query.get("key"))
+            else:
+                messages, keys = split_frames(request.body), None
+            return self.ingestor.publish(channel, messages, keys)
 
-        @app.route("/")
-        def home():
-            return "TODO: help text"
+        published = await self.blocking(publish)
+        return Response.json({"channel": channel, "messages": published})
 
-        app.run(debug=True, use_reloader=False, port=8011)
 
-    t_webApp = threading.Thread(name='Atlas API', target=thread_server)
-    t_webApp.setDaemon(True)
-    t_webApp.start()
+def run_server(manager: Engine, host: str = "127.0.0.1", port: int = 8011):
+    "Start the control plane of an engine in a daemon thread"
+    control_plane = ControlPlane(manager, host, port)
+    control_plane.start()
+    return control_plane
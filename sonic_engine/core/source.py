@@ -0,0 +1,465 @@
+import mmap
+import os
+import socket
+import struct
+from queue import Empty, Full, Queue
+from selectors import EVENT_READ, DefaultSelector
+from threading import Event, Thread
+from time import perf_counter
+from typing import Dict, Iterator, List, Tuple
+
+from sonic_engine.model.extension import Input, Replay
+from sonic_engine.util.functions import EngineUtil
+
+engine_util = EngineUtil()
+
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+"pcap global header magic: (byte order, timestamp resolution)"
+
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_INTERFACE_DESCRIPTION = 1
+PCAPNG_SIMPLE_PACKET = 3
+PCAPNG_ENHANCED_PACKET = 6
+
+Record = Tuple[int, float, memoryview]
+"(offset after the record, timestamp in seconds or 0 if unknown, record data)"
+
+
+def guess_framing(path: str) -> str:
+    "Framing of a file guessed from its extension"
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".pcap", ".cap"):
+        return "pcap"
+    if extension == ".pcapng":
+        return "pcapng"
+    return "lines"
+
+
+def frame_lines(buf: mmap.mmap, start: int) -> Iterator[Record]:
+    "Newline-delimited records, without the newline"
+    view = memoryview(buf)
+    size = len(buf)
+    position = start
+    while position < size:
+        end = buf.find(b"\n", position)
+        if end == -1:
+            yield size, 0.0, view[position:size]
+            return
+        yield end + 1, 0.0, view[position:end]
+        position = end + 1
+
+
+def frame_pcap(buf: mmap.mmap, start: int) -> Iterator[Record]:
+    "Packets of a pcap file, a truncated last record is left for a later read"
+    order, resolution = PCAP_MAGICS.get(buf[:4], (None, None))
+    if order is None:
+        raise ValueError("Not a pcap file")
+    header = struct.Struct(order + "IIII")
+
+    view = memoryview(buf)
+    size = len(buf)
+    position = max(start, 24)
+    while position + 16 <= size:
+        seconds, fraction, captured, _ = header.unpack_from(buf, position)
+        end = position + 16 + captured
+        if end > size:
+            return
+        yield end, seconds + fraction * resolution, view[position + 16 : end]
+        position = end
+
+
+def frame_pcapng(buf: mmap.mmap, start: int) -> Iterator[Record]:
+    "Packets of the enhanced and simple packet blocks of a pcapng file"
+    view = memoryview(buf)
+    size = len(buf)
+    order = "<"
+    resolutions: List[float] = []
+
+    position = 0
+    while position + 12 <= size:
+        block_type, block_length = struct.unpack_from(order + "II", buf, position)
+
+        if block_type == PCAPNG_SECTION_HEADER:
+            # every section declares its own byte order and interfaces
+            order = (
+                "<" if buf[position + 8 : position + 12] == b"\x4d\x3c\x2b\x1a" else ">"
+            )
+            block_length = struct.unpack_from(order + "I", buf, position + 4)[0]
+            resolutions = []
+
+        end = position + block_length
+        if block_length < 12 or end > size:
+            return
+
+        if block_type == PCAPNG_INTERFACE_DESCRIPTION:
+            resolutions.append(_interface_resolution(buf, order, position, end))
+        elif position >= start and block_type == PCAPNG_ENHANCED_PACKET:
+            interface, high, low, captured = struct.unpack_from(
+                order + "IIII", buf, position + 8
+            )
+            resolution = (
+                resolutions[interface] if interface < len(resolutions) else 1e-6
+            )
+            timestamp = ((high << 32) | low) * resolution
+            yield end, timestamp, view[position + 28 : position + 28 + captured]
+        elif position >= start and block_type == PCAPNG_SIMPLE_PACKET:
+            original = struct.unpack_from(order + "I", buf, position + 8)[0]
+            captured = min(original, block_length - 16)
+            yield end, 0.0, view[position + 12 : position + 12 + captured]
+
+        position = end
+
+
+def _interface_resolution(buf: mmap.mmap, order: str, start: int, end: int) -> float:
+    "Timestamp resolution of a pcapng interface description block (option `if_tsresol`)"
+    position = start + 16
+    while position + 4 <= end - 4:
+        code, length = struct.unpack_from(order + "HH", buf, position)
+        if code == 0:
+            break
+        if code == 9 and length == 1:
+            value = buf[position + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0**-value
+        position += 4 + (length + 3) // 4 * 4
+    return 1e-6
+
+
+FRAMINGS = {"lines": frame_lines, "pcap": frame_pcap, "pcapng": frame_pcapng}
+
+
+class FileSource:
+    """
+    Stream the records of the input files as batches of zero-copy `memoryview` slices.
+
+    Files are memory-mapped and framed by a background thread that stays at most `readahead` batches ahead of the consumer
+    and asks the kernel to prefetch the next `chunk_size` bytes. Pages behind the consumer are released, so memory stays
+    constant whatever the file size. Slices stay valid after their pages are released, they are read again from the file.
+
+    Example Usage:
+    ```python
+    source = FileSource.from_input(config.channels.input, checkpoint=saved_offsets)
+
+    for batch in source:
+        for record in batch:
+            ...
+        # includes the batch that was just processed
+        saved_offsets = source.checkpoint()
+    ```
+    """
+
+    def __init__(
+        self,
+        files: List[str],
+        framing: str = None,
+        batch_size: int = 1024,
+        chunk_size: int = 4 << 20,
+        readahead: int = 4,
+        checkpoint: Dict[str, int] = None,
+    ) -> None:
+        """
+        Args:
+        - files (list): Paths of the files, read one after the other.
+        - framing (str): `lines`, `pcap` or `pcapng`, guessed from each file extension if None.
+        - batch_size (int): Maximum number of records per batch.
+        - chunk_size (int): Bytes prefetched ahead of the reader and released behind the consumer.
+        - readahead (int): Maximum number of batches framed ahead of the consumer.
+        - checkpoint (dict): Offsets returned by `checkpoint()` to resume from.
+        """
+        if framing is not None and framing not in FRAMINGS:
+            raise ValueError(
+                f"Unknown framing {framing}, expected one of {list(FRAMINGS)}"
+            )
+        self.files = list(files)
+        self.framing = framing
+        self.batch_size = batch_size
+        self.chunk_size = max(chunk_size - chunk_size % mmap.PAGESIZE, mmap.PAGESIZE)
+        self.readahead = readahead
+        self.offsets: Dict[str, int] = dict(checkpoint or {})
+        "offset following the last record yielded of every file"
+
+    @classmethod
+    def from_input(cls, input: Input, **kwargs) -> "FileSource":
+        "File source of the `channels.input.files` of a feature extension"
+        return cls(input.files or [], framing=input.framing, **kwargs)
+
+    def checkpoint(self) -> Dict[str, int]:
+        "Offsets to resume from, they include the last batch yielded"
+        return dict(self.offsets)
+
+    def __iter__(self) -> Iterator[List[memoryview]]:
+        batches: Queue = Queue(maxsize=self.readahead)
+        stop = Event()
+        reader = Thread(target=self._read, args=(batches, stop), daemon=True)
+        reader.start()
+
+        try:
+            while True:
+                item = batches.get()
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                path, offset, records = item
+                self.offsets[path] = offset
+                yield records
+        finally:
+            stop.set()
+            # unblock the reader if it waits for room in the queue
+            while reader.is_alive():
+                try:
+                    batches.get_nowait()
+                except Empty:
+                    reader.join(0.01)
+
+    @staticmethod
+    def _put(batches: Queue, stop: Event, item) -> bool:
+        "Wait for room in the queue, returns False if the consumer stopped"
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _read(self, batches: Queue, stop: Event) -> None:
+        "Frame every file into batches, running in the background thread"
+
+        def put(item) -> bool:
+            return self._put(batches, stop, item)
+
+        try:
+            for path in self.files:
+                if not self._read_file(path, put):
+                    return
+            put(None)
+        except BaseException as e:
+            put(e)
+
+    def _read_file(self, path: str, put) -> bool:
+        "Frame one file, returns False if the consumer stopped"
+        start = self.offsets.get(path, 0)
+        size = os.path.getsize(path)
+        if start >= size:
+            return True
+
+        framing = FRAMINGS[self.framing or guess_framing(path)]
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        prefetched = start - start % mmap.PAGESIZE
+        released = prefetched
+        batch: List[memoryview] = []
+        offset = start
+        for offset, _, record in framing(buf, start):
+            batch.append(record)
+            if offset >= prefetched:
+                prefetched = self._advise(buf, prefetched, "MADV_WILLNEED")
+            if len(batch) >= self.batch_size:
+                if not put((path, offset, batch)):
+                    return False
+                batch = []
+                # keep the chunk of the batch being consumed mapped
+                consumed = self.offsets.get(path, start) - self.chunk_size
+                while released + self.chunk_size <= consumed:
+                    released = self._advise(buf, released, "MADV_DONTNEED")
+        if batch:
+            return put((path, offset, batch))
+        return True
+
+    def _advise(self, buf: mmap.mmap, position: int, advice: str) -> int:
+        "Apply an advice to the chunk starting at `position` if the platform supports it, returns the next chunk position"
+        length = min(self.chunk_size, len(buf) - position)
+        if length > 0 and hasattr(mmap, advice):
+            buf.madvise(getattr(mmap, advice), position, length)
+        return position + self.chunk_size
+
+
+class PcapReplaySource(FileSource):
+    """
+    Replay a pcap or pcapng file as if its packets were captured on the interfaces, for load tests without NICs or privileges.
+
+    Packets are emitted at their original timing divided by `speed`, or as fast as the consumer reads them when `speed` is 0.
+    In timed mode a consumer falling `readahead` batches behind loses the packets that do not fit, as a NIC ring would,
+    they are counted in `stats()["dropped"]`.
+
+    Example Usage:
+    ```python
+    source = PcapReplaySource("capture.pcap", speed=10, loop=0)
+
+    for batch in source:
+        ...
+    source.stats()  # {"packets": ..., "dropped": ..., "pps": ..., ...}
+    ```
+    """
+
+    def __init__(
+        self,
+        file: str,
+        speed: float = 1.0,
+        loop: int = 1,
+        batch_size: int = 256,
+        readahead: int = 64,
+    ) -> None:
+        super().__init__(
+            [file], batch_size=batch_size, readahead=readahead, framing=None
+        )
+        self.file = file
+        self.speed = speed
+        self.loop = loop
+
+        self.packets = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.loops = 0
+        self.elapsed = 0.0
+
+    @classmethod
+    def from_replay(cls, replay: Replay, **kwargs) -> "PcapReplaySource":
+        return cls(replay.file, speed=replay.speed, loop=replay.loop, **kwargs)
+
+    def stats(self) -> Dict[str, float]:
+        "Packets delivered to the consumer and dropped, achieved rates"
+        elapsed = self.elapsed or 1e-9
+        return {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "dropped": self.dropped,
+            "loops": self.loops,
+            "elapsed": self.elapsed,
+            "pps": self.packets / elapsed,
+            "bps": self.bytes * 8 / elapsed,
+        }
+
+    def __iter__(self) -> Iterator[List[memoryview]]:
+        started = perf_counter()
+        try:
+            for batch in super().__iter__():
+                self.packets += len(batch)
+                self.bytes += sum(len(packet) for packet in batch)
+                self.elapsed = perf_counter() - started
+                yield batch
+        finally:
+            self.elapsed = perf_counter() - started
+            stats = self.stats()
+            engine_util.logger.info(
+                f"Replayed {stats['packets']} packets of {self.file} in {stats['elapsed']:.2f}s: "
+                f"{stats['pps']:.0f} packets/s, {stats['bps'] / 1e6:.1f} Mb/s, {stats['dropped']} dropped"
+            )
+
+    def _read(self, batches: Queue, stop: Event) -> None:
+        "Pace the packets of the file, running in the background thread"
+
+        def emit(batch: List[memoryview]) -> bool:
+            if not self.speed:
+                return self._put(batches, stop, (self.file, 0, batch))
+            try:
+                batches.put_nowait((self.file, 0, batch))
+            except Full:
+                self.dropped += len(batch)
+            return not stop.is_set()
+
+        try:
+            framing = FRAMINGS[guess_framing(self.file)]
+            with open(self.file, "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            started = perf_counter()
+            first = last = None
+            shift = 0.0
+            "capture time elapsed in the previous loops"
+
+            while not self.loop or self.loops < self.loop:
+                batch: List[memoryview] = []
+                for _, timestamp, packet in framing(buf, 0):
+                    if first is None:
+                        first = timestamp
+                    if self.speed:
+                        due = started + (timestamp - first + shift) / self.speed
+                        delay = due - perf_counter()
+                        # packets due within the same 100us are sent together
+                        if delay > 1e-4:
+                            if batch and not emit(batch):
+                                return
+                            batch = []
+                            stop.wait(delay)
+                    batch.append(packet)
+                    last = timestamp
+                    if len(batch) >= self.batch_size:
+                        if not emit(batch):
+                            return
+                        batch = []
+                if batch and not emit(batch):
+                    return
+                if first is None:
+                    break
+                self.loops += 1
+                shift += last - first + 1e-6
+                first = None
+            self._put(batches, stop, None)
+        except BaseException as e:
+            self._put(batches, stop, e)
+
+
+class LiveInterfaceSource:
+    """
+    Capture the packets of network interfaces with raw sockets (Linux only, requires `CAP_NET_RAW`).
+
+    Yields batches of the packets available on every readable interface, up to `batch_size` per interface.
+    The packets are copied out of a single receive buffer, a batch only holds the bytes of its packets.
+    """
+
+    ETH_P_ALL = 0x0003
+
+    def __init__(
+        self, interfaces: List[str], batch_size: int = 256, snaplen: int = 65535
+    ) -> None:
+        self.interfaces = list(interfaces)
+        self.batch_size = batch_size
+        self.snaplen = snaplen
+
+    def __iter__(self) -> Iterator[List[bytes]]:
+        selector = DefaultSelector()
+        sockets = []
+        # every packet is received into the same buffer, only its bytes are copied out
+        buffer = bytearray(self.snaplen)
+        view = memoryview(buffer)
+        try:
+            for interface in self.interfaces:
+                sock = socket.socket(
+                    socket.AF_PACKET, socket.SOCK_RAW, socket.htons(self.ETH_P_ALL)
+                )
+                sock.bind((interface, 0))
+                sock.setblocking(False)
+                selector.register(sock, EVENT_READ)
+                sockets.append(sock)
+
+            while True:
+                for key, _ in selector.select():
+                    batch = []
+                    while len(batch) < self.batch_size:
+                        try:
+                            size = key.fileobj.recv_into(buffer)
+                        except BlockingIOError:
+                            break
+                        batch.append(bytes(view[:size]))
+                    if batch:
+                        yield batch
+        finally:
+            selector.close()
+            for sock in sockets:
+                sock.close()
+
+
+def interface_source(input: Input, **kwargs):
+    """Packets source of the `channels.input.interfaces` of a feature extension
+    Replays `input.replay` if set, otherwise captures the interfaces
+    """
+    if input.replay is not None:
+        return PcapReplaySource.from_replay(input.replay, **kwargs)
+    return LiveInterfaceSource(input.interfaces or [], **kwargs)
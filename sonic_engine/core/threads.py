@@ -0,0 +1,143 @@
+import importlib.util
+import os
+import sys
+from multiprocessing import Pipe
+from threading import Thread
+from typing import Dict, List, Union
+
+from sonic_engine.model.app_config import AppConfigExtension
+from sonic_engine.model.extension import FeatureConfig, InferenceConfig, ReportingConfig
+from sonic_engine.util.functions import EngineUtil
+
+engine_util = EngineUtil()
+
+InstanceConfig = Union[
+    AppConfigExtension, FeatureConfig, InferenceConfig, ReportingConfig
+]
+
+
+class InstanceThread(Thread):
+    "Thread running an extension instance, with its own `__db__`"
+
+    def __init__(self, config: InstanceConfig) -> None:
+        super().__init__(name=f"instance-{config.id}", daemon=True)
+        self.config = config
+        self.db = None
+        self.error: BaseException = None
+        self.stopped = False
+
+    def _load_plugin_class(self):
+        "Import the instance package as yapsy does, and find its plugin class"
+        from yapsy.IMultiprocessPlugin import IMultiprocessPlugin
+
+        name = f"sonic_instance_{self.config.id.replace('-', '_')}"
+        spec = importlib.util.spec_from_file_location(
+            name,
+            os.path.join(self.config.path, "__init__.py"),
+            submodule_search_locations=[self.config.path],
+        )
+        # the modules of a previous run are bound to the `__db__` of its thread
+        for loaded in list(sys.modules):
+            if loaded == name or loaded.startswith(f"{name}."):
+                del sys.modules[loaded]
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+        for value in vars(module).values():
+            if (
+                isinstance(value, type)
+                and issubclass(value, IMultiprocessPlugin)
+                and value is not IMultiprocessPlugin
+            ):
+                return value
+        raise ImportError(f"No IMultiprocessPlugin class in {self.config.path}")
+
+    def run(self) -> None:
+        from sonic_engine.core.database import Database, bind_thread_database
+        from sonic_engine.core.metrics import MetricsRegistry
+
+        try:
+            # the engine flushed the database once, the instances share it
+            # the instances metrics are kept apart, the threads share the process
+            self.db = Database(flush=False, registry=MetricsRegistry())
+            # the instance modules are imported in the thread, their `__db__` is its own
+            bind_thread_database(self.db)
+            plugin_class = self._load_plugin_class()
+            parent_pipe, child_pipe = Pipe()
+            plugin = plugin_class(parent_pipe)
+            message = f"Loaded {self.config.id}"
+            child_pipe.send({"config": self.config, "message": message})
+            plugin.run()
+        except BaseException as e:
+            if not self.stopped:
+                self.error = e
+                engine_util.logger.error(f"{self.config.id} failed: {e!r}")
+        finally:
+            if self.db is not None:
+                self.db.close()
+
+    def stop(self) -> None:
+        """Ask the instance to stop: its `get_message` loop ends
+        A thread can not be killed, an instance looping elsewhere keeps running until the engine exits
+        """
+        self.stopped = True
+        if self.db is not None:
+            self.db.close()
+
+
+class ThreadHandler:
+    """
+    Runs extensions instances as threads of the engine process, the `isolation: thread` counterpart of `YapsyHandler`.
+
+    The instances are loaded from their installed folder like yapsy does and receive their config the same way,
+    but every instance uses its own `Database` bound to its thread. With the `memory://` broker the messages go from
+    an instance to another by reference, without IPC nor serialization.
+
+    The isolation is partial: the instances share the modules and the `sys.path` of the process, every instance
+    puts its venv site-packages first on it. A dependency imported by several instances is the version of the
+    first one importing it, instances needing different versions of a package must run as processes.
+
+    Example Usage:
+    ```python
+    handler = ThreadHandler(extensions_folder, [config])
+    handler.runAll()
+    handler.countAlive()  # 1
+    handler.killAll()
+    ```
+    """
+
+    def __init__(
+        self, extensions_folder, global_instances_configs_list: List[InstanceConfig]
+    ):
+        self.extensions_folder = extensions_folder
+        self.configs_list = global_instances_configs_list
+        self.threads: Dict[str, InstanceThread] = {}
+
+    def runAll(self):
+        for config in self.configs_list:
+            thread = self.threads.get(config.id)
+            if thread is None or not thread.is_alive():
+                thread = self.threads[config.id] = InstanceThread(config)
+                thread.start()
+
+    def _running(self) -> List[InstanceThread]:
+        return [
+            thread
+            for thread in self.threads.values()
+            if thread.is_alive() and not thread.stopped
+        ]
+
+    def countAlive(self):
+        return len(self._running())
+
+    def pids(self) -> Dict[str, int]:
+        "Process id of every running instance, the engine one"
+        return {thread.config.id: os.getpid() for thread in self._running()}
+
+    def crashed(self) -> List[str]:
+        "Ids of the instances whose thread ended with an error"
+        return [id for id, thread in self.threads.items() if thread.error is not None]
+
+    def killAll(self):
+        for thread in self.threads.values():
+            thread.stop()
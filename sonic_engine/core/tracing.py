@@ -0,0 +1,138 @@
+import atexit
+import json
+import os
+import struct
+from random import random
+from threading import Lock
+from time import time
+from typing import Any, Dict, NamedTuple, Tuple
+from uuid import uuid4
+
+from sonic_engine.core.metrics import REGISTRY, MetricsRegistry
+from sonic_engine.model.extension import TracingConfig
+
+TRACE_MAGIC = b"SCT1"
+"Prefix of the traced messages, the trace context precedes the payload"
+
+CURRENT_TRACE = object()
+"Trace continued by default by a published message: the one of the message being handled by the consuming thread"
+
+
+class TracedPayload(NamedTuple):
+    "Trace context beside a payload, published as is by the in-process broker"
+
+    context: Dict
+    data: Any
+
+
+def is_traced(data: Any) -> bool:
+    "Check if a message payload carries a trace context"
+    if isinstance(data, TracedPayload):
+        return True
+    return isinstance(data, bytes) and data[:4] == TRACE_MAGIC
+
+
+def wrap(context: Dict, data: Any) -> bytes:
+    "Prepend a trace context to a payload, redis delivers non-bytes payloads encoded anyway"
+    if isinstance(data, str):
+        data = data.encode()
+    elif not isinstance(data, (bytes, bytearray, memoryview)):
+        data = str(data).encode()
+    header = json.dumps(context, separators=(",", ":")).encode()
+    return b"".join((TRACE_MAGIC, struct.pack("<I", len(header)), header, data))
+
+
+def unwrap(data: bytes) -> Tuple[Dict, Any]:
+    "Split a traced message into its trace context and its payload"
+    if isinstance(data, TracedPayload):
+        return data
+    (length,) = struct.unpack_from("<I", data, 4)
+    return json.loads(data[8 : 8 + length]), data[8 + length :]
+
+
+class Tracer:
+    """
+    Latency tracing of the messages across the pipeline hops.
+
+    A published message is sampled with probability `sample_rate`, it then carries a trace context: its trace id,
+    origin time and the names of the extensions it went through. A message published while handling a traced message
+    continues its trace, whatever the sampling. Unsampled messages are published unchanged.
+
+    On every hop, the receiving instance records the latency from the origin per path (e.g. `feature>inference`),
+    in its metrics registry served by the engine on `/metrics`, and appends the hop to
+    `<log dir>/<instance id>-traces.jsonl` if `export` is set. Timestamps come from the hosts clocks, they must be
+    synchronized when the extensions run on several nodes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        instance_id: str,
+        config: TracingConfig,
+        log_dir: str = None,
+        registry: MetricsRegistry = REGISTRY,
+    ) -> None:
+        self.name = name
+        self.sample_rate = config.sample_rate
+        self.registry = registry
+        self._file = None
+        self._lock = Lock()
+        if config.export and log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+            path = os.path.join(log_dir, f"{instance_id}-traces.jsonl")
+            self._file = open(path, "a")
+            atexit.register(self.close)
+
+    def start(self, current: Dict = None) -> Dict:
+        "Context of a message to publish, continuing `current` if set, None if the message is not sampled"
+        if current is not None:
+            return {
+                "id": current["id"],
+                "origin": current["origin"],
+                "path": current["path"] + [self.name],
+                "sent": time(),
+            }
+        if not self.sample_rate or random() >= self.sample_rate:
+            return None
+        now = time()
+        return {"id": uuid4().hex, "origin": now, "path": [self.name], "sent": now}
+
+    def record(
+        self,
+        context: Dict,
+        channel: str,
+        received: float,
+        dequeued: float,
+        handled: float,
+    ) -> None:
+        "Record a hop of a traced message, once the receiving instance handled it"
+        path = ">".join(context["path"] + [self.name])
+        latency = received - context["origin"]
+        self.registry.histogram(
+            "sonic_trace_latency_seconds",
+            "Time from the origin of traced messages to their reception, per path",
+            path=path,
+        ).observe(latency)
+        if self._file is None:
+            return
+
+        span = {
+            "trace": context["id"],
+            "path": path,
+            "channel": channel,
+            "origin": context["origin"],
+            "sent": context["sent"],
+            "received": received,
+            "transit": received - context["sent"],
+            "queue_wait": dequeued - received,
+            "handler": handled - dequeued,
+            "latency": latency,
+        }
+        with self._lock:
+            self._file.write(json.dumps(span) + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
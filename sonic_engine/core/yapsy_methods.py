@@ -1,11 +1,12 @@
 from yapsy.MultiprocessPluginManager import MultiprocessPluginManager
 from yapsy.IMultiprocessPlugin import IMultiprocessPlugin
 from sonic_engine.util.dataclass import dataclass
-from typing import Union
+from typing import Dict, List, Union
 from sonic_engine.model.extension import FeatureConfig, InferenceConfig, ReportingConfig
 from sonic_engine.model.app_config import AppConfigExtension
 from sonic_engine.util.functions import EngineUtil
 import os
+import signal
 
 engine_util = EngineUtil()
 
@@ -108,7 +109,29 @@ class YapsyHandler:
             ]
         )
 
+    def pids(self) -> Dict[str, int]:
+        "Process id of every running instance"
+        return {
+            plugin.name: plugin.plugin_object.proc.pid
+            for plugin in self.manager.getAllPlugins()
+            if getattr(plugin.plugin_object, "proc", None) is not None
+            and plugin.plugin_object.proc.is_alive()
+        }
+
+    def crashed(self) -> List[str]:
+        "Ids of the instances whose process exited with an error (not killed by the engine)"
+        return [
+            plugin.name
+            for plugin in self.manager.getAllPlugins()
+            if getattr(plugin.plugin_object, "proc", None) is not None
+            and plugin.plugin_object.proc.exitcode not in (None, 0, -signal.SIGTERM)
+        ]
+
     def killAll(self):
         for plugin in self.manager.getAllPlugins():
             if plugin.plugin_object.is_activated:
                 plugin.plugin_object.deactivate()
+            # the plugin runs in a child process, deactivating the proxy does not stop it
+            proc = getattr(plugin.plugin_object, "proc", None)
+            if proc is not None and proc.is_alive():
+                proc.terminate()
@@ -0,0 +1,330 @@
+from typing import List, NamedTuple
+
+import numpy as np
+
+COLUMNS = (
+    "packets",
+    "bytes",
+    "bytes_min",
+    "bytes_max",
+    "first_seen",
+    "last_seen",
+    "duration",
+    "iat_mean",
+    "iat_std",
+    "iat_min",
+    "iat_max",
+)
+"Columns of the emitted windows values"
+
+
+class Window(NamedTuple):
+    "Features of the flows seen in a completed window"
+
+    start: float
+    "Start time of the window"
+
+    end: float
+    "End time of the window"
+
+    keys: np.ndarray
+    "Flow key hash of every row (uint64)"
+
+    values: np.ndarray
+    "2-D array of the flows features, one row per flow and one column per `COLUMNS` item"
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    "splitmix64 finalizer"
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def hash_keys(*columns) -> np.ndarray:
+    """Combine key columns into one uint64 hash per row
+
+    Example Usage:
+    ```python
+    keys = hash_keys(src_ip, dst_ip, src_port, dst_port, protocol)
+    ```
+    """
+    with np.errstate(over="ignore"):
+        h = np.full(len(columns[0]), 0x9E3779B97F4A7C15, dtype=np.uint64)
+        for column in columns:
+            h = _mix(h ^ _mix(np.asarray(column).astype(np.uint64)))
+    return h
+
+
+class FlowTable:
+    """
+    Per-flow window aggregation on preallocated columnar arrays.
+
+    A window of `window` seconds slides every `slide` seconds (tumbling if `slide` is not set). It is stored as `window / slide`
+    panes: every column is a `(panes, capacity)` array, and a flow keeps the same slot (column index) while it is active.
+    A batch is aggregated with a handful of vectorized operations whatever its size: keys are resolved to slots with a
+    binary search over the sorted active keys, and the per-flow reductions use `np.add.reduceat` and friends.
+
+    Packets are assigned to panes by their timestamp, a packet older than the current pane is counted in it.
+    When a pane completes, the window ending with it is emitted and the flows without packets in the remaining panes are evicted.
+
+    Example Usage:
+    ```python
+    table = FlowTable(window=10, slide=1)
+
+    for window in table.update(hash_keys(*five_tuple), timestamps, sizes):
+        publish(window.keys, window.values)
+    ```
+    """
+
+    def __init__(
+        self, window: float = 10.0, slide: float = None, capacity: int = 1 << 16
+    ) -> None:
+        self.window = window
+        self.slide = slide or window
+        self.panes = max(int(round(window / self.slide)), 1)
+        self.pane_id: int = None
+        "id of the current pane, its start time is `pane_id * slide`"
+
+        self.capacity = 0
+        self._keys = np.empty(0, dtype=np.uint64)
+        "sorted keys of the active flows"
+        self._slots = np.empty(0, dtype=np.int64)
+        "slot of every key of `_keys`"
+        self._free = np.empty(0, dtype=np.int64)
+
+        self.packets = np.empty((self.panes, 0), dtype=np.int64)
+        self.bytes = np.empty((self.panes, 0))
+        self.bytes_min = np.empty((self.panes, 0))
+        self.bytes_max = np.empty((self.panes, 0))
+        self.first_seen = np.empty((self.panes, 0))
+        self.last_seen = np.empty((self.panes, 0))
+        self.iat_count = np.empty((self.panes, 0), dtype=np.int64)
+        self.iat_sum = np.empty((self.panes, 0))
+        self.iat_squares = np.empty((self.panes, 0))
+        self.iat_min = np.empty((self.panes, 0))
+        self.iat_max = np.empty((self.panes, 0))
+        self.seen = np.empty(0)
+        "last packet time of every slot, across panes"
+
+        self._allocate(capacity)
+
+    # columns initial values, the min/max columns start at +/-inf so they reduce without masks
+    _INITIAL = {
+        "packets": 0,
+        "bytes": 0.0,
+        "bytes_min": np.inf,
+        "bytes_max": -np.inf,
+        "first_seen": np.inf,
+        "last_seen": -np.inf,
+        "iat_count": 0,
+        "iat_sum": 0.0,
+        "iat_squares": 0.0,
+        "iat_min": np.inf,
+        "iat_max": -np.inf,
+    }
+
+    def __len__(self) -> int:
+        "Number of active flows"
+        return len(self._keys)
+
+    def _allocate(self, capacity: int) -> None:
+        "Grow the columns to `capacity` slots"
+        extra = capacity - self.capacity
+        for name, initial in self._INITIAL.items():
+            column = getattr(self, name)
+            grown = np.full((self.panes, extra), initial, dtype=column.dtype)
+            setattr(self, name, np.concatenate((column, grown), axis=1))
+        self.seen = np.concatenate((self.seen, np.full(extra, np.nan)))
+        # slots are taken from the end of the free stack
+        self._free = np.concatenate(
+            (np.arange(capacity - 1, self.capacity - 1, -1), self._free)
+        )
+        self.capacity = capacity
+
+    def _resolve(self, keys: np.ndarray) -> np.ndarray:
+        "Slots of sorted unique keys, allocating the new flows"
+        position = np.searchsorted(self._keys, keys)
+        found = np.zeros(len(keys), dtype=bool)
+        if len(self._keys):
+            clipped = np.minimum(position, len(self._keys) - 1)
+            found = self._keys[clipped] == keys
+
+        slots = np.empty(len(keys), dtype=np.int64)
+        slots[found] = self._slots[position[found]]
+
+        new = ~found
+        count = int(new.sum())
+        if count:
+            if count > len(self._free):
+                self._allocate(max(self.capacity * 2, len(self._keys) + count))
+            new_slots = self._free[len(self._free) - count :]
+            self._free = self._free[: len(self._free) - count]
+            slots[new] = new_slots
+            # keys are sorted, inserting them at their positions keeps `_keys` sorted
+            self._keys = np.insert(self._keys, position[new], keys[new])
+            self._slots = np.insert(self._slots, position[new], new_slots)
+        return slots
+
+    def update(self, keys, timestamps, sizes) -> List[Window]:
+        """
+        Aggregate a batch of packets.
+
+        Args:
+        - keys: Flow key hash of every packet, see `hash_keys`.
+        - timestamps: Time of every packet in seconds, ordered within every flow.
+        - sizes: Size of every packet in bytes.
+
+        Returns:
+        - The windows completed by the batch.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        sizes = np.asarray(sizes, dtype=np.float64)
+        if not len(keys):
+            return []
+
+        pane_ids = np.floor(timestamps / self.slide).astype(np.int64)
+        if self.pane_id is None:
+            self.pane_id = int(pane_ids.min())
+        np.maximum(pane_ids, self.pane_id, out=pane_ids)
+
+        windows = []
+        if np.all(pane_ids == pane_ids[0]):
+            windows += self._advance(int(pane_ids[0]))
+            self._aggregate(keys, timestamps, sizes)
+            return windows
+
+        order = np.argsort(pane_ids, kind="stable")
+        pane_ids = pane_ids[order]
+        bounds = np.flatnonzero(np.diff(pane_ids)) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(order)]):
+            windows += self._advance(int(pane_ids[start]))
+            selection = order[start:end]
+            self._aggregate(keys[selection], timestamps[selection], sizes[selection])
+        return windows
+
+    def _aggregate(self, keys: np.ndarray, timestamps: np.ndarray, sizes: np.ndarray):
+        "Aggregate packets of the current pane"
+        unique, inverse = np.unique(keys, return_inverse=True)
+        slots = self._resolve(unique)
+
+        # group the packets of every flow, the stable sort keeps their order
+        order = np.argsort(inverse, kind="stable")
+        groups = inverse[order]
+        timestamps = timestamps[order]
+        sizes = sizes[order]
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+
+        pane = self.pane_id % self.panes
+        self.packets[pane, slots] += np.diff(np.r_[starts, len(groups)])
+        self.bytes[pane, slots] += np.add.reduceat(sizes, starts)
+        self.bytes_min[pane, slots] = np.minimum(
+            self.bytes_min[pane, slots], np.minimum.reduceat(sizes, starts)
+        )
+        self.bytes_max[pane, slots] = np.maximum(
+            self.bytes_max[pane, slots], np.maximum.reduceat(sizes, starts)
+        )
+        self.first_seen[pane, slots] = np.minimum(
+            self.first_seen[pane, slots], np.minimum.reduceat(timestamps, starts)
+        )
+        last = np.maximum.reduceat(timestamps, starts)
+        self.last_seen[pane, slots] = np.maximum(self.last_seen[pane, slots], last)
+
+        # inter-arrival times, the first packet of a flow follows its last packet of the previous batches
+        previous = np.empty_like(timestamps)
+        previous[1:] = timestamps[:-1]
+        previous[starts] = self.seen[slots]
+        iat = timestamps - previous
+        valid = ~np.isnan(iat)
+        iat = np.where(valid, iat, 0.0)
+        self.iat_count[pane, slots] += np.add.reduceat(valid.astype(np.int64), starts)
+        self.iat_sum[pane, slots] += np.add.reduceat(iat, starts)
+        self.iat_squares[pane, slots] += np.add.reduceat(iat * iat, starts)
+        self.iat_min[pane, slots] = np.minimum(
+            self.iat_min[pane, slots],
+            np.minimum.reduceat(np.where(valid, iat, np.inf), starts),
+        )
+        self.iat_max[pane, slots] = np.maximum(
+            self.iat_max[pane, slots],
+            np.maximum.reduceat(np.where(valid, iat, -np.inf), starts),
+        )
+        self.seen[slots] = np.fmax(self.seen[slots], last)
+
+    def _advance(self, pane_id: int) -> List[Window]:
+        "Complete the panes before `pane_id`"
+        windows = []
+        while self.pane_id < pane_id:
+            if not len(self._keys):
+                # nothing left to emit, skip the empty panes
+                self.pane_id = pane_id
+                break
+            window = self._complete()
+            if window is not None:
+                windows.append(window)
+        return windows
+
+    def advance(self, now: float) -> List[Window]:
+        "Complete the panes ending before `now`, for windows to be emitted while no packet arrives"
+        if self.pane_id is None:
+            return []
+        return self._advance(int(np.floor(now / self.slide)))
+
+    def flush(self) -> List[Window]:
+        "Complete every pane and emit the remaining windows"
+        if self.pane_id is None:
+            return []
+        return self._advance(self.pane_id + self.panes)
+
+    def _complete(self) -> Window:
+        "Emit the window ending with the current pane, then recycle its oldest pane"
+        slots = self._slots
+        packets = self.packets[:, slots].sum(axis=0)
+        emitted = packets > 0
+
+        window = None
+        if emitted.any():
+            rows = slots[emitted]
+            iat_count = self.iat_count[:, rows].sum(axis=0)
+            iat_sum = self.iat_sum[:, rows].sum(axis=0)
+            iat_squares = self.iat_squares[:, rows].sum(axis=0)
+            has_iat = iat_count > 0
+            divisor = np.maximum(iat_count, 1)
+            iat_mean = iat_sum / divisor
+            iat_std = np.sqrt(np.maximum(iat_squares / divisor - iat_mean**2, 0.0))
+            first_seen = self.first_seen[:, rows].min(axis=0)
+            last_seen = self.last_seen[:, rows].max(axis=0)
+
+            values = np.column_stack(
+                (
+                    packets[emitted],
+                    self.bytes[:, rows].sum(axis=0),
+                    self.bytes_min[:, rows].min(axis=0),
+                    self.bytes_max[:, rows].max(axis=0),
+                    first_seen,
+                    last_seen,
+                    last_seen - first_seen,
+                    iat_mean,
+                    iat_std,
+                    np.where(has_iat, self.iat_min[:, rows].min(axis=0), 0.0),
+                    np.where(has_iat, self.iat_max[:, rows].max(axis=0), 0.0),
+                )
+            )
+            end = (self.pane_id + 1) * self.slide
+            window = Window(end - self.window, end, self._keys[emitted], values)
+
+        # the oldest pane becomes the next one
+        self.pane_id += 1
+        pane = self.pane_id % self.panes
+        for name, initial in self._INITIAL.items():
+            getattr(self, name)[pane, slots] = initial
+
+        # evict the flows without packets in the remaining panes
+        idle = self.packets[:, slots].sum(axis=0) == 0
+        if idle.any():
+            self.seen[slots[idle]] = np.nan
+            self._free = np.concatenate((self._free, slots[idle]))
+            self._keys = self._keys[~idle]
+            self._slots = self._slots[~idle]
+
+        return window
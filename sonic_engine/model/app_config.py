@@ -1,11 +1,84 @@
 from sonic_engine.util.dataclass import nested_dataclass
 from sonic_engine.model.extension import (
     ExtensionConfig,
+    FlightRecorderConfig,
     ModelsPipeline,
     ChannelsPipeline,
     LogConfig,
+    TracingConfig,
 )
-from typing import List, Dict, Union
+from typing import Any, List, Dict, Literal, Union
+
+
+@nested_dataclass
+class RedisConfig:
+    "Redis connection shared by the engine and its extensions"
+
+    url: str = "unix:///run/redis.sock"
+    "Redis url, `unix:///path/to/redis.sock` for a local socket, `redis://host:port/db` for TCP or `memory://` for the in-process broker of the `thread` isolation"
+
+    flush: bool = True
+    "Flush the database when the engine starts, always disabled in cluster mode"
+
+
+@nested_dataclass
+class ClusterConfig:
+    "Multi-node configuration, every engine node claims a subset of the extensions instances"
+
+    node_id: str = None
+    "Unique id of the engine node, defaults to `<hostname>-<pid>`"
+
+    lease_ttl: float = 10.0
+    "Seconds before the instances of an unresponsive node are taken over by the other nodes"
+
+    heartbeat_interval: float = 2.0
+    "Seconds between two heartbeats, must be lower than `lease_ttl`"
+
+    prefix: str = "sonic:cluster"
+    "Prefix of the redis keys holding the nodes heartbeats and the instances leases"
+
+
+@nested_dataclass
+class MemoryConfig:
+    "Memory watchdog of the extensions instances processes"
+
+    check_interval: float = 10.0
+    "Seconds between two samples of the instances RSS"
+
+    warmup: float = 60.0
+    "Seconds after an instance start before its RSS is taken as baseline"
+
+    snapshot_growth_mb: float = 256
+    "RSS growth from the baseline triggering a tracemalloc snapshot in the instance, 0 to disable"
+
+    max_rss_mb: float = None
+    "RSS limit of an instance, set it below the memory available to the engine"
+
+    alert_ratio: float = 0.8
+    "Fraction of `max_rss_mb` at which an alert is logged"
+
+    recycle: bool = False
+    "Restart the instances reaching `max_rss_mb`"
+
+
+@nested_dataclass
+class IngestConfig:
+    "HTTP ingestion of external events on `POST /ingest/<channel>` of the control plane"
+
+    publish: List[str]
+    "Channels the external sources may publish into"
+
+    high_watermark: int = 10000
+    "Queue length of a subscriber above which the ingestion into its channels is refused (HTTP 429)"
+
+    retry_after: int = 1
+    "Seconds the sources are told to wait before retrying a refused request"
+
+    batch_size: int = 1000
+    "Messages published per pipeline"
+
+    max_body_mb: float = 16
+    "Size limit of a request body"
 
 
 @nested_dataclass
@@ -18,6 +91,25 @@ class AppConfigMetadata:
     replace_existing: Union[bool, None] = None
     "Replace an existing extension with the same id, if None: ask, if True: replace, if False: skip"
 
+    redis: RedisConfig = None
+    "Redis connection, defaults to the local socket `/run/redis.sock`"
+
+    cluster: ClusterConfig = None
+    "Run the engine as a node of a cluster, redis must then be reachable over TCP by every node"
+
+    memory: MemoryConfig = None
+    "Watch the memory of the extensions instances processes"
+
+    ingest: IngestConfig = None
+    "Accept events pushed over HTTP by external sources, disabled by default"
+
+    isolation: Literal["process", "thread"] = "process"
+    "Run every instance in its own process, or all of them as threads of the engine process (with a `memory://` redis url, the messages are passed without IPC), the threads share the imported packages (see `ThreadHandler`)"
+
+    def __post_init__(self):
+        if self.redis is None:
+            self.redis = RedisConfig()
+
 
 @nested_dataclass
 class AppConfigCategory:
@@ -59,6 +151,13 @@ class ExtensionGlobalConfig(ExtensionConfig):
 
     models: List[ModelsPipeline] = None
 
+    replicas: List[str] = None
+    "Ids of all the instances of the extension"
+
+    tracing: TracingConfig = None
+
+    flight_recorder: FlightRecorderConfig = None
+
     # AppConfigExtension
 
     id: str = None
@@ -82,6 +181,21 @@ class ExtensionGlobalConfig(ExtensionConfig):
     path: str = None
     "Path of the extension"
 
+    compile_bytecode: bool = True
+    "Compile the instance code and its venv packages to bytecode at install, so the first start does not write them"
+
+    frozen_venv: bool = False
+    "Compile the venv packages to unchecked-hash pycs, never checked against their sources (only if the venv is not modified after install)"
+
+    def __post_init__(self):
+        """
+        Initializes the `options` field only, `set_defaults` runs once the instance config is merged with the
+        extension config.yaml, a default `log` or `tracing` would replace its sections.
+        """
+
+        if self.options is None:
+            self.options = {}
+
 
 @nested_dataclass
 class AppConfigExtension:
@@ -108,7 +222,14 @@ class AppConfigExtension:
     path: str = None
     "Path of the extension"
 
-    override: Dict[str, ExtensionGlobalConfig] = None
+    compile_bytecode: bool = True
+    "Compile the instance code and its venv packages to bytecode at install, so the first start does not write them"
+
+    frozen_venv: bool = False
+    "Compile the venv packages to unchecked-hash pycs, never checked against their sources (only if the venv is not modified after install)"
+
+    override: Dict[str, Dict[str, Any]] = None
+    "Fields of `ExtensionGlobalConfig` overridden per instance id, kept as dicts so only the given fields are replaced"
 
 
 @nested_dataclass
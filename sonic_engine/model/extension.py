@@ -12,7 +12,52 @@ class LogConfig:
     "Log level"
 
     dir: str = "./logs"
-    "Path to the logs folder"
+    "Path to the logs folder, every instance writes to `<dir>/<instance id>.log` (no log files if not set)"
+
+    format: Literal["text", "json"] = "text"
+    "Format of the records, `json` writes one JSON object per line"
+
+    max_bytes: int = 10 << 20
+    "Size at which the log file is rotated"
+
+    rotate_when: str = None
+    "Rotate the log file at time intervals instead (`midnight`, `H`, ... see `TimedRotatingFileHandler`)"
+
+    backup_count: int = 5
+    "Number of rotated log files kept"
+
+
+@nested_dataclass
+class TracingConfig:
+    "Latency tracing of the messages published by the extension"
+
+    sample_rate: float = 0.0
+    "Fraction of the published messages carrying a trace, messages published while handling a traced message are always traced"
+
+    export: bool = False
+    "Append the traced hops received by the instance to `<log dir>/<instance id>-traces.jsonl`"
+
+
+@nested_dataclass
+class FlightRecorderConfig:
+    "Flight recorder of the messages published by the extension"
+
+    max_messages: int = 1000
+    "Number of messages kept per channel"
+
+
+@nested_dataclass
+class Replay:
+    "Pcap replay standing in for the network interfaces"
+
+    file: str
+    "Path of the pcap or pcapng file"
+
+    speed: float = 1.0
+    "Multiplier of the original timing, 0 to replay as fast as possible"
+
+    loop: int = 1
+    "Number of times the file is replayed, 0 to loop forever"
 
 
 @nested_dataclass
@@ -25,6 +70,12 @@ class Input:
     interfaces: List[str] = None
     "List of network interfaces names"
 
+    framing: Literal["lines", "pcap", "pcapng"] = None
+    "Records framing of the input files, guessed from every file extension if not set"
+
+    replay: Replay = None
+    "Replay a capture instead of listening to the interfaces"
+
 
 # CHANNELS
 
@@ -39,6 +90,12 @@ class ChannelsPipeline:
 
     publish: List[str] = None
 
+    partitions: Dict[str, int] = None
+    "Number of partitions of the key-partitioned channels, must match between publishers and subscribers"
+
+    routing: Dict[str, Literal["broadcast", "least_loaded"]] = None
+    "Routing mode of the channels, `least_loaded` sends every message to the replica with the shortest queue instead of all of them"
+
 
 @nested_dataclass
 class FeatureChannel(ChannelsPipeline):
@@ -118,17 +175,37 @@ class ExtensionConfig:
 
     options: Dict = None
 
+    replicas: List[str] = None
+    "Ids of all the instances of the extension (set by the engine), they share the partitions of the subscribed channels"
+
+    tracing: TracingConfig = None
+    "Latency tracing of the published messages, disabled by default"
+
+    flight_recorder: FlightRecorderConfig = None
+    "Keep the last messages published into every channel in redis for post-mortem debugging"
+
+    workers: int = None
+    "Worker processes of the `Extension` pool running `work`, -1 for one per available core, the class default if not set"
+
     def __post_init__(self):
         """
-        Initializes the `log` field with a default value if it is not provided during object creation.
+        Initializes the `log` and `tracing` fields with a default value if they are not provided during object creation.
         """
 
-        if self.log is None:
-            self.log = LogConfig()
+        self.set_defaults()
 
         if self.options is None:
             self.options = {}
 
+    def set_defaults(self) -> None:
+        "Give their default value to the unset `log` and `tracing` configs"
+
+        if self.log is None:
+            self.log = LogConfig()
+
+        if self.tracing is None:
+            self.tracing = TracingConfig()
+
 
 @nested_dataclass
 class FeatureConfig(ExtensionConfig):
@@ -0,0 +1,99 @@
+import atexit
+import os
+import pickle
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+CONFIG_CACHE_ENV = "SONIC_CONFIG_CACHE"
+"Environment variable holding the path of the parsed configs cache, empty to disable the cache"
+
+DEFAULT_CONFIG_CACHE = os.path.join(".sonic_cache", "configs.pickle")
+
+Entry = Tuple[int, int, bytes]
+"(modification time in ns, size, pickled parsed config) of a config file"
+
+
+class ConfigCache:
+    """
+    Parsed YAML configs kept in a local file, keyed by the path, modification time and size of their config file.
+
+    Entries are pickled: every `get` returns a fresh copy, callers may mutate it. Only the configs that were validated
+    should be `put`. The cache is read on first use and written back at exit if it changed.
+
+    Example Usage:
+    ```python
+    stat = ConfigCache.stat(path)
+    data = CONFIG_CACHE.get(path, stat)
+    if data is None:
+        data = parse(path)
+        CONFIG_CACHE.put(path, stat, data)
+    ```
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._entries: Dict[str, Entry] = None
+        self._dirty = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _load(self) -> Dict[str, Entry]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.path, "rb") as f:
+                    self._entries = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+                # missing or corrupted cache, it is rebuilt
+                pass
+            atexit.register(self.save)
+        return self._entries
+
+    @staticmethod
+    def stat(path: str) -> Tuple[int, int]:
+        "Version of a config file, taken before reading it"
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, path: str, stat: Tuple[int, int]) -> Optional[Any]:
+        "Parsed config of a file, None if the file changed since it was cached"
+        if not self.enabled:
+            return None
+        entry = self._load().get(os.path.abspath(path))
+        if entry is None or entry[:2] != stat:
+            return None
+        return pickle.loads(entry[2])
+
+    def put(self, path: str, stat: Tuple[int, int], data: Any) -> None:
+        if not self.enabled:
+            return
+        entry = (*stat, pickle.dumps(data, protocol=-1))
+        self._load()[os.path.abspath(path)] = entry
+        self._dirty = True
+
+    def save(self) -> None:
+        "Write the cache file if it changed"
+        if not self._dirty:
+            return
+        folder = os.path.dirname(self.path) or "."
+        tmp = None
+        try:
+            os.makedirs(folder, exist_ok=True)
+            # a temporary file per writer, concurrent engines never write the same one
+            with tempfile.NamedTemporaryFile(
+                "wb", dir=folder, prefix=".configs-", delete=False
+            ) as f:
+                tmp = f.name
+                pickle.dump(self._entries, f, protocol=-1)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except OSError:
+            # the cache is an optimization, the configs are parsed again next time
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+
+CONFIG_CACHE = ConfigCache(os.environ.get(CONFIG_CACHE_ENV, DEFAULT_CONFIG_CACHE))
+"Parsed configs cache of the current process"
@@ -1,40 +1,122 @@
-from dataclasses import _MISSING_TYPE, dataclass, fields, is_dataclass
+from collections.abc import Mapping
+from dataclasses import MISSING, dataclass, fields, is_dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from typing import get_args, get_origin
 from sonic_engine.util.functions import EngineUtil
 
 engine_util = EngineUtil()
 
+Converter = Tuple[type, Callable[[Any], Any]]
+"Raw container type (dict or list) converted for a field type, and its conversion"
+
+
+def _converter(field_type) -> Optional[Converter]:
+    """Conversion of the raw values (parsed YAML) of a field type into its nested dataclasses
+    Returns None when the values are used as is
+    """
+    if is_dataclass(field_type):
+        # mappings without fields (e.g. `ModelsPipeline`) keep their raw dicts
+        if isinstance(field_type, type) and issubclass(field_type, Mapping):
+            return None
+        if not fields(field_type):
+            return None
+        return dict, lambda value: field_type(**value)
+
+    origin, args = get_origin(field_type), get_args(field_type)
+    if origin is list and args:
+        item = _converter(args[0])
+        if item is not None:
+            accepts, convert = item
+            return list, lambda value: [
+                convert(v) if isinstance(v, accepts) else v for v in value
+            ]
+    elif origin is dict and len(args) == 2:
+        item = _converter(args[1])
+        if item is not None:
+            accepts, convert = item
+            return dict, lambda value: {
+                k: convert(v) if isinstance(v, accepts) else v for k, v in value.items()
+            }
+    elif origin is Union:
+        # the first member converting a container type wins
+        members: Dict[type, Callable] = {}
+        for member in args:
+            converter = _converter(member)
+            if converter is not None:
+                members.setdefault(*converter)
+        if len(members) == 1:
+            return next(iter(members.items()))
+        if members:
+
+            def convert(value):
+                for accepts, member in members.items():
+                    if isinstance(value, accepts):
+                        return member(value)
+                return value
+
+            return object, convert
+    return None
+
+
+class _Schema:
+    "Fields table of a nested dataclass, compiled once per class"
+
+    __slots__ = ("names", "required", "converters")
+
+    def __init__(self, cls) -> None:
+        cls_fields = [f for f in fields(cls) if f.init]
+        self.names = [f.name for f in cls_fields]
+        self.required = frozenset(
+            f.name
+            for f in cls_fields
+            if f.default is MISSING and f.default_factory is MISSING
+        )
+        self.converters: List[Tuple[str, type, Callable]] = []
+        for f in cls_fields:
+            converter = _converter(f.type)
+            if converter is not None:
+                self.converters.append((f.name, *converter))
+
+    def missing(self, args: tuple, kwargs: Dict[str, Any]) -> List[str]:
+        given = set(self.names[: len(args)])
+        given.update(kwargs)
+        return [name for name in self.names if name in self.required - given]
+
 
 def nested_dataclass(*args, **kwargs):
+    """
+    Dataclass decorator building the nested dataclasses of its fields from dicts, e.g. a parsed YAML config.
+
+    Dataclass fields are converted, as well as dataclasses nested in `List`, `Dict` and `Union` fields.
+    The fields table and their conversions are compiled once when the class is created.
+    """
+
     def wrapper(cls):
         cls = dataclass(cls, **kwargs)
 
         original_init = cls.__init__
+        schema = _Schema(cls)
+        converters = schema.converters
+        required = schema.required
 
         def __init__(self, *args, **kwargs):
-            missing = []
-            for f in fields(cls):
-                if type(f.default) == _MISSING_TYPE and f.name not in kwargs:
-                    missing.append(f"{f.name}")
-            if len(missing):
-                parent_key = (
-                    cls._parent_key + "."
-                    if hasattr(cls, "_parent_key") and cls._parent_key
-                    else ""
-                )
-                missing_fields = ",".join([f"'{parent_key}{f}'" for f in missing])
-                raise TypeError(
-                    f"The following fields {missing_fields} are required for {cls.__name__}"
-                )
-
-            for name, value in kwargs.items():
-                field_type = None
-                for f in fields(cls):
-                    if f.name == name:
-                        field_type = f.type
-                        break
-                if is_dataclass(field_type) and isinstance(value, dict):
-                    new_obj = field_type(**value)
-                    kwargs[name] = new_obj
+            if required and (args or not required <= kwargs.keys()):
+                missing = schema.missing(args, kwargs)
+                if len(missing):
+                    parent_key = (
+                        cls._parent_key + "."
+                        if hasattr(cls, "_parent_key") and cls._parent_key
+                        else ""
+                    )
+                    missing_fields = ",".join([f"'{parent_key}{f}'" for f in missing])
+                    raise TypeError(
+                        f"The following fields {missing_fields} are required for {cls.__name__}"
+                    )
+
+            for name, accepts, convert in converters:
+                value = kwargs.get(name)
+                if value is not None and isinstance(value, accepts):
+                    kwargs[name] = convert(value)
             try:
                 original_init(self, *args, **kwargs)
             except TypeError as e:
@@ -2,11 +2,11 @@ import os
 from time import time
 import logging
 from typing import Dict, TypeVar, Any, Union, Type
-import yaml
 import sys
 import shutil
 from dataclasses import replace
 import subprocess
+from sonic_engine.util.config_cache import CONFIG_CACHE, ConfigCache
 
 T = TypeVar("T")
 
@@ -15,25 +15,27 @@ def timestamp():
     return round(time() * 1e3)
 
 
-def _update_nested_dict(
+def _merge_changes(
     original_dict: Dict[str, Any], overrides: Dict[str, Any]
 ) -> Dict[str, Any]:
-    "Update a dict with another regarding nested items in a way that replace the original values with the new ones if they are not None"
-
-    updated_dict = original_dict.copy()
+    """Values of a dict changed by overrides: nested dicts are merged, None values are ignored
+    Only the changed keys are returned and only the nested dicts on the path of a change are copied, the others are shared
+    """
 
+    changes = {}
     for key, value in overrides.items():
-        if (
-            isinstance(value, dict)
-            and key in updated_dict
-            and isinstance(updated_dict[key], dict)
-        ):
-            updated_dict[key] = _update_nested_dict(updated_dict[key], value)
-        else:
-            if value is not None:
-                updated_dict[key] = value
-
-    return updated_dict
+        if value is None:
+            continue
+        current = original_dict.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            nested = _merge_changes(current, value)
+            if not nested:
+                continue
+            value = {**current, **nested}
+        elif value is current:
+            continue
+        changes[key] = value
+    return changes
 
 
 class EngineUtil:
@@ -49,22 +51,35 @@ class EngineUtil:
         return updated_config
 
     def load_config(self, cls: T, config_file_path, override: T = None) -> Type[T]:
+        """Load a YAML config file as `cls`, then apply the non None fields of `override`
+        The parsed files are cached (see `ConfigCache`), only the files changed since their last load are parsed
+        """
+        # loaded on first use, the extensions processes import this module but seldom load configs
+        import yaml
+
+        # libyaml based loader when available, about ten times faster than the pure Python one
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
         try:
             config_file_path = os.path.abspath(config_file_path)
-            with open(config_file_path, "r") as f:
-                try:
-                    config = yaml.safe_load(f.read())
-
-                    config = cls(**config)
-                    if override is not None:
-                        config = self.override_nested_config(config, override)
-                    return config
-                except yaml.YAMLError as e:
-                    self.logger.error(f"{e} for {cls.__name__} in {config_file_path}")
-                    self.stop_engine(1)
-                except TypeError as e:
-                    self.logger.error(f"{e} for {cls.__name__} in {config_file_path}")
-                    self.stop_engine(1)
+            stat = ConfigCache.stat(config_file_path)
+            data = CONFIG_CACHE.get(config_file_path, stat)
+            cached = data is not None
+            if not cached:
+                with open(config_file_path, "rb") as f:
+                    data = yaml.load(f, Loader=loader)
+            try:
+                config = cls(**data)
+                if not cached:
+                    CONFIG_CACHE.put(config_file_path, stat, data)
+                if override is not None:
+                    config = self.override_nested_config(config, override)
+                return config
+            except TypeError as e:
+                self.logger.error(f"{e} for {cls.__name__} in {config_file_path}")
+                self.stop_engine(1)
+        except yaml.YAMLError as e:
+            self.logger.error(f"{e} for {cls.__name__} in {config_file_path}")
+            self.stop_engine(1)
         except FileNotFoundError:
             self.logger.error(f"File {config_file_path} not found!")
             self.stop_engine(1)
@@ -76,10 +91,8 @@ class EngineUtil:
     # TODO: 1 fix this one and make sure it's working as expected
     @staticmethod
     def override_nested_config(config: T, override: T) -> Type[T]:
-        updated_config = replace(
-            config, **_update_nested_dict(config.__dict__, override.__dict__)
-        )
-        return updated_config
+        changes = _merge_changes(config.__dict__, override.__dict__)
+        return replace(config, **changes) if changes else config
 
     def remove_folder(self, path):
         "Remove a folder and its contents"
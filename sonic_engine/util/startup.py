@@ -0,0 +1,128 @@
+import os
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple, Tuple
+
+ENGINE_MODULE = "sonic_engine.core.engine"
+
+
+class ImportTime(NamedTuple):
+    "A line of `python -X importtime`"
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+    "nesting level, 0 for the modules imported by the measured code itself"
+
+
+def parse_importtime(output: str) -> List[ImportTime]:
+    "Imports reported by `python -X importtime`, in import completion order"
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        if not self_us.strip().isdigit():
+            # header
+            continue
+        module = name.strip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append(ImportTime(module, int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def extension_code(path: str) -> str:
+    "Code importing the entry module of an installed extension instance, as yapsy does"
+    init = os.path.join(path, "__init__.py")
+    return (
+        "import importlib.util, sys\n"
+        f"spec = importlib.util.spec_from_file_location('sonic_extension', {init!r}, "
+        f"submodule_search_locations=[{path!r}])\n"
+        "module = importlib.util.module_from_spec(spec)\n"
+        "sys.modules[spec.name] = module\n"
+        "spec.loader.exec_module(module)\n"
+    )
+
+
+def measure(code: str, python: str = sys.executable, cwd: str = None):
+    """Run `code` in a fresh interpreter with `-X importtime`
+    Returns the wall time of the code in seconds and its imports, raises `RuntimeError` if the code failed
+    """
+    timed = (
+        "from time import perf_counter as _perf_counter\n"
+        "_started = _perf_counter()\n"
+        f"{code}\n"
+        "print(_perf_counter() - _started)\n"
+    )
+    process = subprocess.run(
+        [python, "-X", "importtime", "-c", timed],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+    )
+    if process.returncode != 0:
+        errors = [
+            line for line in process.stderr.splitlines() if "import time:" not in line
+        ]
+        raise RuntimeError("\n".join(errors[-5:]))
+    elapsed = float(process.stdout.strip().splitlines()[-1])
+    return elapsed, parse_importtime(process.stderr)
+
+
+def extensions_paths(extensions_folder: str) -> Dict[str, str]:
+    "Folder of every installed instance, by instance id (`<extensions folder>/<category>/<id>`)"
+    paths = {}
+    if not os.path.isdir(extensions_folder):
+        return paths
+    for category in sorted(os.listdir(extensions_folder)):
+        category_path = os.path.join(extensions_folder, category)
+        if not os.path.isdir(category_path):
+            continue
+        for instance_id in sorted(os.listdir(category_path)):
+            path = os.path.join(category_path, instance_id)
+            if os.path.isfile(os.path.join(path, "__init__.py")):
+                paths[instance_id] = os.path.abspath(path)
+    return paths
+
+
+def slowest(imports: List[ImportTime], top: int) -> List[ImportTime]:
+    "Imports costing the most by themselves"
+    return sorted(imports, key=lambda i: i.self_us, reverse=True)[:top]
+
+
+def startup_report(
+    extensions_folder: str = None, top: int = 10, slow_ms: float = 20.0
+) -> Tuple[str, Dict]:
+    """Import time of the engine and of the entry module of every installed extension instance
+    Returns the text report and its JSON serializable data, imports slower than `slow_ms` by themselves are flagged
+    """
+    targets = [("engine", ENGINE_MODULE, f"import {ENGINE_MODULE}")]
+    if extensions_folder:
+        for instance_id, path in extensions_paths(extensions_folder).items():
+            targets.append((instance_id, path, extension_code(path)))
+
+    lines, data = [], {}
+    for name, target, code in targets:
+        try:
+            elapsed, imports = measure(code)
+        except RuntimeError as e:
+            lines += [f"{name} ({target}): import failed", f"    {e}", ""]
+            data[name] = {"target": target, "error": str(e)}
+            continue
+        lines.append(
+            f"{name} ({target}): {elapsed * 1000:.1f} ms, {len(imports)} modules"
+        )
+        entries = []
+        for entry in slowest(imports, top):
+            slow = entry.self_us / 1000 >= slow_ms
+            flag = "  SLOW" if slow else ""
+            lines.append(
+                f"    {entry.self_us / 1000:8.1f} ms self"
+                f" {entry.cumulative_us / 1000:8.1f} ms cumulative  {entry.module}{flag}"
+            )
+            entries.append({**entry._asdict(), "slow": slow})
+        lines.append("")
+        data[name] = {"target": target, "seconds": elapsed, "slowest": entries}
+    return "\n".join(lines), data
+
@@ -0,0 +1,94 @@
+import unittest
+import numpy as np
+from sonic_engine.core.batch import BATCH_MAGIC, ColumnBatch, is_batch
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def sample() -> ColumnBatch:
+    return ColumnBatch(
+        {
+            "key": np.array([1, 2, 2**63], dtype=np.uint64),
+            "packets": np.array([3, -1, 7], dtype=np.int32),
+            "flag": np.array([1, 0, 255], dtype=np.uint8),
+            "ratio": np.array([0.5, 1.5, np.nan], dtype=np.float32),
+            "score": np.array([0.25, 0.5, 1e300]),
+            "alert": np.array([True, False, True]),
+            "label": np.array(["benign", "dos", "scan"]),
+            "tag": np.array([b"a", b"bc", b"def"]),
+            "features": np.arange(6, dtype=np.float64).reshape(3, 2),
+        }
+    )
+
+
+class TestColumnBatch(unittest.TestCase):
+    def assertBatchEqual(self, decoded: ColumnBatch, batch: ColumnBatch):
+        self.assertEqual(list(decoded.columns), list(batch.columns))
+        self.assertEqual(decoded.schema, batch.schema)
+        for name, column in batch.columns.items():
+            self.assertEqual(decoded[name].shape, column.shape)
+            np.testing.assert_array_equal(decoded[name], column)
+
+    def test_round_trip(self):
+        batch = sample()
+        data = batch.encode()
+        self.assertTrue(is_batch(data))
+        self.assertTrue(is_batch(memoryview(data)))
+        decoded = ColumnBatch.decode(data)
+        self.assertBatchEqual(decoded, batch)
+        # the columns are views on the payload, aligned on 8 bytes
+        start = np.frombuffer(data, dtype=np.uint8).ctypes.data
+        for column in decoded.columns.values():
+            self.assertFalse(column.flags.writeable)
+            self.assertEqual((column.ctypes.data - start) % 8, 0)
+
+    def test_selected_columns(self):
+        decoded = ColumnBatch.decode(sample().encode(), columns=["score", "label"])
+        self.assertEqual(list(decoded.columns), ["score", "label"])
+        self.assertEqual(decoded["label"].tolist(), ["benign", "dos", "scan"])
+
+    def test_empty(self):
+        batch = ColumnBatch({"key": np.array([], dtype=np.uint64), "score": []})
+        decoded = ColumnBatch.decode(batch.encode())
+        self.assertBatchEqual(decoded, batch)
+        self.assertEqual(len(decoded), 0)
+
+        decoded = ColumnBatch.decode(ColumnBatch({}).encode())
+        self.assertEqual((len(decoded), decoded.columns), (0, {}))
+
+    def test_objects_are_not_encoded(self):
+        batch = ColumnBatch({"record": np.array([{"a": 1}], dtype=object)})
+        self.assertRaises(TypeError, batch.encode)
+
+    def test_invalid_payloads(self):
+        data = sample().encode()
+        self.assertFalse(is_batch(b"not a batch"))
+        self.assertFalse(is_batch({"key": 1}))
+        self.assertRaisesRegex(ValueError, "Not a column", ColumnBatch.decode, b"{}")
+        for truncated in (data[:6], data[:20], data[: len(data) - 8]):
+            self.assertRaises(ValueError, ColumnBatch.decode, truncated)
+
+        # a header length beyond the payload, then a corrupted header
+        corrupted = BATCH_MAGIC + (10**6).to_bytes(4, "little") + data[8:]
+        self.assertRaisesRegex(ValueError, "Truncated", ColumnBatch.decode, corrupted)
+        corrupted = bytearray(data)
+        corrupted[8:10] = b"]]"
+        self.assertRaisesRegex(
+            ValueError, "Corrupted", ColumnBatch.decode, bytes(corrupted)
+        )
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow_round_trip(self):
+        batch = sample().select(["key", "packets", "score", "alert", "features"])
+        data = batch.encode(arrow=True)
+        self.assertTrue(is_batch(data))
+        decoded = ColumnBatch.decode(data)
+        for name, column in batch.columns.items():
+            np.testing.assert_array_equal(decoded[name], column)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+from sonic_engine.core.batch import ColumnBatch
+from sonic_engine.core.broker import LocalRedis
+from sonic_engine.core.database import Database, connect
+from sonic_engine.core.metrics import MetricsRegistry
+from sonic_engine.core.tracing import Tracer
+from sonic_engine.model.extension import TracingConfig
+
+
+class TestLocalRedis(unittest.TestCase):
+    def setUp(self) -> None:
+        self.redis = LocalRedis()
+
+    def test_publish_by_reference(self):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe("flows")
+        patterns = self.redis.pubsub()
+        patterns.psubscribe("flows:*")
+        self.assertEqual(patterns.get_message(timeout=1)["type"], "psubscribe")
+
+        record = {"key": [1, 2]}
+        self.assertEqual(self.redis.publish("flows", record), 1)
+        self.assertEqual(self.redis.publish("flows:3", record), 1)
+        message = pubsub.get_message(timeout=1)
+        self.assertEqual(message["channel"], b"flows")
+        self.assertIs(message["data"], record)
+        message = patterns.get_message(timeout=1)
+        self.assertEqual(
+            (message["type"], message["pattern"]), ("pmessage", b"flows:*")
+        )
+        self.assertIsNone(pubsub.get_message(timeout=0.01))
+
+        pubsub.close()
+        self.assertEqual(self.redis.publish("flows", record), 0)
+        self.assertEqual(list(pubsub.listen()), [])
+
+    def test_hashes_are_encoded_as_redis(self):
+        self.redis.hset("load", "inference", "3 1.5")
+        self.redis.hset("load", mapping={"reporting": 2})
+        self.assertEqual(
+            self.redis.hgetall("load"), {b"inference": b"3 1.5", b"reporting": b"2"}
+        )
+        self.assertEqual(self.redis.hdel("load", "inference", "missing"), 1)
+        self.assertEqual(self.redis.hlen("load"), 1)
+
+    def test_pipeline_and_streams(self):
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.publish("flows", b"data")
+        for i in range(5):
+            pipeline.xadd("flight", {"data": i}, maxlen=3)
+        results = pipeline.execute()
+        self.assertEqual(results[0], 0)
+        entries = self.redis.xrange("flight")
+        self.assertEqual([fields[b"data"] for _, fields in entries], [b"2", b"3", b"4"])
+        self.assertEqual(len({entry_id for entry_id, _ in entries}), 3)
+
+    def test_flushdb(self):
+        self.redis.set("a", 1)
+        self.redis.flushdb()
+        self.assertIsNone(self.redis.get("a"))
+
+
+class TestLocalDatabase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.db = Database("memory://test-database", flush=True)
+        self.db.instance_id = "inference"
+
+    def test_connect_shares_the_broker(self):
+        self.assertIs(connect("memory://test-database"), self.db.redis)
+        self.assertIsNot(connect("memory://other"), self.db.redis)
+
+    def test_objects_are_not_serialized(self):
+        batch = ColumnBatch({"score": [0.5, 0.9]})
+        self.db.pubsubs = [self.db.subscribe("scores")]
+        self.db.publish("scores", batch)
+
+        for message in self.db.get_message(timeout=0.01):
+            if message["type"] == "message":
+                self.assertIs(message["data"], batch)
+                self.db.stop_listening()
+        # the loop ended once stopped
+
+        record = {"window": [1, 2]}
+        self.db.store("flows", "key", record)
+        self.assertIs(self.db.retrieve("flows", "key"), record)
+        self.db.delete("flows", "key")
+        self.assertIsNone(self.db.redis.hget("flows", "key"))
+
+    def test_traced_objects_are_not_serialized(self):
+        config = TracingConfig(sample_rate=1.0)
+        self.db.tracer = Tracer("inference", "inference", config, None, MetricsRegistry())
+        self.db.pubsubs = [self.db.subscribe("scores")]
+        batch = ColumnBatch({"score": [0.5, 0.9]})
+        self.db.publish("scores", batch)
+
+        for message in self.db.get_message(timeout=0.01):
+            if message["type"] == "message":
+                self.assertIs(message["data"], batch)
+                self.assertEqual(message["trace"]["path"], ["inference"])
+                self.db.stop_listening()
+
+
+if __name__ == "__main__":
+    unittest.main()
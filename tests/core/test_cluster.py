@@ -0,0 +1,115 @@
+import fnmatch
+import unittest
+from sonic_engine.core.cluster import ClusterNode, RELEASE_SCRIPT
+from sonic_engine.model.app_config import ClusterConfig
+
+INSTANCES_IDS = ["feature", "inference_1", "inference_2", "reporting"]
+
+
+class FakeRedis:
+    "Minimal in-memory redis covering the commands used by the cluster leases (ttls are ignored)"
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value)
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if fnmatch.fnmatch(key, match)]
+
+    def register_script(self, script):
+        def run(keys, args):
+            if self.data.get(keys[0]) != args[0]:
+                return 0
+            return self.delete(keys[0]) if script == RELEASE_SCRIPT else 1
+
+        return run
+
+
+class TestClusterNode(unittest.TestCase):
+    def setUp(self) -> None:
+        self.redis = FakeRedis()
+
+    def _node(self, node_id):
+        return ClusterNode(self.redis, INSTANCES_IDS, ClusterConfig(node_id=node_id))
+
+    def test_single_node_claims_everything(self):
+        node = self._node("a")
+
+        acquired, lost = node.tick()
+
+        self.assertEqual(sorted(acquired), sorted(INSTANCES_IDS))
+        self.assertEqual(lost, [])
+
+    def test_nodes_split_instances(self):
+        node_a, node_b = self._node("a"), self._node("b")
+        node_a.heartbeat()
+        node_b.heartbeat()
+
+        node_a.tick()
+        node_b.tick()
+
+        self.assertEqual(len(node_a.owned), 2)
+        self.assertEqual(len(node_b.owned), 2)
+        self.assertEqual(set(node_a.owned) | set(node_b.owned), set(INSTANCES_IDS))
+
+    def test_joining_node_takes_over_extra_instances(self):
+        node_a = self._node("a")
+        node_a.tick()
+
+        node_b = self._node("b")
+        node_b.heartbeat()
+        _, lost = node_a.tick()
+        acquired, _ = node_b.tick()
+
+        self.assertEqual(len(lost), 2)
+        self.assertEqual(sorted(acquired), sorted(lost))
+
+    def test_dead_node_instances_fail_over(self):
+        node_a, node_b = self._node("a"), self._node("b")
+        node_a.heartbeat()
+        node_b.heartbeat()
+        node_a.tick()
+        node_b.tick()
+
+        # node b dies: its heartbeat and leases expire
+        for key in list(self.redis.data):
+            if self.redis.data[key] == "b" or key.endswith(":node:b"):
+                del self.redis.data[key]
+        acquired, _ = node_a.tick()
+
+        self.assertEqual(len(acquired), 2)
+        self.assertEqual(sorted(node_a.owned), sorted(INSTANCES_IDS))
+
+    def test_lost_lease_is_reported(self):
+        node_a = self._node("a")
+        node_a.tick()
+        self.redis.data[node_a._lease_key("feature")] = "b"
+        self.redis.set(node_a._node_key("b"), 0)
+
+        _, lost = node_a.tick()
+
+        self.assertIn("feature", lost)
+        self.assertNotIn("feature", node_a.owned)
+
+    def test_leave_releases_leases(self):
+        node_a = self._node("a")
+        node_a.tick()
+
+        node_a.leave()
+
+        self.assertEqual(self.redis.data, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,9 @@
+from dataclasses import replace
 from io import BytesIO, StringIO, TextIOWrapper
+import importlib.util
 import os
+import py_compile
+import sys
 import unittest
 from unittest.mock import patch, MagicMock, mock_open
 import shutil
@@ -344,70 +348,80 @@ class TestExtensionInstanceHandler(unittest.TestCase):
 
     @patch("os.path.join")
     @patch("builtins.open", new_callable=mock_open)
-    def test_write_init_file_windows_success(self, mock_open, mock_os_join_path):
+    def test_write_venv_paths_file_windows_success(self, mock_open, mock_os_join_path):
         self.handler.system_platform = "Windows"
-        site_packages_for_windows = f"custom_site_packages_path = engine_util.relative(__file__, '.venv/Lib/site-packages')"
-        site_packages_64 = f"custom_site_packages_64_path = engine_util.relative(__file__, '.venv/Lib/site-packages')"
-
-        self.handler._write_init_file()
-
-        expected_content = f"""
-import sys
-from sonic_engine.util.functions import EngineUtil
-
-engine_util = EngineUtil()
-
-{site_packages_for_windows}
 
-{site_packages_64}
-
-sys.path.insert(0, custom_site_packages_path)
-sys.path.insert(0, custom_site_packages_64_path)
-
-# fmt: off
-from .main import *
-    """
+        self.handler._write_venv_paths_file()
 
         mock_os_join_path.assert_called_once_with(
-            self.handler.config.path, "__init__.py"
+            self.handler.config.path, "venv-paths.pth"
         )
         mock_open.assert_called_once_with(mock_os_join_path.return_value, "w")
-        mock_open().write.assert_called_once_with(expected_content)
+        mock_open().write.assert_called_once_with(".venv/Lib/site-packages\n")
 
     @patch("sys.version_info", new_callable=lambda: (3, 9, 0))
     @patch("os.path.join")
     @patch("builtins.open", new_callable=mock_open)
-    def test_write_init_file_linux_success(
+    def test_write_venv_paths_file_linux_success(
         self, mock_open, mock_os_join_path, mock_sys_version_info
     ):
         self.handler.system_platform = "Linux"
-        site_packages_for_linux = f"custom_site_packages_path = engine_util.relative(__file__, '.venv/lib/python{mock_sys_version_info[0]}.{mock_sys_version_info[1]}/site-packages')"
-        site_packages_64_for_linux = f"custom_site_packages_64_path = engine_util.relative(__file__, '.venv/lib64/python{mock_sys_version_info[0]}.{mock_sys_version_info[1]}/site-packages')"
 
-        self.handler._write_init_file()
+        self.handler._write_venv_paths_file()
 
-        expected_content = f"""
-import sys
-from sonic_engine.util.functions import EngineUtil
+        mock_open().write.assert_called_once_with(
+            ".venv/lib/python3.9/site-packages\n.venv/lib64/python3.9/site-packages\n"
+        )
 
-engine_util = EngineUtil()
+    def test_write_init_file_success(self):
+        self._create_ext_path()
+        site_packages = os.path.join(self.handler.config.path, "site-packages")
+        os.makedirs(site_packages)
+        with open(os.path.join(site_packages, "extra.pth"), "w") as f:
+            f.write("extra\n")
+        os.makedirs(os.path.join(site_packages, "extra"))
+        with open(os.path.join(self.handler.config.path, "venv-paths.pth"), "w") as f:
+            f.write("# venv\nsite-packages\n")
 
-{site_packages_for_linux}
+        self.handler._write_init_file()
 
-{site_packages_64_for_linux}
+        with open(os.path.join(self.handler.config.path, "__init__.py")) as f:
+            script = f.read().replace("from .main import *", "")
+        namespace = {"__file__": os.path.join(self.handler.config.path, "__init__.py")}
+        path = sys.path.copy()
+        try:
+            exec(script, namespace)
+            self.assertEqual(sys.path[0], site_packages)
+            # the .pth files of the venv site-packages are processed
+            self.assertIn(os.path.join(site_packages, "extra"), sys.path)
+        finally:
+            sys.path[:] = path
+
+    @patch("compileall.compile_dir", return_value=True)
+    def test_compile_bytecode(self, mock_compile_dir):
+        self._create_ext_path()
+        os.makedirs(os.path.join(self.handler.config.path, ".venv"))
+        handler = ExtensionInstanceHandler(replace(EXTENSION_CONFIG, frozen_venv=True))
+
+        handler._compile_bytecode()
+
+        code, venv = mock_compile_dir.call_args_list
+        self.assertEqual(code.args, (self.handler.config.path,))
+        self.assertTrue(code.kwargs["rx"].search("/ext/.venv/lib/six.py"))
+        self.assertEqual(venv.args, (os.path.join(self.handler.config.path, ".venv"),))
+        self.assertEqual(
+            venv.kwargs["invalidation_mode"], py_compile.PycInvalidationMode.UNCHECKED_HASH
+        )
 
-sys.path.insert(0, custom_site_packages_path)
-sys.path.insert(0, custom_site_packages_64_path)
+    def test_compiled_bytecode_is_used(self):
+        self._create_ext_path()
+        module = os.path.join(self.handler.config.path, "main.py")
+        with open(module, "w") as f:
+            f.write("VALUE = 1\n")
 
-# fmt: off
-from .main import *
-    """
+        self.handler._compile_bytecode()
 
-        mock_os_join_path.assert_called_once_with(
-            self.handler.config.path, "__init__.py"
-        )
-        mock_open.assert_called_once_with(mock_os_join_path.return_value, "w")
-        mock_open().write.assert_called_once_with(expected_content)
+        self.assertTrue(os.path.exists(importlib.util.cache_from_source(module)))
 
     @patch("os.path.join")
     @patch("builtins.open", new_callable=mock_open)
@@ -465,6 +479,12 @@ Version = {self.handler.config.version}
     @patch(
         "sonic_engine.core.extension_instance.ExtensionInstanceHandler._install_requirements"
     )
+    @patch(
+        "sonic_engine.core.extension_instance.ExtensionInstanceHandler._compile_bytecode"
+    )
+    @patch(
+        "sonic_engine.core.extension_instance.ExtensionInstanceHandler._write_venv_paths_file"
+    )
     @patch(
         "sonic_engine.core.extension_instance.ExtensionInstanceHandler._write_init_file"
     )
@@ -475,6 +495,8 @@ Version = {self.handler.config.version}
         self,
         mock_write_yapsy_plugin_file,
         mock_write_init_file,
+        mock_write_venv_paths_file,
+        mock_compile_bytecode,
         mock_install_requirements,
         mock_create_venv,
         mock_copy,
@@ -489,6 +511,8 @@ Version = {self.handler.config.version}
         mock_load_local_configs.assert_called_once()
         mock_create_venv.assert_called_once()
         mock_install_requirements.assert_called_once_with("/python_bin")
+        mock_compile_bytecode.assert_called_once()
+        mock_write_venv_paths_file.assert_called_once()
         mock_write_init_file.assert_called_once()
         mock_write_yapsy_plugin_file.assert_called_once()
         mock_os_path_exists.assert_called_with(self.handler.config.source)
@@ -515,6 +539,12 @@ Version = {self.handler.config.version}
     @patch(
         "sonic_engine.core.extension_instance.ExtensionInstanceHandler._install_requirements"
     )
+    @patch(
+        "sonic_engine.core.extension_instance.ExtensionInstanceHandler._compile_bytecode"
+    )
+    @patch(
+        "sonic_engine.core.extension_instance.ExtensionInstanceHandler._write_venv_paths_file"
+    )
     @patch(
         "sonic_engine.core.extension_instance.ExtensionInstanceHandler._write_init_file"
     )
@@ -525,6 +555,8 @@ Version = {self.handler.config.version}
         self,
         mock_write_yapsy_plugin_file,
         mock_write_init_file,
+        mock_write_venv_paths_file,
+        mock_compile_bytecode,
         mock_install_requirements,
         mock_create_venv,
         mock_copy,
@@ -541,6 +573,8 @@ Version = {self.handler.config.version}
         mock_load_local_configs.assert_called_once()
         mock_create_venv.assert_called_once()
         mock_install_requirements.assert_called_once_with("/python_bin")
+        mock_compile_bytecode.assert_called_once()
+        mock_write_venv_paths_file.assert_called_once()
         mock_write_init_file.assert_called_once()
         mock_write_yapsy_plugin_file.assert_called_once()
         mock_os_path_exists.assert_called_with(self.handler.config.source)
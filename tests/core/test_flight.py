@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from time import time
+from sonic_engine.core.flight import FlightRecorder, dump, flight_key
+from sonic_engine.core.recorder import Segment
+from sonic_engine.model.extension import FlightRecorderConfig
+
+
+class FakeRedis:
+    "Streams capped exactly, as an approximate MAXLEN may keep a few more entries"
+
+    def __init__(self) -> None:
+        self.streams = {}
+
+    def xadd(self, name, fields, maxlen=None, approximate=True, timestamp=None):
+        stream = self.streams.setdefault(name, [])
+        milliseconds = int((timestamp or time()) * 1000)
+        entry_id = f"{milliseconds}-{len(stream)}".encode()
+        stream.append((entry_id, {k.encode(): v for k, v in fields.items()}))
+        del stream[: max(len(stream) - maxlen, 0)]
+
+    def xrange(self, name):
+        return self.streams.get(name, [])
+
+
+class TestFlightRecorder(unittest.TestCase):
+    def setUp(self) -> None:
+        self.redis = FakeRedis()
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "alerts-flight.seg")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def _records(self):
+        with Segment(self.path) as segment:
+            return [(channel, bytes(data)) for _, channel, data in segment.records()]
+
+    def test_capped_per_channel(self):
+        recorder = FlightRecorder(FlightRecorderConfig(max_messages=2), "inference-1")
+
+        for i in range(5):
+            recorder.record(self.redis, "alerts", f"alert {i}".encode())
+
+        stream = self.redis.streams[flight_key("alerts")]
+        self.assertEqual([fields[b"data"] for _, fields in stream], [b"alert 3", b"alert 4"])
+        self.assertEqual(stream[0][1][b"instance"], "inference-1")
+
+    def test_dump_merges_channels_in_order(self):
+        now = time()
+        self.redis.xadd(flight_key("flows"), {"data": b"f1"}, 10, timestamp=now - 2)
+        self.redis.xadd(flight_key("alerts"), {"data": b"a1"}, 10, timestamp=now - 1)
+        self.redis.xadd(flight_key("flows"), {"data": b"f2"}, 10, timestamp=now)
+
+        count = dump(self.redis, ["alerts", "flows"], self.path)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(
+            self._records(), [(b"flows", b"f1"), (b"alerts", b"a1"), (b"flows", b"f2")]
+        )
+
+    def test_dump_max_age(self):
+        now = time()
+        self.redis.xadd(flight_key("alerts"), {"data": b"old"}, 10, timestamp=now - 60)
+        self.redis.xadd(flight_key("alerts"), {"data": b"new"}, 10, timestamp=now)
+
+        self.assertEqual(dump(self.redis, ["alerts"], self.path, max_age=30), 1)
+        self.assertEqual(self._records(), [(b"alerts", b"new")])
+
+    def test_empty_dump_writes_nothing(self):
+        self.assertEqual(dump(self.redis, ["alerts"], self.path), 0)
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
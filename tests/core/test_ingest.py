@@ -0,0 +1,145 @@
+import http.client
+import json
+import struct
+import unittest
+from time import time
+from types import SimpleNamespace
+from sonic_engine.core.ingest import Ingestor, split_frames, split_ndjson
+from sonic_engine.core.partition import partition_channel, partition_of
+from sonic_engine.core.routing import load_key
+from sonic_engine.core.server import ControlPlane
+from sonic_engine.model.app_config import IngestConfig
+
+
+class FakePipeline:
+    def __init__(self, redis) -> None:
+        self.redis = redis
+        self.commands = []
+
+    def publish(self, ch, data):
+        self.commands.append((ch, data))
+
+    def execute(self):
+        self.redis.round_trips += 1
+        self.redis.published += self.commands
+        self.commands = []
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.hashes = {}
+        self.published = []
+        self.round_trips = 0
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key.encode()] = value
+
+    def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class TestIngestor(unittest.TestCase):
+    def setUp(self) -> None:
+        self.redis = FakeRedis()
+        config = IngestConfig(publish=["sensors", "flows"], batch_size=2)
+        self.ingestor = Ingestor(self.redis, config, partitions={"flows": 4})
+
+    def test_split(self):
+        self.assertEqual(split_ndjson(b'{"a": 1}\r\n\n{"a": 2}\n'), [b'{"a": 1}', b'{"a": 2}'])
+        frames = b"".join(struct.pack("<I", len(m)) + m for m in (b"\x00\x01", b"", b"abc"))
+        self.assertEqual(split_frames(frames), [b"\x00\x01", b"", b"abc"])
+        with self.assertRaises(ValueError):
+            split_frames(frames[:-1])
+
+    def test_pipelined_batches(self):
+        messages = [b"1", b"2", b"3"]
+        self.assertEqual(self.ingestor.publish("sensors", messages), 3)
+        self.assertEqual(self.redis.published, [("sensors", m) for m in messages])
+        self.assertEqual(self.redis.round_trips, 2)
+
+    def test_partitioned_channel_needs_keys(self):
+        messages = [b'{"src": "10.0.0.1"}', b'{"src": "10.0.0.2"}']
+        with self.assertRaises(ValueError):
+            self.ingestor.keys("flows", messages, None)
+
+        keys = self.ingestor.keys("flows", messages, "src")
+        self.ingestor.publish("flows", messages, keys)
+        expected = [partition_channel("flows", partition_of(k, 4)) for k in keys]
+        self.assertEqual([ch for ch, _ in self.redis.published], expected)
+
+    def test_overloaded(self):
+        self.assertIsNone(self.ingestor.overloaded("sensors"))
+
+        self.ingestor._loads.clear()
+        self.redis.hset(load_key("sensors"), "feature", f"20000 {time()}".encode())
+        self.assertEqual(self.ingestor.overloaded("sensors"), "feature")
+
+        # stalled subscribers are ignored
+        self.ingestor._loads.clear()
+        self.redis.hset(load_key("sensors"), "feature", f"20000 {time() - 60}".encode())
+        self.assertIsNone(self.ingestor.overloaded("sensors"))
+
+
+class TestIngestEndpoint(unittest.TestCase):
+    def setUp(self) -> None:
+        self.redis = FakeRedis()
+        engine = SimpleNamespace(config=None)
+        self.control_plane = ControlPlane(engine, port=0)
+        config = IngestConfig(publish=["sensors"], max_body_mb=0.001)
+        self.control_plane.ingestor = Ingestor(self.redis, config)
+        self.control_plane.start()
+        self.connection = http.client.HTTPConnection("127.0.0.1", self.control_plane.port)
+
+    def tearDown(self) -> None:
+        self.connection.close()
+        self.control_plane.stop()
+
+    def post(self, path, body, content_type="application/x-ndjson"):
+        self.connection.request("POST", path, body, {"Content-Type": content_type})
+        response = self.connection.getresponse()
+        return response, json.loads(response.read())
+
+    def test_ingest(self):
+        response, body = self.post("/ingest/sensors", b'{"t": 1}\n{"t": 2}\n')
+        self.assertEqual((response.status, body["messages"]), (200, 2))
+        self.assertEqual(self.redis.published, [("sensors", b'{"t": 1}'), ("sensors", b'{"t": 2}')])
+
+        self.assertEqual(self.post("/ingest/alerts", b"{}")[0].status, 403)
+        self.assertEqual(self.post("/ingest/sensors", b"{}", "text/csv")[0].status, 415)
+
+    def test_chunked_body(self):
+        chunks = [b'{"t": 1}\n{"t"', b': 2}\n']
+        self.connection.request(
+            "POST",
+            "/ingest/sensors",
+            iter(chunks),
+            {"Content-Type": "application/x-ndjson"},
+            encode_chunked=True,
+        )
+        response = self.connection.getresponse()
+        self.assertEqual((response.status, json.loads(response.read())["messages"]), (200, 2))
+        self.assertEqual(self.redis.published, [("sensors", b'{"t": 1}'), ("sensors", b'{"t": 2}')])
+
+        # the connection is reused for the next request
+        self.assertEqual(self.post("/ingest/sensors", b'{"t": 3}\n')[0].status, 200)
+
+        self.connection.request("POST", "/ingest/sensors", iter([b"x" * 2000]), encode_chunked=True)
+        self.assertEqual(self.connection.getresponse().status, 413)
+
+    def test_backpressure(self):
+        self.redis.hset(load_key("sensors"), "feature", f"20000 {time()}".encode())
+        response, _ = self.post("/ingest/sensors", b"{}")
+        self.assertEqual(response.status, 429)
+        self.assertEqual(response.getheader("Retry-After"), "1")
+        self.assertEqual(self.redis.published, [])
+
+    def test_body_size_limit(self):
+        response, _ = self.post("/ingest/sensors", b"x" * 2000)
+        self.assertEqual(response.status, 413)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+import unittest
+from sonic_engine.core import logger as logger_module
+from sonic_engine.core.logger import LazyMessage, Logger
+from sonic_engine.model.extension import LogConfig
+
+
+class Costly:
+    "An argument counting how many times it is formatted"
+
+    def __init__(self) -> None:
+        self.formatted = 0
+
+    def __str__(self) -> str:
+        self.formatted += 1
+        return "costly"
+
+
+class TestLogger(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        logger_module.shutdown()
+        self.dir.cleanup()
+
+    def _read(self, ctx):
+        logger_module.shutdown()
+        with open(os.path.join(self.dir.name, f"{ctx}.log")) as f:
+            return f.read().splitlines()
+
+    def test_disabled_level_is_not_formatted(self):
+        config = LogConfig(level="INFO", dir=self.dir.name)
+        logger = Logger(config, "test-disabled")
+        argument = Costly()
+
+        logger.debug("value:", argument)
+        logger.debug("value: %s", argument)
+
+        self.assertEqual(argument.formatted, 0)
+        self.assertEqual(self._read("test-disabled"), [])
+
+    def test_messages_are_written_to_the_instance_file(self):
+        logger = Logger(LogConfig(dir=self.dir.name), "test-file")
+
+        logger.info("window %s: %d flows", "w1", 3)
+        logger.warning("connected to", "redis", 1)
+
+        lines = self._read("test-file")
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith("test-file [INFO] window w1: 3 flows"))
+        self.assertTrue(lines[1].endswith("test-file [WARNING] connected to redis 1"))
+
+    def test_json_format(self):
+        logger = Logger(LogConfig(dir=self.dir.name, format="json"), "test-json")
+
+        logger.error("failed %d times", 2)
+
+        entry = json.loads(self._read("test-json")[0])
+        self.assertEqual(entry["level"], "ERROR")
+        self.assertEqual(entry["name"], "test-json")
+        self.assertEqual(entry["message"], "failed 2 times")
+
+    def test_records_are_formatted_when_logged(self):
+        logger = Logger(LogConfig(dir=self.dir.name), "test-prepare")
+        flows = ["a"]
+
+        logger.info("flows %s", flows)
+        flows.append("b")
+        try:
+            raise ValueError("bad window")
+        except ValueError:
+            logger.exception("failed")
+
+        lines = self._read("test-prepare")
+        self.assertTrue(lines[0].endswith("flows ['a']"))
+        self.assertIn("ValueError: bad window", lines)
+
+    def test_records_are_written_on_sigterm(self):
+        ready = multiprocessing.get_context("fork").Event()
+
+        def run():
+            logger = Logger(LogConfig(dir=self.dir.name), "test-sigterm")
+            for i in range(2000):
+                logger.info("record %d", i)
+            ready.set()
+            # the handler of a signal received during a sleep may only run once it returns
+            while True:
+                time.sleep(0.01)
+
+        process = multiprocessing.get_context("fork").Process(target=run)
+        process.start()
+        self.assertTrue(ready.wait(10))
+        process.terminate()
+        process.join(10)
+        self.assertEqual(process.exitcode, -signal.SIGTERM)
+        self.assertEqual(len(self._read("test-sigterm")), 2000)
+
+    def test_lazy_message(self):
+        self.assertEqual(str(LazyMessage("100%", (1,))), "100% 1")
+        self.assertEqual(str(LazyMessage("%d%%", (50,))), "50%")
+        self.assertEqual(str(LazyMessage(ValueError("e"), ("x",))), "e x")
+
+
+if __name__ == "__main__":
+    unittest.main()
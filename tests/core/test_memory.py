@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from sonic_engine.core.memory import MB, MemoryTracker, MemoryWatchdog
+from sonic_engine.model.app_config import MemoryConfig
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.published = []
+
+    def publish(self, channel, data):
+        self.published.append(channel)
+        return 1
+
+
+class TestMemoryWatchdog(unittest.TestCase):
+    def setUp(self) -> None:
+        self.redis = FakeRedis()
+        self.rss = {}
+        patcher = patch(
+            "sonic_engine.core.memory.process_stats",
+            lambda pid: (self.rss[pid], 0.0),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _watchdog(self, **config):
+        return MemoryWatchdog(
+            self.redis, MemoryConfig(check_interval=0, warmup=0, **config)
+        )
+
+    def test_snapshot_at_every_growth_step(self):
+        watchdog = self._watchdog(snapshot_growth_mb=100)
+
+        for rss in (500, 550, 610, 650, 720):
+            self.rss[1] = rss * MB
+            watchdog.check({"inference-1": 1})
+
+        # baseline 500 MB, snapshots at 610 (growth 110) and 720 (growth 220)
+        self.assertEqual(self.redis.published, ["sonic:control:inference-1"] * 2)
+
+    def test_recycle_at_the_limit(self):
+        watchdog = self._watchdog(max_rss_mb=1000, recycle=True)
+
+        self.rss[1] = 900 * MB
+        self.assertEqual(watchdog.check({"inference-1": 1}), [])
+        self.rss[1] = 1000 * MB
+        self.assertEqual(watchdog.check({"inference-1": 1}), ["inference-1"])
+
+    def test_no_recycle_when_disabled(self):
+        watchdog = self._watchdog(max_rss_mb=1000)
+
+        self.rss[1] = 2000 * MB
+
+        self.assertEqual(watchdog.check({"inference-1": 1}), [])
+
+    def test_new_process_gets_a_new_baseline(self):
+        watchdog = self._watchdog(snapshot_growth_mb=100)
+
+        self.rss[1] = 500 * MB
+        watchdog.check({"inference-1": 1})
+        self.rss[2] = 700 * MB
+        watchdog.check({"inference-1": 2})
+
+        self.assertEqual(self.redis.published, [])
+
+
+class TestMemoryTracker(unittest.TestCase):
+    def test_diff_reports_growing_sites(self):
+        tracker = MemoryTracker(frames=1)
+        with tempfile.TemporaryDirectory() as log_dir:
+            try:
+                self.assertIsNone(tracker.snapshot("inference-1", log_dir))
+                leak = [bytearray(1024) for _ in range(1000)]
+                path = tracker.snapshot("inference-1", log_dir)
+            finally:
+                tracker.stop()
+
+            with open(path) as f:
+                report = f.read()
+        self.assertTrue(leak)
+        self.assertIn(os.path.basename(__file__), report.splitlines()[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
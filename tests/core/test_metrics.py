@@ -0,0 +1,89 @@
+import json
+import unittest
+from sonic_engine.core.metrics import (
+    METRICS_KEY,
+    MetricsExporter,
+    MetricsRegistry,
+    collect,
+    process_stats,
+    render,
+)
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.hashes = {}
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key] = value
+
+    def hgetall(self, name):
+        return self.hashes.get(name, {})
+
+
+class TestMetrics(unittest.TestCase):
+    def test_same_labels_return_the_same_metric(self):
+        registry = MetricsRegistry()
+
+        counter = registry.counter("messages_total", "Messages", channel="flows")
+
+        self.assertIs(counter, registry.counter("messages_total", channel="flows"))
+        self.assertIsNot(counter, registry.counter("messages_total", channel="alerts"))
+        with self.assertRaises(ValueError):
+            registry.gauge("messages_total")
+
+    def test_render_counters_and_gauges(self):
+        registry = MetricsRegistry()
+        registry.counter("messages_total", "Messages", channel="flows").inc(3)
+        registry.gauge("queue_depth", "Queue depth").set(7)
+
+        text = render([registry.snapshot(instance="a")])
+
+        self.assertIn("# TYPE messages_total counter", text)
+        self.assertIn('messages_total{instance="a",channel="flows"} 3.0', text)
+        self.assertIn('queue_depth{instance="a"} 7', text)
+
+    def test_render_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+
+        lines = render([registry.snapshot()]).splitlines()
+
+        self.assertIn('latency_seconds_bucket{le="0.1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 3', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn("latency_seconds_sum 2.65", lines)
+        self.assertIn("latency_seconds_count 4", lines)
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter("errors_total", path='a"b\\c').inc()
+
+        self.assertIn('errors_total{path="a\\"b\\\\c"} 1.0', render([registry.snapshot()]))
+
+    def test_exported_snapshots_are_merged(self):
+        redis = FakeRedis()
+        for instance_id in ("a", "b"):
+            registry = MetricsRegistry()
+            registry.counter("messages_total", "Messages").inc()
+            MetricsExporter(redis, instance_id, registry).export()
+        redis.hashes[METRICS_KEY]["dead"] = json.dumps({"time": 0, "metrics": {}})
+
+        text = render(collect(redis))
+
+        self.assertEqual(text.count("# TYPE messages_total counter"), 1)
+        self.assertIn('messages_total{instance="a"} 1.0', text)
+        self.assertIn('messages_total{instance="b"} 1.0', text)
+        self.assertIn('sonic_process_resident_memory_bytes{instance="a"}', text)
+
+    def test_process_stats(self):
+        rss, cpu = process_stats()
+
+        self.assertGreater(rss, 0)
+        self.assertGreaterEqual(cpu, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
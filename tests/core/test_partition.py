@@ -0,0 +1,58 @@
+import unittest
+from sonic_engine.core.partition import (
+    HashRing,
+    partition_channel,
+    partition_of,
+    stable_hash,
+)
+
+PARTITIONS = 64
+REPLICAS = ["aggregator", "aggregator_2", "aggregator_3"]
+
+
+class TestPartition(unittest.TestCase):
+    def test_stable_hash_is_deterministic(self):
+        flow = ("10.0.0.1", "10.0.0.2", 443, 51000, "tcp")
+
+        self.assertEqual(stable_hash(flow), stable_hash(flow))
+        self.assertEqual(stable_hash("flow"), stable_hash(b"flow"))
+
+    def test_partition_of_is_in_range(self):
+        partitions = {partition_of(i, PARTITIONS) for i in range(1000)}
+
+        self.assertTrue(partitions.issubset(range(PARTITIONS)))
+        self.assertGreater(len(partitions), PARTITIONS // 2)
+
+    def test_partition_channel(self):
+        self.assertEqual(partition_channel("flows", 3), "flows:3")
+
+
+class TestHashRing(unittest.TestCase):
+    def test_every_partition_has_one_owner(self):
+        ring = HashRing(REPLICAS)
+
+        owned = [ring.owned(replica, "flows", PARTITIONS) for replica in REPLICAS]
+
+        self.assertEqual(sorted(sum(owned, [])), list(range(PARTITIONS)))
+        for partitions in owned:
+            self.assertGreater(len(partitions), 0)
+
+    def test_assignments_are_stable(self):
+        self.assertEqual(
+            HashRing(REPLICAS).assignments("flows", PARTITIONS),
+            HashRing(list(reversed(REPLICAS))).assignments("flows", PARTITIONS),
+        )
+
+    def test_adding_a_replica_moves_few_partitions(self):
+        before = HashRing(REPLICAS).assignments("flows", PARTITIONS)
+        after = HashRing(REPLICAS + ["aggregator_4"]).assignments("flows", PARTITIONS)
+
+        moved = [p for p in range(PARTITIONS) if before[p] != after[p]]
+
+        # only partitions taken by the new replica move
+        self.assertTrue(all(after[p] == "aggregator_4" for p in moved))
+        self.assertLess(len(moved), PARTITIONS // 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import os
+import pstats
+import tempfile
+import threading
+import unittest
+from time import monotonic, sleep
+from sonic_engine.core.control import COMMANDS, dispatch
+from sonic_engine.core.profiling import Profiler, sample_stacks
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_sample_stacks(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+        thread.start()
+        try:
+            stacks = sample_stacks(0.1, interval=0.001)
+        finally:
+            stop.set()
+            thread.join()
+
+        busy = [stack for stack in stacks if stack.startswith("busy;")]
+        self.assertTrue(busy)
+        self.assertTrue(all("busy_loop (test_profiling.py:" in stack for stack in busy))
+
+    def test_cprofile_runs_in_the_polling_thread(self):
+        profiler = Profiler()
+        path = profiler.start("inference-1", self.dir.name, "cprofile", seconds=0.05)
+
+        deadline = monotonic() + 5
+        while profiler.armed and monotonic() < deadline:
+            profiler.poll()
+            sum(range(100))
+
+        self.assertFalse(profiler.armed)
+        self.assertTrue(os.path.basename(path).startswith("inference-1-profile-"))
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        self.assertIn("<built-in method builtins.sum>", functions)
+
+    def test_sample_mode_writes_collapsed_stacks(self):
+        path = Profiler().start("feature-1", self.dir.name, seconds=0.05)
+
+        deadline = monotonic() + 5
+        while not os.path.exists(path) and monotonic() < deadline:
+            sleep(0.01)
+
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+
+    def test_dispatch_passes_the_context(self):
+        received = []
+        COMMANDS["test"] = lambda **args: received.append(args)
+        try:
+            dispatch(json.dumps({"command": "test", "args": {"n": 1}}), {"id": "a"})
+            dispatch(b"not json", {"id": "a"})
+            dispatch(json.dumps({"command": "unknown"}), {"id": "a"})
+        finally:
+            del COMMANDS["test"]
+
+        self.assertEqual(received, [{"id": "a", "n": 1}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from sonic_engine.core.recorder import Recorder, Replayer, Segment, SegmentWriter
+
+
+class FakePipeline:
+    def __init__(self, redis) -> None:
+        self.redis = redis
+        self.pending = []
+
+    def publish(self, channel, data):
+        self.pending.append((channel, data))
+
+    def execute(self):
+        self.redis.published += self.pending
+        self.redis.executions += 1
+        self.pending = []
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.published = []
+        self.executions = 0
+
+    def publish(self, channel, data):
+        self.published.append((channel, data))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+MESSAGES = [
+    (10.0, b"flows:0", b"a"),
+    (10.5, b"alerts", b"b"),
+    (11.0, b"flows:1", b"c" * 1000),
+    (12.0, b"flows:0", b""),
+]
+
+
+class TestRecorder(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "000000000010000.seg")
+        writer = SegmentWriter(self.path)
+        for message in MESSAGES:
+            writer.append(*message)
+        writer.close()
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def _records(self, **filters):
+        with Segment(self.path) as segment:
+            return [(t, c, bytes(d)) for t, c, d in segment.records(**filters)]
+
+    def test_records(self):
+        self.assertEqual(self._records(), MESSAGES)
+
+    def test_channel_patterns(self):
+        self.assertEqual(self._records(channels=["flows*"]), MESSAGES[:1] + MESSAGES[2:])
+
+    def test_time_range(self):
+        self.assertEqual(self._records(start=10.2, end=11.0), MESSAGES[1:3])
+        self.assertEqual(self._records(start=13), [])
+
+    def test_truncated_record_is_skipped(self):
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+
+        self.assertEqual(self._records(), MESSAGES[:3])
+
+    def test_unindexed_tail_is_read(self):
+        os.remove(self.path[:-4] + ".idx")
+
+        self.assertEqual(self._records(), MESSAGES)
+        self.assertEqual(self._records(start=11.0), MESSAGES)
+
+    def test_messages_fixture(self):
+        with Segment(self.path) as segment:
+            messages = list(segment.messages(channels=["alerts"]))
+
+        self.assertEqual(messages[0]["channel"], b"alerts")
+        self.assertEqual(messages[0]["data"], b"b")
+        self.assertEqual(messages[0]["received_at"], 10.5)
+
+    def test_recorder_rotates_segments(self):
+        recordings = os.path.join(self.dir.name, "recordings")
+        recorder = Recorder(None, ["flows*"], recordings, segment_bytes=1)
+        recorder.record(1.0, b"flows:0", "x")
+        recorder.record(2.0, b"flows:0", 3)
+        recorder._writer.close()
+
+        self.assertEqual(len(os.listdir(recordings)), 4)
+
+    def test_replay_max_speed(self):
+        redis = FakeRedis()
+
+        stats = Replayer(redis, [self.dir.name], speed=0, pipeline_size=3).run()
+
+        self.assertEqual(redis.published, [(c, d) for _, c, d in MESSAGES])
+        self.assertEqual(redis.executions, 2)
+        self.assertEqual(stats["messages"], 4)
+        self.assertEqual(stats["bytes"], 1002)
+
+    def test_replay_scaled_pace(self):
+        redis = FakeRedis()
+
+        stats = Replayer(redis, [self.path], speed=100).run()
+
+        self.assertEqual(len(redis.published), 4)
+        self.assertGreaterEqual(stats["elapsed"], 0.019)
+
+
+if __name__ == "__main__":
+    unittest.main()
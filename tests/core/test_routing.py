@@ -0,0 +1,73 @@
+import unittest
+from time import time
+from sonic_engine.core.routing import LeastLoadedRouter, load_key, replica_channel
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key.encode()] = value
+
+    def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+
+class TestLeastLoadedRouter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.redis = FakeRedis()
+        self.router = LeastLoadedRouter(self.redis, "flows", refresh_interval=0)
+
+    def _report(self, replica, queue_length, reported_at=None):
+        reported_at = time() if reported_at is None else reported_at
+        self.redis.hset(
+            load_key("flows"), replica, f"{queue_length} {reported_at}".encode()
+        )
+
+    def test_no_replica(self):
+        self.assertIsNone(self.router.pick())
+
+    def test_picks_shortest_queue(self):
+        self._report("inference", 10)
+        self._report("inference_2", 2)
+
+        self.assertEqual(self.router.pick(), "inference_2")
+
+    def test_spreads_messages_between_reports(self):
+        reported_at = time()
+        self._report("inference", 0, reported_at)
+        self._report("inference_2", 0, reported_at)
+
+        picks = [self.router.pick() for _ in range(10)]
+
+        self.assertEqual(picks.count("inference"), 5)
+        self.assertEqual(picks.count("inference_2"), 5)
+
+    def test_stalled_replica_is_dropped(self):
+        self._report("inference", 0, time() - 10)
+        self._report("inference_2", 50)
+
+        self.assertEqual(self.router.pick(), "inference_2")
+
+    def test_frozen_replica_strands_bounded_messages(self):
+        router = LeastLoadedRouter(
+            self.redis, "flows", refresh_interval=0, max_in_flight=5
+        )
+        # a frozen replica keeps its last report of an empty queue
+        self._report("inference", 0)
+
+        picks = []
+        for i in range(20):
+            # a busy replica keeps reporting
+            self._report("inference_2", 10, time() + i * 1e-3)
+            picks.append(router.pick())
+
+        self.assertEqual(picks.count("inference"), 5)
+
+    def test_replica_channel(self):
+        self.assertEqual(replica_channel("flows", "inference"), "flows@inference")
+
+
+if __name__ == "__main__":
+    unittest.main()
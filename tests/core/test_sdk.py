@@ -0,0 +1,257 @@
+import os
+import time
+import unittest
+from bisect import bisect_left
+from multiprocessing import Pipe
+from threading import Thread
+from sonic_engine.core.broker import local_broker
+from sonic_engine.core.database import Database, bind_thread_database
+from sonic_engine.core.metrics import REGISTRY
+from sonic_engine.core.sdk import Extension
+from sonic_engine.core.tracing import TracedPayload
+from sonic_engine.model.app_config import ExtensionGlobalConfig
+
+
+class Increment(Extension):
+    timeout = 0.05
+
+    def setup(self):
+        self.handled = []
+        self.closed = False
+        # the channels are registered first
+        self.subscribed = list(self.db.subscriptions)
+
+    def teardown(self):
+        self.closed = True
+
+    def on_message(self, message):
+        if message["data"] == "bad":
+            raise ValueError("bad message")
+        self.handled.append(message["data"])
+        return message["data"] + 1
+
+
+class BatchIncrement(Increment):
+    batch_size = 4
+
+    def on_messages(self, messages):
+        self.batches = getattr(self, "batches", []) + [len(messages)]
+        return [message["data"] + 1 for message in messages]
+
+
+class SlowBatchIncrement(BatchIncrement):
+    def on_messages(self, messages):
+        time.sleep(0.01 * len(messages))
+        return super().on_messages(messages)
+
+
+class Scale(Increment):
+    workers = 2
+    chunk_size = 4
+
+    def setup(self):
+        super().setup()
+        # loaded before the workers are forked
+        self.factor = 3
+        # the workers are forked before the background threads start
+        self.background = self.db.exporter is not None
+
+    def work(self, data):
+        if data == "bad":
+            raise ValueError("bad payload")
+        return (os.getpid(), data * self.factor)
+
+
+class KeyedIncrement(Increment):
+    def key_of(self, result):
+        return result % 2
+
+
+class BrokenSetup(Increment):
+    def setup(self):
+        super().setup()
+        raise RuntimeError("missing model")
+
+
+class UnorderedScale(Scale):
+    workers = 0
+    ordered = False
+
+
+class TestExtension(unittest.TestCase):
+    def setUp(self) -> None:
+        # a broker per test
+        self.url = "memory://" + self.id().rsplit(".", 1)[-1]
+        self.broker = local_broker(self.url[len("memory://") :])
+        self.out = self.broker.pubsub(ignore_subscribe_messages=True)
+        self.out.subscribe("out")
+
+    def _start(
+        self, extension_class, workers: int = None, partitions: dict = None
+    ) -> Extension:
+        parent_pipe, child_pipe = Pipe()
+        extension = extension_class(parent_pipe)
+        config = ExtensionGlobalConfig(
+            id="increment",
+            name="increment",
+            channels={
+                "subscribe": ["in"],
+                "publish": ["out"],
+                "partitions": partitions,
+            },
+            workers=workers,
+        )
+        child_pipe.send({"config": config, "message": "Loaded increment"})
+
+        def run():
+            bind_thread_database(Database(self.url, flush=False))
+            extension.run()
+
+        self.thread = Thread(target=run, daemon=True)
+        self.thread.start()
+        for _ in range(500):
+            if self.broker.pubsub_numsub("in")[0][1]:
+                return extension
+            self.out.get_message(timeout=0.01)
+        self.fail("timed out")
+
+    def _stop(self, extension: Extension) -> None:
+        extension.stop()
+        self.thread.join(1)
+        self.assertFalse(self.thread.is_alive())
+        self.assertTrue(extension.closed)
+        self.assertEqual(self.broker.pubsub_numsub("in")[0][1], 0)
+
+    def _received(self, count: int):
+        return [self.out.get_message(timeout=1)["data"] for _ in range(count)]
+
+    def test_handler_errors_are_isolated(self):
+        errors = REGISTRY.counter("sonic_handler_errors_total")
+        before = errors.value
+        extension = self._start(Increment)
+        for data in (1, "bad", 2):
+            self.broker.publish("in", data)
+        self.assertEqual(self._received(2), [2, 3])
+        self.assertEqual(extension.handled, [1, 2])
+        self.assertEqual(extension.subscribed, [b"in"])
+        self.assertEqual(errors.value, before + 1)
+        self._stop(extension)
+
+    def test_partitioned_results_need_a_key(self):
+        parent_pipe, child_pipe = Pipe()
+        config = ExtensionGlobalConfig(
+            id="increment",
+            name="increment",
+            channels={"publish": ["out"], "partitions": {"out": 2}},
+        )
+        child_pipe.send({"config": config, "message": "Loaded increment"})
+        self.assertRaisesRegex(ValueError, "key_of", Increment(parent_pipe).run)
+
+        partitions = self.broker.pubsub(ignore_subscribe_messages=True)
+        partitions.psubscribe("out:*")
+        extension = self._start(KeyedIncrement, partitions={"out": 2})
+        for data in range(4):
+            self.broker.publish("in", data)
+        received = [partitions.get_message(timeout=1) for _ in range(4)]
+        channels = {message["data"]: message["channel"] for message in received}
+        self.assertEqual(channels[1], channels[3])
+        self.assertEqual(channels[2], channels[4])
+        self.assertNotEqual(channels[1], channels[2])
+        self._stop(extension)
+
+    def test_setup_failure_closes_the_database(self):
+        parent_pipe, child_pipe = Pipe()
+        extension = BrokenSetup(parent_pipe)
+        config = ExtensionGlobalConfig(
+            id="broken", name="broken", channels={"subscribe": ["in"]}
+        )
+        child_pipe.send({"config": config, "message": "Loaded broken"})
+        db = Database(self.url, flush=False)
+        bind_thread_database(db)
+        self.addCleanup(bind_thread_database, None)
+        self.assertRaises(RuntimeError, extension.run)
+        self.assertTrue(extension.closed)
+        self.assertEqual(db.pubsubs, [])
+        # the background threads were not started
+        self.assertIsNone(db.exporter)
+        self.assertIsNone(db.control)
+        self.assertEqual(self.broker.pubsub_numsub("in")[0][1], 0)
+
+    def test_batches(self):
+        extension = self._start(BatchIncrement)
+        for data in range(10):
+            self.broker.publish("in", data)
+        self.assertEqual(self._received(10), list(range(1, 11)))
+        self.assertEqual(sum(extension.batches), 10)
+        self.assertLessEqual(max(extension.batches), 4)
+
+        # a lone message is handled without waiting for a full batch
+        self.broker.publish("in", 10)
+        self.assertEqual(self._received(1), [11])
+        self.assertEqual(extension.batches[-1], 1)
+        self._stop(extension)
+
+    def test_batches_are_timed_and_traced_per_message(self):
+        seconds = REGISTRY.histogram("sonic_handler_seconds", channel="in")
+        fast = bisect_left(seconds.buckets, 0.005)
+        before = sum(seconds.counts), sum(seconds.counts[:fast])
+        extension = self._start(SlowBatchIncrement)
+        for data in range(8):
+            context = {"id": str(data), "origin": 0.0, "path": ["feature"], "sent": 0.0}
+            self.broker.publish("in", TracedPayload(context, data) if data % 2 else data)
+        for data, payload in enumerate(self._received(8)):
+            if data % 2:
+                self.assertEqual(payload.context["id"], str(data))
+                self.assertEqual(payload.data, data + 1)
+            else:
+                self.assertEqual(payload, data + 1)
+        self._stop(extension)
+        # every message of a batch accounts for its share of the batch
+        self.assertEqual(sum(seconds.counts) - before[0], 8)
+        self.assertEqual(sum(seconds.counts[:fast]) - before[1], 0)
+
+    def test_workers(self):
+        errors = REGISTRY.counter("sonic_handler_errors_total")
+        before = errors.value
+        extension = self._start(Scale)
+        for data in [*range(20), "bad", 20]:
+            self.broker.publish("in", data)
+        received = self._received(21)
+        self.assertEqual([data for _, data in received], [i * 3 for i in range(21)])
+        self.assertNotIn(os.getpid(), {pid for pid, _ in received})
+        self.assertEqual(errors.value, before + 1)
+        self.assertFalse(extension.background)
+        self.assertIsNotNone(extension.db.exporter)
+        pool = extension.pool
+        self._stop(extension)
+        # the workers are stopped with the instance
+        self.assertRaises(ValueError, pool.apply, os.getpid)
+
+    def test_workers_results_continue_their_trace(self):
+        extension = self._start(Scale)
+        for data in range(20):
+            if data % 3:
+                self.broker.publish("in", data)
+                continue
+            context = {"id": str(data), "origin": 0.0, "path": ["feature"], "sent": 0.0}
+            self.broker.publish("in", TracedPayload(context, data))
+        for data, payload in enumerate(self._received(20)):
+            if data % 3:
+                self.assertNotIsInstance(payload, TracedPayload)
+                continue
+            self.assertEqual(payload.context["id"], str(data))
+            self.assertEqual(payload.context["path"], ["feature", "increment"])
+            self.assertEqual(payload.data[1], data * 3)
+        self._stop(extension)
+
+    def test_unordered_workers_from_config(self):
+        extension = self._start(UnorderedScale, workers=2)
+        for data in range(50):
+            self.broker.publish("in", data)
+        received = self._received(50)
+        self.assertEqual(sorted(data for _, data in received), list(range(0, 150, 3)))
+        self._stop(extension)
+
+
+if __name__ == "__main__":
+    unittest.main()
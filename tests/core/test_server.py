@@ -0,0 +1,111 @@
+import http.client
+import json
+import unittest
+from types import SimpleNamespace
+from sonic_engine.core.server import ControlPlane, stream_event
+from sonic_engine.core.tracing import wrap
+
+
+class FakeEngine:
+    def __init__(self, cluster: bool = False) -> None:
+        self.cluster = cluster
+        self.config = SimpleNamespace(metadata=SimpleNamespace(ingest=None))
+        self.running = {"feature": True, "inference": False}
+
+    def _check_standalone(self):
+        if self.cluster:
+            raise RuntimeError("Instances are managed by the cluster leases")
+
+    def status(self):
+        return {"mode": "standalone", "running": sum(self.running.values())}
+
+    def instances(self):
+        return [{"id": id, "running": running} for id, running in self.running.items()]
+
+    def start_instance(self, instance_id):
+        self._check_standalone()
+        changed = not self.running[instance_id]
+        self.running[instance_id] = True
+        return changed
+
+    def scale(self, extension_id, replicas):
+        self._check_standalone()
+        if replicas < 1:
+            raise ValueError("An extension needs at least one instance")
+        return [extension_id] + [f"{extension_id}-{n}" for n in range(1, replicas)]
+
+
+class TestControlPlane(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = FakeEngine()
+        self.control_plane = ControlPlane(self.engine, port=0)
+        self.control_plane.start()
+        self.connection = http.client.HTTPConnection("127.0.0.1", self.control_plane.port)
+
+    def tearDown(self) -> None:
+        self.connection.close()
+        self.control_plane.stop()
+
+    def request(self, method, path):
+        self.connection.request(method, path)
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_requests_share_the_connection(self):
+        self.assertEqual(self.request("GET", "/status"), (200, {"mode": "standalone", "running": 1}))
+        self.assertEqual(self.request("POST", "/instances/inference/start")[1]["changed"], True)
+        status, instances = self.request("GET", "/instances")
+        self.assertEqual(status, 200)
+        self.assertTrue(all(instance["running"] for instance in instances))
+
+    def test_errors(self):
+        self.assertEqual(self.request("GET", "/unknown")[0], 404)
+        self.assertEqual(self.request("GET", "/instances/feature/start")[0], 405)
+        self.assertEqual(self.request("POST", "/instances/missing/start")[0], 404)
+        self.assertEqual(self.request("POST", "/extensions/feature/scale?replicas=0")[0], 400)
+
+    def test_dump_stays_in_the_flight_folder(self):
+        for channel in ("..", "..%2Fetc", "a%2Fb"):
+            status, body = self.request("POST", f"/channels/{channel}/dump")
+            self.assertEqual(status, 400)
+            self.assertIn("Invalid channel name", body["error"])
+
+    def test_scale(self):
+        status, body = self.request("POST", "/extensions/feature/scale?replicas=3")
+        self.assertEqual(status, 200)
+        self.assertEqual(body["instances"], ["feature", "feature-1", "feature-2"])
+
+        self.engine.cluster = True
+        self.assertEqual(self.request("POST", "/extensions/feature/scale?replicas=2")[0], 409)
+
+    def test_home_is_text(self):
+        self.connection.request("GET", "/")
+        response = self.connection.getresponse()
+        self.assertTrue(response.getheader("Content-Type").startswith("text/plain"))
+        self.assertIn(b"/channels/<channel>/stream", response.read())
+
+
+class TestStreamEvent(unittest.TestCase):
+    def parse(self, event):
+        self.assertTrue(event.startswith(b"data: ") and event.endswith(b"\n\n"))
+        return json.loads(event[6:])
+
+    def test_payloads(self):
+        text = self.parse(stream_event({"channel": b"alerts", "data": b"hello"}))
+        self.assertEqual(text, {"channel": "alerts", "data": "hello"})
+
+        binary = self.parse(stream_event({"channel": b"alerts", "data": b"\xff\x00"}))
+        self.assertEqual(binary["base64"], "/wA=")
+
+        context = {"id": "1", "origin": 0.0, "path": ["feature"], "sent": 0.0}
+        traced = self.parse(stream_event({"channel": b"alerts", "data": wrap(context, "hi")}))
+        self.assertEqual(traced["trace"]["path"], ["feature"])
+        self.assertEqual(traced["data"], "hi")
+
+        # the payloads of the in-process broker are Python objects
+        objects = self.parse(stream_event({"channel": "alerts", "data": {"flows": {1, 2}}}))
+        self.assertEqual(objects["data"], {"flows": "{1, 2}"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import os
+import struct
+import tempfile
+import unittest
+from sonic_engine.core.source import (
+    FileSource,
+    LiveInterfaceSource,
+    PcapReplaySource,
+    guess_framing,
+    interface_source,
+)
+from sonic_engine.model.extension import Input, Replay
+
+PACKETS = [b"\x01" * 60, b"\x02" * 1514, b"\x03" * 42]
+
+
+def pcap_bytes(packets):
+    data = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+    for i, packet in enumerate(packets):
+        data += struct.pack("<IIII", 1000 + i, 500, len(packet), len(packet))
+        data += packet
+    return data
+
+
+def pcapng_block(block_type, body):
+    length = 12 + len(body) + (-len(body)) % 4
+    body += b"\x00" * ((-len(body)) % 4)
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+
+def pcapng_bytes(packets):
+    data = pcapng_block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    # interface with a nanosecond resolution (if_tsresol = 9)
+    options = struct.pack("<HHB3x", 9, 1, 9) + struct.pack("<HH", 0, 0)
+    data += pcapng_block(1, struct.pack("<HHI", 1, 0, 65535) + options)
+    for i, packet in enumerate(packets):
+        timestamp = (1000 + i) * 10**9
+        header = struct.pack(
+            "<IIIII",
+            0,
+            timestamp >> 32,
+            timestamp & 0xFFFFFFFF,
+            len(packet),
+            len(packet),
+        )
+        data += pcapng_block(6, header + packet)
+    return data
+
+
+class TestFileSource(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def _write(self, name, data):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def _records(self, source):
+        return [bytes(record) for batch in source for record in batch]
+
+    def test_guess_framing(self):
+        self.assertEqual(guess_framing("capture.pcap"), "pcap")
+        self.assertEqual(guess_framing("capture.PCAPNG"), "pcapng")
+        self.assertEqual(guess_framing("flows.csv"), "lines")
+
+    def test_lines(self):
+        path = self._write("flows.csv", b"a,1\nb,2\n\nc,3")
+
+        records = self._records(FileSource([path], batch_size=2))
+
+        self.assertEqual(records, [b"a,1", b"b,2", b"", b"c,3"])
+
+    def test_batches_are_memoryviews(self):
+        path = self._write("flows.csv", b"a\nb\nc\n")
+
+        batches = list(FileSource([path], batch_size=2))
+
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+        self.assertIsInstance(batches[0][0], memoryview)
+
+    def test_pcap(self):
+        path = self._write("capture.pcap", pcap_bytes(PACKETS))
+
+        self.assertEqual(self._records(FileSource([path])), PACKETS)
+
+    def test_pcap_truncated_record_is_skipped(self):
+        path = self._write("capture.pcap", pcap_bytes(PACKETS)[:-10])
+
+        self.assertEqual(self._records(FileSource([path])), PACKETS[:2])
+
+    def test_pcapng(self):
+        path = self._write("capture.pcapng", pcapng_bytes(PACKETS))
+
+        self.assertEqual(self._records(FileSource([path])), PACKETS)
+
+    def test_resume_from_checkpoint(self):
+        path = self._write("capture.pcap", pcap_bytes(PACKETS))
+        source = FileSource([path], batch_size=1)
+        for _ in source:
+            checkpoint = source.checkpoint()
+            break
+
+        records = self._records(FileSource([path], checkpoint=checkpoint))
+
+        self.assertEqual(records, PACKETS[1:])
+
+    def test_multiple_files(self):
+        lines = self._write("flows.csv", b"a\nb\n")
+        capture = self._write("capture.pcapng", pcapng_bytes(PACKETS))
+        empty = self._write("empty.csv", b"")
+
+        source = FileSource.from_input(Input(files=[lines, empty, capture]))
+
+        self.assertEqual(self._records(source), [b"a", b"b"] + PACKETS)
+        self.assertEqual(source.checkpoint()[lines], 4)
+
+    def test_unknown_framing(self):
+        with self.assertRaises(ValueError):
+            FileSource([], framing="json")
+
+
+class TestPcapReplaySource(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "capture.pcap")
+        with open(self.path, "wb") as f:
+            f.write(pcap_bytes(PACKETS))
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_max_speed_with_loops(self):
+        source = PcapReplaySource(self.path, speed=0, loop=3)
+
+        records = [bytes(record) for batch in source for record in batch]
+
+        self.assertEqual(records, PACKETS * 3)
+        stats = source.stats()
+        self.assertEqual(stats["packets"], 9)
+        self.assertEqual(stats["loops"], 3)
+        self.assertEqual(stats["dropped"], 0)
+        self.assertEqual(stats["bytes"], 3 * sum(len(packet) for packet in PACKETS))
+
+    def test_original_timing_is_scaled(self):
+        # packets are one second apart, replayed 100 times faster
+        source = PcapReplaySource(self.path, speed=100)
+
+        records = [record for batch in source for record in batch]
+
+        self.assertEqual(len(records), 3)
+        self.assertGreaterEqual(source.stats()["elapsed"], 0.018)
+
+    def test_interface_source(self):
+        replay = interface_source(Input(replay=Replay(file=self.path, speed=0)))
+        live = interface_source(Input(interfaces=["eth0"]))
+
+        self.assertIsInstance(replay, PcapReplaySource)
+        self.assertEqual(replay.speed, 0)
+        self.assertIsInstance(live, LiveInterfaceSource)
+
+
+if __name__ == "__main__":
+    unittest.main()
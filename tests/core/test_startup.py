@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import unittest
+from sonic_engine.util.startup import ENGINE_MODULE, measure, parse_importtime, slowest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+IMPORT_BUDGET_ENV = "SONIC_IMPORT_BUDGET"
+"Seconds allowed to import the engine, the timing is only checked if set (e.g. 0.25 on a quiet machine)"
+
+HEAVY_MODULES = ["yapsy", "redis", "numpy", "yaml", "sonic_engine.core.database"]
+
+
+class TestStartup(unittest.TestCase):
+    def test_parse_importtime(self):
+        output = "\n".join(
+            [
+                "import time: self [us] | cumulative | imported package",
+                "import time:       120 |        120 |   sonic_engine.model",
+                "import time:      2500 |       2620 | sonic_engine.core.engine",
+                "0.01",
+            ]
+        )
+        imports = parse_importtime(output)
+        self.assertEqual(
+            [(i.module, i.depth) for i in imports],
+            [("sonic_engine.model", 1), ("sonic_engine.core.engine", 0)],
+        )
+        self.assertEqual(slowest(imports, 1)[0].cumulative_us, 2620)
+
+    def test_engine_import_time(self):
+        elapsed, imports = measure(f"import {ENGINE_MODULE}", cwd=ROOT)
+        self.assertIn(ENGINE_MODULE, [i.module for i in imports])
+        budget = os.environ.get(IMPORT_BUDGET_ENV)
+        if not budget:
+            return
+        # the fastest of a few cold imports, a loaded machine slows some of them down
+        for _ in range(2):
+            elapsed = min(elapsed, measure(f"import {ENGINE_MODULE}", cwd=ROOT)[0])
+        self.assertLess(elapsed, float(budget))
+
+    def test_engine_import_is_light(self):
+        code = (
+            f"import sys, {ENGINE_MODULE}, sonic_engine.core.server\n"
+            f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT
+        )
+        self.assertEqual(output.returncode, 0, output.stderr)
+        self.assertEqual(output.stdout.strip(), "[]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from sonic_engine.core.broker import local_broker
+from sonic_engine.core.database import REDIS_URL_ENV
+from sonic_engine.core.metrics import collect, render
+from sonic_engine.core.threads import ThreadHandler
+from sonic_engine.model.app_config import ExtensionGlobalConfig
+
+ECHO = """
+from yapsy.IMultiprocessPlugin import IMultiprocessPlugin
+from sonic_engine.core.database import __db__
+
+
+class Echo(IMultiprocessPlugin):
+    def run(self):
+        config = self.parent_pipe.recv()["config"]
+        __db__.register_extension(config)
+        if config.options.get("fail"):
+            raise RuntimeError("failed")
+        for message in __db__.get_message(timeout=0.05):
+            if message["type"] == "message":
+                __db__.publish("out", (config.id, message["data"]))
+"""
+
+
+class TestThreadHandler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        # a broker per test
+        name = self.id().rsplit(".", 1)[-1]
+        url = patch.dict(os.environ, {REDIS_URL_ENV: f"memory://{name}"})
+        url.start()
+        self.addCleanup(url.stop)
+        self.broker = local_broker(name)
+
+    def _instance(self, id: str, **options) -> ExtensionGlobalConfig:
+        path = os.path.join(self.dir.name, id)
+        os.makedirs(path)
+        with open(os.path.join(path, "__init__.py"), "w") as f:
+            f.write("from .main import *\n")
+        with open(os.path.join(path, "main.py"), "w") as f:
+            f.write(ECHO)
+        return ExtensionGlobalConfig(
+            id=id, name=id, path=path, channels={"subscribe": ["in"]}, options=options
+        )
+
+    def _wait(self, condition) -> None:
+        for _ in range(500):
+            if condition():
+                return
+            self.broker.pubsub().get_message(timeout=0.01)
+        self.fail("timed out")
+
+    def test_instances_share_the_broker(self):
+        handler = ThreadHandler(
+            "extensions", [self._instance("echo-1"), self._instance("echo-2")]
+        )
+        out = self.broker.pubsub(ignore_subscribe_messages=True)
+        out.subscribe("out")
+        handler.runAll()
+        self._wait(lambda: self.broker.pubsub_numsub("in")[0][1] == 2)
+        self.assertEqual(handler.countAlive(), 2)
+        self.assertEqual(handler.pids(), {"echo-1": os.getpid(), "echo-2": os.getpid()})
+
+        record = {"flow": 1}
+        self.broker.publish("in", record)
+        received = [out.get_message(timeout=1)["data"] for _ in range(2)]
+        self.assertEqual(sorted(id for id, _ in received), ["echo-1", "echo-2"])
+        # every instance has its own database, the record is passed by reference
+        self.assertTrue(all(data is record for _, data in received))
+
+        handler.killAll()
+        self.assertEqual(handler.countAlive(), 0)
+        for thread in handler.threads.values():
+            thread.join(1)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(handler.crashed(), [])
+
+    def test_metrics_per_instance(self):
+        handler = ThreadHandler(
+            "extensions", [self._instance("echo-1"), self._instance("echo-2")]
+        )
+        out = self.broker.pubsub(ignore_subscribe_messages=True)
+        out.subscribe("out")
+        handler.runAll()
+        self._wait(lambda: self.broker.pubsub_numsub("in")[0][1] == 2)
+        for i in range(3):
+            self.broker.publish("in", i)
+        for _ in range(6):
+            self.assertIsNotNone(out.get_message(timeout=1))
+        for thread in handler.threads.values():
+            thread.db.exporter.export()
+        handler.killAll()
+
+        metrics = render(collect(self.broker)).splitlines()
+        for id in ("echo-1", "echo-2"):
+            labels = f'{{instance="{id}",channel="in"}}'
+            self.assertIn(f"sonic_messages_received_total{labels} 3.0", metrics)
+            labels = f'{{instance="{id}",channel="out"}}'
+            self.assertIn(f"sonic_messages_published_total{labels} 3.0", metrics)
+        self.assertNotEqual(
+            handler.threads["echo-1"].db.profiler, handler.threads["echo-2"].db.profiler
+        )
+
+    def test_crashed(self):
+        handler = ThreadHandler("extensions", [self._instance("broken", fail=True)])
+        handler.runAll()
+        handler.threads["broken"].join(1)
+        self.assertEqual(handler.crashed(), ["broken"])
+        self.assertEqual(handler.countAlive(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
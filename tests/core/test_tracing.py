@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+from sonic_engine.core.metrics import MetricsRegistry, render
+from sonic_engine.core.tracing import Tracer, is_traced, unwrap, wrap
+from sonic_engine.model.extension import TracingConfig
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.registry = MetricsRegistry()
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def _tracer(self, name, sample_rate=0.0, export=False):
+        config = TracingConfig(sample_rate=sample_rate, export=export)
+        return Tracer(name, f"{name}-1", config, self.dir.name, self.registry)
+
+    def test_wrap_unwrap(self):
+        context = {"id": "t", "origin": 1.0, "path": ["feature"], "sent": 1.0}
+
+        for payload, expected in ((b"\x00raw", b"\x00raw"), ("text", b"text"), (3, b"3")):
+            data = wrap(context, payload)
+            self.assertTrue(is_traced(data))
+            self.assertEqual(unwrap(data), (context, expected))
+        self.assertFalse(is_traced(b"plain"))
+        self.assertFalse(is_traced("SCT1"))
+
+    def test_sampling(self):
+        self.assertIsNone(self._tracer("feature").start())
+        self.assertIsNotNone(self._tracer("feature", sample_rate=1).start())
+
+    def test_trace_continues_whatever_the_sampling(self):
+        origin = self._tracer("feature", sample_rate=1).start()
+
+        context = self._tracer("inference").start(origin)
+
+        self.assertEqual(context["id"], origin["id"])
+        self.assertEqual(context["origin"], origin["origin"])
+        self.assertEqual(context["path"], ["feature", "inference"])
+
+    def test_record_per_path_latency_and_export(self):
+        context = {"id": "t", "origin": 10.0, "path": ["feature", "inference"], "sent": 10.5}
+        tracer = self._tracer("reporting", export=True)
+
+        tracer.record(context, "alerts", received=10.75, dequeued=11.0, handled=11.5)
+        tracer.close()
+
+        text = render([self.registry.snapshot()])
+        self.assertIn(
+            'sonic_trace_latency_seconds_sum{path="feature>inference>reporting"} 0.75',
+            text,
+        )
+        with open(os.path.join(self.dir.name, "reporting-1-traces.jsonl")) as f:
+            span = json.loads(f.readline())
+        self.assertEqual(span["trace"], "t")
+        self.assertEqual(span["channel"], "alerts")
+        self.assertEqual(span["transit"], 0.25)
+        self.assertEqual(span["queue_wait"], 0.25)
+        self.assertEqual(span["handler"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
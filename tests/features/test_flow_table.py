@@ -0,0 +1,127 @@
+import math
+import unittest
+import numpy as np
+from sonic_engine.features.flow_table import COLUMNS, FlowTable, hash_keys
+
+
+def packets(count=2000, flows=30, duration=20.0, seed=0):
+    "Random packets ordered by time"
+    rng = np.random.default_rng(seed)
+    keys = hash_keys(rng.integers(0, flows, size=count))
+    timestamps = np.sort(rng.uniform(0, duration, size=count))
+    sizes = rng.integers(40, 1500, size=count).astype(np.float64)
+    return keys, timestamps, sizes
+
+
+def reference(keys, timestamps, sizes, window: float, slide: float):
+    """Windows computed flow by flow, as (start, end, {key: values})
+    A flow is evicted once it had no packet for a whole window of panes, its inter-arrival times restart then
+    """
+    panes = int(round(window / slide))
+    pane_ids = [math.floor(t / slide) for t in timestamps.tolist()]
+    iats = []
+    previous = {}
+    for key, timestamp, pane_id in zip(keys.tolist(), timestamps.tolist(), pane_ids):
+        last = previous.get(key)
+        evicted = last is None or pane_id - last[1] >= panes
+        iats.append(None if evicted else timestamp - last[0])
+        previous[key] = (timestamp, pane_id)
+
+    windows = []
+    for pane_id in range(pane_ids[0], pane_ids[-1] + panes):
+        first_pane = pane_id - panes + 1
+        flows = {}
+        for i, key in enumerate(keys.tolist()):
+            if first_pane <= pane_ids[i] <= pane_id:
+                flows.setdefault(key, []).append(i)
+        if not flows:
+            continue
+        rows = {}
+        for key, indices in flows.items():
+            flow_sizes = [sizes[i] for i in indices]
+            flow_times = [timestamps[i] for i in indices]
+            flow_iats = [iats[i] for i in indices if iats[i] is not None]
+            mean = float(np.mean(flow_iats)) if flow_iats else 0.0
+            rows[key] = [
+                len(indices),
+                sum(flow_sizes),
+                min(flow_sizes),
+                max(flow_sizes),
+                min(flow_times),
+                max(flow_times),
+                max(flow_times) - min(flow_times),
+                mean,
+                float(np.std(flow_iats)) if flow_iats else 0.0,
+                min(flow_iats) if flow_iats else 0.0,
+                max(flow_iats) if flow_iats else 0.0,
+            ]
+        end = (pane_id + 1) * slide
+        windows.append((end - window, end, rows))
+    return windows
+
+
+class TestFlowTable(unittest.TestCase):
+    def _run(self, table: FlowTable, keys, timestamps, sizes, batches):
+        windows = []
+        bounds = [0, *batches, len(keys)]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            batch = slice(start, end)
+            windows += table.update(keys[batch], timestamps[batch], sizes[batch])
+        return windows + table.flush()
+
+    def _assert_windows(self, windows, expected):
+        self.assertEqual(len(windows), len(expected))
+        for window, (start, end, rows) in zip(windows, expected):
+            self.assertAlmostEqual(window.start, start)
+            self.assertAlmostEqual(window.end, end)
+            self.assertEqual(window.keys.tolist(), sorted(rows))
+            self.assertEqual(window.values.shape, (len(rows), len(COLUMNS)))
+            for key, values in zip(window.keys.tolist(), window.values):
+                np.testing.assert_allclose(values, rows[key], rtol=1e-9, atol=1e-6)
+
+    def test_tumbling_windows(self):
+        keys, timestamps, sizes = packets()
+        table = FlowTable(window=2.0, capacity=4)
+        # uneven batches, one of them empty, some spanning several windows
+        windows = self._run(table, keys, timestamps, sizes, [7, 7, 300, 301, 1200])
+        self._assert_windows(windows, reference(keys, timestamps, sizes, 2.0, 2.0))
+        self.assertEqual(len(table), 0)
+
+    def test_sliding_windows(self):
+        keys, timestamps, sizes = packets(count=1500, flows=60, seed=1)
+        table = FlowTable(window=4.0, slide=1.0, capacity=8)
+        windows = self._run(table, keys, timestamps, sizes, list(range(0, 1500, 97)))
+        self._assert_windows(windows, reference(keys, timestamps, sizes, 4.0, 1.0))
+        self.assertEqual(len(table), 0)
+
+    def test_eviction(self):
+        table = FlowTable(window=2.0, slide=1.0, capacity=2)
+        a, b = hash_keys([1, 2]).tolist()
+        table.update([a, b], [0.1, 0.2], [100, 100])
+        windows = table.update([a], [1.5], [100])
+        # b has no packet in the panes of the next window, it is evicted
+        windows += table.update([a], [2.5], [100])
+        keys = [window.keys.tolist() for window in windows]
+        self.assertEqual(keys, [sorted([a, b]), sorted([a, b])])
+        self.assertEqual(len(table), 1)
+        windows = table.update([b, b], [3.1, 3.3], [100, 100])
+        self.assertEqual(windows[0].keys.tolist(), [a])
+        # the slot of b was reused
+        self.assertEqual(table.capacity, 2)
+        # b came back: its inter-arrival times restart, the packet of 0.2 is forgotten
+        windows += table.flush()
+        values = dict(zip(windows[-1].keys.tolist(), windows[-1].values.tolist()))
+        iat_mean, iat_max = COLUMNS.index("iat_mean"), COLUMNS.index("iat_max")
+        self.assertAlmostEqual(values[b][iat_mean], 0.2)
+        self.assertAlmostEqual(values[b][iat_max], 0.2)
+
+    def test_empty_batch(self):
+        table = FlowTable(window=1.0)
+        self.assertEqual(table.update([], [], []), [])
+        self.assertIsNone(table.pane_id)
+        self.assertEqual(table.advance(10.0), [])
+        self.assertEqual(table.flush(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from sonic_engine.model.app_config import ExtensionGlobalConfig, RedisConfig
+from sonic_engine.model.extension import LogConfig, TracingConfig
+from sonic_engine.util.config_cache import ConfigCache
+from sonic_engine.util.functions import EngineUtil, _merge_changes
+
+
+class TestConfigCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = ConfigCache(os.path.join(self.dir.name, "cache", "configs.pickle"))
+        self.path = os.path.join(self.dir.name, "config.yaml")
+        self._write("url: redis://localhost:6379/0\n")
+        patcher = patch("sonic_engine.util.functions.CONFIG_CACHE", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def _write(self, content):
+        with open(self.path, "w") as f:
+            f.write(content)
+
+    def test_unchanged_files_are_not_parsed(self):
+        util = EngineUtil()
+        self.assertEqual(util.load_config(RedisConfig, self.path).url, "redis://localhost:6379/0")
+        self.cache.save()
+
+        cache = ConfigCache(self.cache.path)
+        stat = ConfigCache.stat(self.path)
+        self.assertEqual(cache.get(self.path, stat), {"url": "redis://localhost:6379/0"})
+        with patch("yaml.load") as load:
+            util.load_config(RedisConfig, self.path)
+        load.assert_not_called()
+
+    def test_concurrent_saves(self):
+        stat = ConfigCache.stat(self.path)
+        other = ConfigCache(self.cache.path)
+        self.cache.put(self.path, stat, {"url": "first"})
+        other.put(self.path, stat, {"url": "second"})
+        self.cache.save()
+        other.save()
+        # the temporary files are replaced, the last writer wins
+        self.assertEqual(os.listdir(os.path.dirname(self.cache.path)), ["configs.pickle"])
+        cache = ConfigCache(self.cache.path)
+        self.assertEqual(cache.get(self.path, stat), {"url": "second"})
+
+    def test_changed_files_are_parsed_again(self):
+        util = EngineUtil()
+        util.load_config(RedisConfig, self.path)
+        self._write("url: redis://redis:6379/1\nflush: false\n")
+        config = util.load_config(RedisConfig, self.path)
+        self.assertEqual((config.url, config.flush), ("redis://redis:6379/1", False))
+
+    def test_entries_are_copies(self):
+        stat = ConfigCache.stat(self.path)
+        self.cache.put(self.path, stat, {"options": {"a": 1}})
+        self.cache.get(self.path, stat)["options"]["a"] = 2
+        self.assertEqual(self.cache.get(self.path, stat), {"options": {"a": 1}})
+
+
+class TestMergeChanges(unittest.TestCase):
+    def test_only_changed_paths_are_copied(self):
+        shared = {"level": "INFO"}
+        original = {"a": {"b": 1, "c": 2}, "log": shared, "name": "x"}
+        changes = _merge_changes(original, {"a": {"b": 3}, "log": {"level": "INFO"}, "name": None})
+
+        self.assertEqual(changes, {"a": {"b": 3, "c": 2}})
+        self.assertEqual(original["a"], {"b": 1, "c": 2})
+
+    def test_override_nested_config(self):
+        config = ExtensionGlobalConfig(id="flows", options={"window": 10, "top": 5})
+        override = ExtensionGlobalConfig(options={"window": 30}, description="Flows")
+        updated = EngineUtil.override_nested_config(config, override)
+
+        self.assertEqual(updated.options, {"window": 30, "top": 5})
+        self.assertEqual((updated.id, updated.description), ("flows", "Flows"))
+        self.assertEqual(config.options, {"window": 10, "top": 5})
+
+    def test_extension_config_sections(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "config.yaml")
+            with open(path, "w") as f:
+                f.write(
+                    "id: flows\nlog:\n  level: INFO\n  backup_count: 2\n"
+                    "tracing:\n  sample_rate: 0.5\n  export: true\n"
+                )
+            with patch("sonic_engine.util.functions.CONFIG_CACHE", ConfigCache(None)):
+                config = EngineUtil().load_config(
+                    ExtensionGlobalConfig, path, ExtensionGlobalConfig(id="flows-2")
+                )
+        config.set_defaults()
+        self.assertEqual(config.id, "flows-2")
+        self.assertEqual(config.tracing, TracingConfig(sample_rate=0.5, export=True))
+        self.assertEqual(config.log, LogConfig(level="INFO", backup_count=2))
+
+        # the sections of the global config still win
+        override = ExtensionGlobalConfig(tracing={"sample_rate": 1.0})
+        updated = EngineUtil.override_nested_config(config, override)
+        self.assertEqual(updated.tracing.sample_rate, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
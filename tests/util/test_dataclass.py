@@ -0,0 +1,87 @@
+import unittest
+from typing import Dict, List, Optional, Union
+from sonic_engine.model.app_config import AppConfig, ExtensionGlobalConfig
+from sonic_engine.model.extension import TracingConfig
+from sonic_engine.util.dataclass import nested_dataclass
+
+
+@nested_dataclass
+class Point:
+    x: int
+    y: int = 0
+
+
+@nested_dataclass
+class Shape:
+    name: str
+    center: Point = None
+    points: List[Point] = None
+    anchors: Dict[str, Point] = None
+    origin: Optional[Point] = None
+    path: Union[List[Point], Point] = None
+    tags: Union[List[str], str] = None
+
+
+class TestNestedDataclass(unittest.TestCase):
+    def test_nested_containers(self):
+        shape = Shape(
+            name="square",
+            center={"x": 1},
+            points=[{"x": 0, "y": 0}, Point(1, 1)],
+            anchors={"top": {"x": 0, "y": 1}},
+            origin={"x": 2},
+            path=[{"x": 3}],
+            tags=["a"],
+        )
+        self.assertEqual(shape.center, Point(1))
+        self.assertEqual(shape.points, [Point(0, 0), Point(1, 1)])
+        self.assertEqual(shape.anchors, {"top": Point(0, 1)})
+        self.assertEqual(shape.origin, Point(2))
+        self.assertEqual(shape.path, [Point(3)])
+        self.assertEqual(shape.tags, ["a"])
+
+        self.assertEqual(Shape(name="dot", path={"x": 4}).path, Point(4))
+
+    def test_missing_fields(self):
+        with self.assertRaisesRegex(TypeError, "'x' are required for Point"):
+            Point(y=1)
+        # positional arguments count as given
+        self.assertEqual(Point(1).x, 1)
+
+    def test_app_config(self):
+        config = AppConfig(
+            metadata={"extensions_folder": "extensions"},
+            categories=[{"name": "feature", "description": "Features"}],
+            extensions=[
+                {
+                    "id": "flows",
+                    "category": "feature",
+                    "source": "https://example.com/flows.git",
+                    "override": {"flows-2": {"description": "Second"}},
+                }
+            ],
+        )
+        self.assertEqual(config.metadata.redis.url, "unix:///run/redis.sock")
+        self.assertEqual(config.categories[0].name, "feature")
+        self.assertEqual(config.extensions[0].id, "flows")
+        # overrides stay partial
+        self.assertEqual(config.extensions[0].override["flows-2"], {"description": "Second"})
+
+    def test_defaults_and_conversion(self):
+        config = ExtensionGlobalConfig(id="flows")
+        # set once merged with the extension config.yaml
+        self.assertIsNone(config.tracing)
+        config.set_defaults()
+        self.assertIsInstance(config.tracing, TracingConfig)
+        config = ExtensionGlobalConfig(id="flows", tracing={"sample_rate": 0.5})
+        self.assertEqual(config.tracing.sample_rate, 0.5)
+
+    def test_models_keep_their_keys(self):
+        config = ExtensionGlobalConfig(
+            id="scorer", models=[{"name": "rf", "path": "m.pkl"}]
+        )
+        self.assertEqual(config.models, [{"name": "rf", "path": "m.pkl"}])
+
+
+if __name__ == "__main__":
+    unittest.main()